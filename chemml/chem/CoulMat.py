@@ -1,8 +1,88 @@
 from builtins import range
+import os
+import hashlib
 import pandas as pd
 import numpy as np
 
 from chemml.chem import Molecule
+from chemml.utils.cache import params_hash
+
+
+def _check_molecules(molecules):
+    """
+    The internal function to validate the input molecules and return them as a 1D numpy array.
+    """
+    if isinstance(molecules, list):
+        molecules = np.array(molecules)
+    elif isinstance(molecules, Molecule):
+        molecules = np.array([molecules])
+    else:
+        msg = "The molecule must be a chemml.chem.Molecule object or a list of objets."
+        raise ValueError(msg)
+
+    if molecules.ndim >1:
+        msg = "The molecule must be a chemml.chem.Molecule object or a list of objets."
+        raise ValueError(msg)
+
+    return molecules
+
+
+def _check_xyz(mol):
+    """
+    The internal function to make sure that a molecule provides the xyz information.
+    """
+    if isinstance(mol, Molecule):
+        if mol.xyz is None:
+            msg = "The molecule must be a chemml.chem.Molecule object with xyz information."
+            raise ValueError(msg)
+    else:
+        msg = "The molecule must be a chemml.chem.Molecule object."
+        raise ValueError(msg)
+
+
+def _write_chunks(path, chunks, shape):
+    """
+    The internal function to write the chunks of a feature matrix to a file on disk.
+
+    Parameters
+    ----------
+    path: str
+        The path to the output file. The file format is determined by the extension:
+            - '.npy': a numpy array file that can be loaded as a memory map, e.g., np.load(path, mmap_mode='r')
+            - '.h5' or '.hdf5': an HDF5 file with the features stored in the 'features' dataset
+
+    chunks: iterable
+        The iterable of 2D numpy arrays that are stacked row-wise.
+
+    shape: tuple
+        The shape of the full feature matrix.
+
+    """
+    if not isinstance(path, str):
+        msg = "The parameter 'path' must be a path to a '.npy', '.h5' or '.hdf5' file."
+        raise ValueError(msg)
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=shape)
+        start = 0
+        for chunk in chunks:
+            out[start:start + chunk.shape[0]] = chunk
+            start += chunk.shape[0]
+        out.flush()
+        del out
+    elif extension in ('.h5', '.hdf5'):
+        import h5py
+        with h5py.File(path, 'w') as f:
+            out = f.create_dataset('features', shape=shape, dtype=np.float64)
+            start = 0
+            for chunk in chunks:
+                out[start:start + chunk.shape[0]] = chunk
+                start += chunk.shape[0]
+    else:
+        msg = "The parameter 'path' must be a path to a '.npy', '.h5' or '.hdf5' file."
+        raise ValueError(msg)
+
 
 class CoulombMatrix(object):
     """
@@ -28,50 +108,119 @@ class CoulombMatrix(object):
             example: atomic unit -> const=1, Angstrom -> const=0.529
             const/|Ri-Rj|, which denominator is the euclidean distance
             between atoms i and j
+    cache: chemml.utils.FeatureCache, optional (default = None)
+        If provided, the `represent` method looks up the representations in the cache by the hash of atomic numbers
+        and coordinates of molecules and the parameters, and only the missing ones are computed (and stored in the cache).
+        The cached values are stored as float32. The cache is not used for the Random_Coulomb (RC) type.
     """
-    def __init__(self, CMtype='SC', max_n_atoms = 'auto', nPerm=3, const=1):
+    def __init__(self, CMtype='SC', max_n_atoms = 'auto', nPerm=3, const=1, cache=None):
         self.CMtype = CMtype
         self.max_n_atoms = max_n_atoms
         self.nPerm = nPerm
         self.const = const
+        self.cache = cache
+        # number of coulomb matrix elements that are computed together in one batch
+        self._batch_elements = 2**20
 
-    def __cal_coul_mat(self, mol):
+    def _feature_length(self):
         """
+        The internal function to compute the number of features per molecule for the requested CMtype.
+        """
+        n = self.max_n_atoms
+        if self.CMtype == "Unsorted_Matrix" or self.CMtype == 'UM':
+            return n**2
+        elif self.CMtype == "Unsorted_Triangular" or self.CMtype == 'UT':
+            return int(n * (n + 1) / 2)
+        elif self.CMtype == 'Eigenspectrum' or self.CMtype == 'E':
+            return n
+        elif self.CMtype == 'Sorted_Coulomb' or self.CMtype == 'SC':
+            return int(n * (n + 1) / 2)
+        elif self.CMtype == 'Random_Coulomb' or self.CMtype == 'RC':
+            return int(self.nPerm * n * (n + 1) / 2)
+        else:
+            msg = "The parameter 'CMtype' is not a valid coulomb matrix type: '%s'" % str(self.CMtype)
+            raise ValueError(msg)
+
+    def _coulomb_matrices(self, molecules):
+        """
+        The internal function to compute the padded coulomb matrices of a batch of molecules.
 
         Parameters
         ----------
-        mol: molecule object
-
+        molecules: ndarray
+            The 1D array of chemml.chem.Molecule objects.
 
         Returns
         -------
+        ndarray
+            The coulomb matrices with shape (n_molecules, max_n_atoms, max_n_atoms).
 
         """
-        if isinstance(mol, Molecule):
-            if mol.xyz is None:
-                msg = "The molecule must be a chemml.chem.Molecule object with xyz information."
+        n_mols = len(molecules)
+        Z = np.zeros((n_mols, self.max_n_atoms))
+        R = np.zeros((n_mols, self.max_n_atoms, 3))
+        for i, mol in enumerate(molecules):
+            _check_xyz(mol)
+            n_atoms = mol.xyz.atomic_numbers.shape[0]
+            if n_atoms > self.max_n_atoms:
+                msg = "The number of atoms in the molecule (%i) is larger than max_n_atoms (%i)." % (
+                    n_atoms, self.max_n_atoms)
                 raise ValueError(msg)
+            Z[i, :n_atoms] = mol.xyz.atomic_numbers.ravel()
+            R[i, :n_atoms] = mol.xyz.geometry
+
+        # all pairwise distances of all molecules with one broadcast
+        dist = np.sqrt(((R[:, :, None, :] - R[:, None, :, :])**2).sum(axis=-1))
+        ZZ = Z[:, :, None] * Z[:, None, :] * self.const
+        # padded atoms have zero charge, so their rows and columns remain zero
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cms = np.where(ZZ > 0, ZZ / dist, 0.0)
+        diag = np.arange(self.max_n_atoms)
+        cms[:, diag, diag] = 0.5 * Z**2.4
+        return cms
+
+    def _represent_block(self, molecules, out):
+        """
+        The internal function to compute the representation of a batch of molecules and write it into `out`.
+
+        Parameters
+        ----------
+        molecules: ndarray
+            The 1D array of chemml.chem.Molecule objects.
+
+        out: ndarray
+            The preallocated array of shape (n_molecules, n_features) to store the results.
+
+        """
+        cms = self._coulomb_matrices(molecules)
+        tril = np.tril_indices(self.max_n_atoms)
+
+        if self.CMtype == "Unsorted_Matrix" or self.CMtype == 'UM':
+            out[:] = cms.reshape(len(molecules), -1)
+
+        elif self.CMtype == "Unsorted_Triangular" or self.CMtype == 'UT':
+            out[:] = cms[:, tril[0], tril[1]]
+
+        elif self.CMtype == 'Eigenspectrum' or self.CMtype == 'E':
+            # coulomb matrices are symmetric; sort eigenvalues in descending order
+            out[:] = np.linalg.eigvalsh(cms)[:, ::-1]
+
         else:
-            msg = "The molecule must be a chemml.chem.Molecule object."
-            raise ValueError(msg)
+            # sort rows and columns by the norm of rows
+            lambdas = np.linalg.norm(cms, 2, 2)
+            sort_indices = np.argsort(lambdas, axis=1)[:, ::-1]
+            batch = np.arange(len(molecules))[:, None, None]
+            cms = cms[batch, sort_indices[:, :, None], sort_indices[:, None, :]]
 
-        mol = np.append(mol.xyz.atomic_numbers,mol.xyz.geometry, axis=1)
-        cm = []
-        for i in range(len(mol)):
-            vect = []
-            for k in range(0,i):
-                vect.append(cm[k][i])
-            for j in range(i,len(mol)):
-                if i==j:
-                    vect.append(0.5*mol[i,0]**2.4)
-                else:
-                    vect.append((mol[i,0]*mol[j,0]*self.const)/np.linalg.norm(mol[i,1:]-mol[j,1:]))
-            for m in range(len(mol),self.max_n_atoms):
-                vect.append(0.0)
-            cm.append(vect)
-        for m in range(len(mol),self.max_n_atoms):
-            cm.append([0]*self.max_n_atoms)
-        return np.array(cm) #shape nAtoms*nAtoms
+            if self.CMtype == 'Sorted_Coulomb' or self.CMtype == 'SC':
+                out[:] = cms[:, tril[0], tril[1]]   # lower-triangular
+
+            elif self.CMtype == 'Random_Coulomb' or self.CMtype == 'RC':
+                masks = np.array([[np.random.permutation(self.max_n_atoms) for _ in range(self.nPerm)]
+                                  for _ in range(len(molecules))]).reshape(len(molecules), self.nPerm, -1)
+                batch = batch[:, :, :, None]
+                cm_perms = cms[batch, masks[:, :, :, None], masks[:, :, None, :]]
+                out[:] = cm_perms[:, :, tril[0], tril[1]].reshape(len(molecules), -1)   # lower-triangular
 
     def represent(self, molecules):
         """
@@ -95,17 +244,98 @@ class CoulombMatrix(object):
                 - shape of Sorted_Coulomb (SC): (n_molecules, max_n_atoms*(max_n_atoms+1)/2)
                 - shape of Random_Coulomb (RC): (n_molecules, nPerm * max_n_atoms * (max_n_atoms+1)/2)
         """
-        if isinstance(molecules, list):
-            molecules = np.array(molecules)
-        elif isinstance(molecules, Molecule):
-            molecules = np.array([molecules])
-        else:
-            msg = "The molecule must be a chemml.chem.Molecule object or a list of objets."
-            raise ValueError(msg)
+        molecules = self._prepare(molecules)
 
-        if molecules.ndim >1:
-            msg = "The molecule must be a chemml.chem.Molecule object or a list of objets."
-            raise ValueError(msg)
+        if self.cache is not None and self.CMtype not in ('Random_Coulomb', 'RC'):
+            return pd.DataFrame(self._represent_cached(molecules))
+
+        cms = np.zeros((self.n_molecules, self._feature_length()))
+        # the batch size keeps the (batch, max_n_atoms, max_n_atoms) intermediate arrays small
+        batch_size = self._batch_size()
+        for start in range(0, self.n_molecules, batch_size):
+            end = start + batch_size
+            self._represent_block(molecules[start:end], cms[start:end])
+
+        return pd.DataFrame(cms)
+
+    def _represent_cached(self, molecules):
+        """
+        The internal function to get the representations from the cache and compute only the missing ones.
+        """
+        namespace = params_hash('CoulombMatrix', {'CMtype': self.CMtype, 'max_n_atoms': self.max_n_atoms,
+                                                  'const': self.const})
+        keys = []
+        for mol in molecules:
+            _check_xyz(mol)
+            h = hashlib.sha1(np.ascontiguousarray(mol.xyz.atomic_numbers, dtype=np.int64).tobytes())
+            h.update(np.ascontiguousarray(mol.xyz.geometry, dtype=np.float64).tobytes())
+            keys.append(h.hexdigest())
+        cms, found = self.cache.get(namespace, keys, np.float32, self._feature_length())
+        missing = np.where(~found)[0]
+        batch_size = self._batch_size()
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            block = np.zeros((len(batch), self._feature_length()))
+            self._represent_block(molecules[batch], block)
+            cms[batch] = block
+        if len(missing) > 0:
+            self.cache.put(namespace, [keys[i] for i in missing], cms[missing])
+        return cms.astype(np.float64)
+
+    def represent_iter(self, molecules, chunk_size=10000):
+        """
+        provides coulomb matrix representation for input molecules, one chunk of molecules at a time.
+        The peak memory is bounded by the chunk size instead of the number of molecules.
+
+        Parameters
+        ----------
+        molecules: chemml.chem.Molecule object or list
+            If list, it must be a list of chemml.chem.Molecule objects, otherwise we raise a ValueError.
+            In addition, all the molecule objects must provide the XYZ information.
+
+        chunk_size: int, optional (default = 10000)
+            The number of molecules in each chunk.
+
+        Yields
+        ------
+        Pandas DataFrame
+            A data frame of shape (chunk_size, n_features) with the same columns as the output of the `represent` method.
+            The index of each chunk continues from the previous one. The last chunk might be smaller.
+
+        """
+        molecules = self._prepare(molecules)
+        for start, chunk in self._iter_chunks(molecules, chunk_size):
+            yield pd.DataFrame(chunk, index=range(start, start + chunk.shape[0]))
+
+    def represent_to(self, path, molecules, chunk_size=10000):
+        """
+        writes the coulomb matrix representation of input molecules to a file on disk, one chunk of molecules at a time.
+        The peak memory is bounded by the chunk size instead of the number of molecules.
+
+        Parameters
+        ----------
+        path: str
+            The path to the output file. The file format is determined by the extension:
+                - '.npy': a numpy array file that can be loaded as a memory map, e.g., np.load(path, mmap_mode='r')
+                - '.h5' or '.hdf5': an HDF5 file with the features stored in the 'features' dataset (requires h5py)
+
+        molecules: chemml.chem.Molecule object or list
+            If list, it must be a list of chemml.chem.Molecule objects, otherwise we raise a ValueError.
+            In addition, all the molecule objects must provide the XYZ information.
+
+        chunk_size: int, optional (default = 10000)
+            The number of molecules in each chunk.
+
+        """
+        molecules = self._prepare(molecules)
+        chunks = (chunk for _, chunk in self._iter_chunks(molecules, chunk_size))
+        _write_chunks(path, chunks, (self.n_molecules, self._feature_length()))
+
+    def _prepare(self, molecules):
+        """
+        The internal function to validate the input molecules and set the max_n_atoms if required.
+        """
+        molecules = _check_molecules(molecules)
 
         self.n_molecules = molecules.shape[0]
 
@@ -117,64 +347,29 @@ class CoulombMatrix(object):
                 msg = "The molecule must be a chemml.chem.Molecule object or a list of objets."
                 raise ValueError(msg)
 
-        if self.CMtype == "Unsorted_Matrix" or self.CMtype == 'UM':
-            cms = np.array([])
-            for mol in molecules:
-                cm = self.__cal_coul_mat(mol)
-                cms = np.append(cms, cm.ravel())
-            cms = cms.reshape(self.n_molecules, self.max_n_atoms**2)
-            cms = pd.DataFrame(cms)
-            return cms
+        return molecules
 
-        elif self.CMtype == "Unsorted_Triangular" or self.CMtype == 'UT':
-            cms = np.array([])
-            for mol in molecules:
-                cm = self.__cal_coul_mat(mol)
-                cms = np.append(cms, cm[np.tril_indices(self.max_n_atoms)])
-            cms = cms.reshape(self.n_molecules, int(self.max_n_atoms*(self.max_n_atoms+1)/2))
-            cms = pd.DataFrame(cms)
-            return cms
+    def _batch_size(self):
+        """
+        The internal function to compute the number of molecules that are processed together.
+        """
+        return max(1, self._batch_elements // self.max_n_atoms**2)
 
-        elif self.CMtype == 'Eigenspectrum' or self.CMtype == 'E':
-            eigenspectrums = np.array([])
-            for mol in molecules:
-                cm = self.__cal_coul_mat(mol) # Check the constant value for unit conversion; atomic unit -> 1 , Angstrom -> 0.529
-                eig = np.linalg.eigvals(cm)
-                eig[::-1].sort()
-                eigenspectrums = np.append(eigenspectrums,eig)
-            eigenspectrums = eigenspectrums.reshape(self.n_molecules, self.max_n_atoms)
-            eigenspectrums = pd.DataFrame(eigenspectrums)
-            return eigenspectrums
-            
-        elif self.CMtype == 'Sorted_Coulomb' or self.CMtype == 'SC':
-            sorted_cm = np.array([])
-            for mol in molecules:
-                cm = self.__cal_coul_mat(mol)
-                lambdas = np.linalg.norm(cm,2,1)
-                sort_indices = np.argsort(lambdas)[::-1]
-                cm = cm[:,sort_indices][sort_indices,:]
-                # sorted_cm.append(cm)
-                sorted_cm = np.append(sorted_cm, cm[np.tril_indices(self.max_n_atoms)]) # lower-triangular
-            sorted_cm = sorted_cm.reshape(self.n_molecules, int(self.max_n_atoms*(self.max_n_atoms+1)/2))
-            sorted_cm = pd.DataFrame(sorted_cm)
-            return sorted_cm
-                    
-        elif self.CMtype == 'Random_Coulomb' or self.CMtype == 'RC':
-            random_cm = np.array([])
-            for nmol,mol in enumerate(molecules):
-                cm = self.__cal_coul_mat(mol)
-                lambdas = np.linalg.norm(cm,2,1)
-                sort_indices = np.argsort(lambdas)[::-1]
-                cm = cm[:,sort_indices][sort_indices,:]
-                cm_perms = []
-                for l in range(self.nPerm):
-                    mask = np.random.permutation(self.max_n_atoms)
-                    cm_mask = cm[:,mask][mask,:]
-                    # cm_perms.append(cm_mask)
-                    cm_perms += list(cm_mask[np.tril_indices(self.max_n_atoms)]) # lower-triangular
-                random_cm = np.append(random_cm, cm_perms)
-            random_cm = random_cm.reshape(self.n_molecules, int(self.nPerm*self.max_n_atoms*(self.max_n_atoms+1)/2))
-            return pd.DataFrame(random_cm)
+    def _iter_chunks(self, molecules, chunk_size):
+        """
+        The internal generator of the start index and the feature array of each chunk of molecules.
+        """
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            msg = "The parameter 'chunk_size' must be a positive integer."
+            raise ValueError(msg)
+
+        batch_size = self._batch_size()
+        for start in range(0, self.n_molecules, chunk_size):
+            chunk_molecules = molecules[start:start + chunk_size]
+            chunk = np.zeros((len(chunk_molecules), self._feature_length()))
+            for b in range(0, len(chunk_molecules), batch_size):
+                self._represent_block(chunk_molecules[b:b + batch_size], chunk[b:b + batch_size])
+            yield start, chunk
 
 class BagofBonds(object):
     """
@@ -192,6 +387,10 @@ class BagofBonds(object):
 
     Attributes
     ----------
+    all_keys_: dict
+        The bags that are found by the `fit` method: tuples of two nuclear charges (the larger one first) and their
+        maximum length.
+
     header_: list of header for the bag of bonds data frame
         contains one nuclear charge (represents single atom) or a tuple of two nuclear charges (represents a bond)
 
@@ -203,9 +402,16 @@ class BagofBonds(object):
     >>> coordinates, y = load_xyz_polarizability()
     >>> bob = BagofBonds(const= 1.0)
     >>> X = bob.represent(coordinates)
+
+    >>> # freeze the layout of bags on the training molecules and reuse it for new molecules
+    >>> bob.fit(coordinates[:40])
+    >>> X_train = bob.transform(coordinates[:40])
+    >>> X_test = bob.transform(coordinates[40:])   # same columns as X_train
     """
     def __init__(self, const=1.0):
         self.const = const
+        # number of atom pairs that are computed together in one batch
+        self._batch_elements = 2**20
 
     def represent(self, molecules):
         """
@@ -222,65 +428,254 @@ class BagofBonds(object):
         -------
         pandas data frame, shape: (n_molecules, max_length_of_combinations)
 
+        Notes
+        -----
+            - The bags are found based on the input molecules, i.e., this method is equivalent to calling the `fit`
+            and `transform` methods on the same molecules.
+
         """
-        if isinstance(molecules, list):
-            molecules = np.array(molecules)
-        elif isinstance(molecules, Molecule):
-            molecules = np.array([molecules])
-        else:
-            msg = "The molecule must be a chemml.chem.Molecule object or a list of objets."
-            raise ValueError(msg)
+        self.fit(molecules)
+        return self.transform(molecules)
+
+    def fit(self, molecules):
+        """
+        finds the bags and their maximum length for the input molecules and freezes the layout of the features.
+        The `transform` method represents any other molecules with this layout.
+
+        Parameters
+        ----------
+        molecules: chemml.chem.Molecule object or list
+            If list, it must be a list of chemml.chem.Molecule objects, otherwise we raise a ValueError.
+            In addition, all the molecule objects must provide the XYZ information.
+
+        """
+        molecules = _check_molecules(molecules)
+        self.all_keys_ = self._find_bags(molecules)
+        self._set_layout(self.all_keys_)
+
+    def transform(self, molecules):
+        """
+        provides bag of bonds representation for input molecules using the layout of bags from the `fit` method.
+        The bags that are longer than the fitted ones are truncated (only the largest values are kept), the shorter
+        bags are padded with zeros, and the bags that have not been seen in the fit are ignored.
 
-        if molecules.ndim > 1:
-            msg = "The molecule must be a chemml.chem.Molecule object or a list of objets."
+        Parameters
+        ----------
+        molecules: chemml.chem.Molecule object or list
+            If list, it must be a list of chemml.chem.Molecule objects, otherwise we raise a ValueError.
+            In addition, all the molecule objects must provide the XYZ information.
+
+        Returns
+        -------
+        pandas data frame, shape: (n_molecules, len(header_))
+
+        """
+        if not hasattr(self, 'all_keys_'):
+            msg = "The BagofBonds object must be fitted first. Call the 'fit' method with training molecules."
             raise ValueError(msg)
 
-        BBs_matrix = [] # list of dictionaries for each molecule
+        molecules = _check_molecules(molecules)
+        output = np.zeros((len(molecules), len(self.header_)))
+        batch_size = self._batch_size(molecules)
+        for start in range(0, len(molecules), batch_size):
+            end = start + batch_size
+            self._represent_block(molecules[start:end], output[start:end])
+
+        return pd.DataFrame(output)
+
+    def represent_iter(self, molecules, chunk_size=10000):
+        """
+        provides bag of bonds representation for input molecules, one chunk of molecules at a time.
+        If the object is already fitted, the chunks follow the frozen layout of the `fit` method (as in the
+        `transform` method); otherwise the bags and their lengths are first determined from all the input
+        molecules, so that all the chunks share the same columns. The peak memory is bounded by the chunk size
+        instead of the number of molecules.
+
+        Parameters
+        ----------
+        molecules: chemml.chem.Molecule object or list
+            If list, it must be a list of chemml.chem.Molecule objects, otherwise we raise a ValueError.
+            In addition, all the molecule objects must provide the XYZ information.
+
+        chunk_size: int, optional (default = 10000)
+            The number of molecules in each chunk.
+
+        Yields
+        ------
+        pandas data frame, shape: (chunk_size, max_length_of_combinations)
+            The index of each chunk continues from the previous one. The last chunk might be smaller.
+
+        """
+        molecules = _check_molecules(molecules)
+        if not hasattr(self, 'all_keys_'):
+            self.fit(molecules)
+        for start, chunk in self._iter_chunks(molecules, chunk_size):
+            yield pd.DataFrame(chunk, index=range(start, start + chunk.shape[0]))
+
+    def represent_to(self, path, molecules, chunk_size=10000):
+        """
+        writes the bag of bonds representation of input molecules to a file on disk, one chunk of molecules at a time.
+        If the object is already fitted, the frozen layout of the `fit` method is used (as in the `transform`
+        method); otherwise the object is first fitted on the input molecules. The peak memory is bounded by the
+        chunk size instead of the number of molecules.
+
+        Parameters
+        ----------
+        path: str
+            The path to the output file. The file format is determined by the extension:
+                - '.npy': a numpy array file that can be loaded as a memory map, e.g., np.load(path, mmap_mode='r')
+                - '.h5' or '.hdf5': an HDF5 file with the features stored in the 'features' dataset (requires h5py)
+
+        molecules: chemml.chem.Molecule object or list
+            If list, it must be a list of chemml.chem.Molecule objects, otherwise we raise a ValueError.
+            In addition, all the molecule objects must provide the XYZ information.
+
+        chunk_size: int, optional (default = 10000)
+            The number of molecules in each chunk.
+
+        """
+        molecules = _check_molecules(molecules)
+        if not hasattr(self, 'all_keys_'):
+            self.fit(molecules)
+        chunks = (chunk for _, chunk in self._iter_chunks(molecules, chunk_size))
+        _write_chunks(path, chunks, (len(molecules), len(self.header_)))
+
+    def _find_bags(self, molecules):
+        """
+        The internal function to find the unique bags and their maximum length over all molecules.
+        The length of bags only depends on the number of atoms of each element, so no distance is computed here.
+
+        Returns
+        -------
+        dict
+            The dictionary of bag keys, i.e., tuples of two nuclear charges (the larger one first),
+            and their maximum length.
+
+        """
         all_keys = {}   # dictionary of unique keys and their maximum length
-        for nmol,mol in enumerate(molecules):
-            bags = {}
-            mol = np.append(mol.xyz.atomic_numbers, mol.xyz.geometry, axis=1)
-            for i in range(len(mol)):
-                for j in range(i,len(mol)):
-                    if i==j:
-                        key = (mol[i,0], mol[i,0])
-                        Fc = 0.5 * mol[i, 0] ** 2.4
-                        if key in bags:
-                            bags[key].append(Fc)
-                        else:
-                            bags[key] = [Fc]
+        for mol in molecules:
+            _check_xyz(mol)
+            elements, first, counts = np.unique(mol.xyz.atomic_numbers, return_index=True, return_counts=True)
+            bags = []
+            for i in range(len(elements)):
+                for j in range(i + 1):
+                    key = (float(elements[i]), float(elements[j]))
+                    if i == j:
+                        length = int(counts[i] * (counts[i] + 1) / 2)
                     else:
-                        key = (max(mol[i,0],mol[j,0]),min(mol[i,0],mol[j,0]))
-                        Fc = (mol[i,0]*mol[j,0]*self.const) / np.linalg.norm(mol[i,1:]-mol[j,1:])
-                        if key in bags:
-                            bags[key].append(Fc)
-                        else:
-                            bags[key] = [Fc]
-            for key in bags:
-                if key in all_keys:
-                    all_keys[key] = max(all_keys[key], len(bags[key]))
-                else:
-                    all_keys[key] = len(bags[key])
-            BBs_matrix.append(bags)
-
-        # extend bags with zero
-        for i, bags in enumerate(BBs_matrix):
-            for key in all_keys:
-                if key in bags:
-                    diff = all_keys[key] - len(bags[key])
-                    BBs_matrix[i][key] = sorted(BBs_matrix[i][key], reverse=True) + diff*[0]
-                else:
-                    BBs_matrix[i][key] = all_keys[key]*[0]
-        df = pd.DataFrame(BBs_matrix)
-        del BBs_matrix
-        order_headers = list(df.columns)
-        output = pd.DataFrame(list(df.sum(1)))
-        del df
+                        length = int(counts[i] * counts[j])
+                    # the first pair of atoms (i <= j) of the bag in the molecule
+                    position = (min(first[i], first[j]), max(first[i], first[j]))
+                    bags.append((position, key, length))
+            # the keys are inserted in the order that the atom pairs of the molecule are visited
+            for _, key, length in sorted(bags, key=lambda bag: bag[0]):
+                all_keys[key] = max(all_keys.get(key, 0), length)
+        return all_keys
+
+    def _set_layout(self, all_keys):
+        """
+        The internal function to set the order of bags and their position in the feature vector.
+        """
+        # the bags are ordered as the columns of a data frame of the bags, i.e., the order of the original
+        # implementation of the represent method
+        keys = list(pd.DataFrame([all_keys]).columns)
+        lengths = np.array([all_keys[key] for key in keys], dtype=int)
+        codes = np.array([_pair_code(key[0], key[1]) for key in keys], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(int)
+        # the bags are looked up by their sorted codes
+        order = np.argsort(codes, kind='stable')
+        self._bag_codes = codes[order]
+        self._bag_sizes = lengths[order]
+        self._bag_offsets = offsets[order]
         self.header_ = []
-        for key in order_headers:
+        for key in keys:
             if key[0]==key[1]:
                 k = key[0]
             else:
                 k = key
             self.header_ += all_keys[key] * [k]
-        return output
+
+    def _batch_size(self, molecules):
+        """
+        The internal function to validate the molecules and compute the number of molecules that are processed together.
+        """
+        for m in molecules:
+            _check_xyz(m)
+        max_n_atoms = max([1] + [m.xyz.atomic_numbers.shape[0] for m in molecules])
+        return max(1, self._batch_elements // max_n_atoms**2)
+
+    def _iter_chunks(self, molecules, chunk_size):
+        """
+        The internal generator of the start index and the feature array of each chunk of molecules.
+        """
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            msg = "The parameter 'chunk_size' must be a positive integer."
+            raise ValueError(msg)
+
+        for start in range(0, len(molecules), chunk_size):
+            chunk_molecules = molecules[start:start + chunk_size]
+            chunk = np.zeros((len(chunk_molecules), len(self.header_)))
+            batch_size = self._batch_size(chunk_molecules)
+            for b in range(0, len(chunk_molecules), batch_size):
+                self._represent_block(chunk_molecules[b:b + batch_size], chunk[b:b + batch_size])
+            yield start, chunk
+
+    def _represent_block(self, molecules, out):
+        """
+        The internal function to compute the bags of a batch of molecules and write them into `out`.
+        All the atom pairs of the batch are sorted together: by molecule, then by bag, then by descending value.
+        Bags that are not part of the layout are ignored and longer bags are truncated.
+
+        Parameters
+        ----------
+        molecules: ndarray
+            The 1D array of chemml.chem.Molecule objects.
+
+        out: ndarray
+            The preallocated array of shape (n_molecules, n_features) to store the results.
+
+        """
+        n_mols = len(molecules)
+        n_atoms = max([1] + [m.xyz.atomic_numbers.shape[0] for m in molecules])
+        Z = np.zeros((n_mols, n_atoms))
+        R = np.zeros((n_mols, n_atoms, 3))
+        for i, mol in enumerate(molecules):
+            _check_xyz(mol)
+            n = mol.xyz.atomic_numbers.shape[0]
+            Z[i, :n] = mol.xyz.atomic_numbers.ravel()
+            R[i, :n] = mol.xyz.geometry
+
+        # all the atom pairs (i <= j) of all the molecules
+        ii, jj = np.triu_indices(n_atoms)
+        Zi = Z[:, ii]
+        Zj = Z[:, jj]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dist = np.sqrt(((R[:, ii] - R[:, jj])**2).sum(axis=-1))
+            values = np.where(ii == jj, 0.5 * Zi**2.4, (Zi * Zj * self.const) / dist)
+        valid = (Zi > 0) & (Zj > 0)     # padded atoms have zero charge
+        mol_ind = np.broadcast_to(np.arange(n_mols)[:, None], Zi.shape)[valid]
+        values = values[valid]
+        codes = _pair_code(np.maximum(Zi, Zj)[valid], np.minimum(Zi, Zj)[valid])
+
+        # find the bag of each pair in the layout
+        if len(self._bag_codes) == 0:
+            return
+        bag = np.minimum(np.searchsorted(self._bag_codes, codes), len(self._bag_codes) - 1)
+        known = self._bag_codes[bag] == codes
+        mol_ind, bag, values = mol_ind[known], bag[known], values[known]
+
+        # sort values within each bag of each molecule and find their rank in the bag
+        order = np.lexsort((-values, bag, mol_ind))
+        mol_ind, bag, values = mol_ind[order], bag[order], values[order]
+        group = mol_ind * len(self._bag_codes) + bag
+        rank = np.arange(len(group)) - np.searchsorted(group, group, side='left')
+
+        keep = rank < self._bag_sizes[bag]
+        out[mol_ind[keep], self._bag_offsets[bag[keep]] + rank[keep]] = values[keep]
+
+
+def _pair_code(z1, z2):
+    """
+    The internal function to encode a pair of nuclear charges (the larger one first) as a single integer.
+    """
+    return np.asarray(z1).astype(np.int64) * 1000 + np.asarray(z2).astype(np.int64)
@@ -6,10 +6,19 @@ from __future__ import print_function
 from builtins import range
 import warnings
 import os
+import json
+import copy
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
 from lxml import objectify, etree
 
 from ..utils import std_datetime_str, bool_formatter
 
+# the metadata key of the loading parameters in the feather/parquet store of Dragon descriptors
+_STORE_KEY = b'chemml.dragon'
+
 
 class Dragon(object):
     """
@@ -33,6 +42,11 @@ class Dragon(object):
     external: boolean, optional (default=False)
         If True, include external variables at the end of each saved file.
 
+    executable: string, optional (default=None)
+        The Dragon shell command or the path to its executable. If None, 'dragon{version}shell' is used.
+        Any executable that accepts the '-s script.drs' argument and writes the output file can be used instead,
+        e.g., a stub for testing.
+
     Notes
     -----
         The documentation for the rest of parameters can be found in the following links:
@@ -54,6 +68,8 @@ class Dragon(object):
         >>> df_path = drg.data_path  # path to the output file
         >>> df = pd.read_csv(df_path, sep=None, engine='python')
         >>> df = df.drop(['No.','NAME'],axis=1)
+        >>> # or, with float32 columns and a feather copy for the next loads
+        >>> df = drg.load(store='Dragon_descriptors.feather')
     """
 
     def __init__(self,
@@ -114,7 +130,8 @@ class Dragon(object):
                  RoundCoordinates=True,
                  RoundWeights=True,
                  RoundDescriptorValues=True,
-                 knimemode=False):
+                 knimemode=False,
+                 executable=None):
         if version in (6, 7):
             self.version = version
         else:
@@ -176,6 +193,7 @@ class Dragon(object):
         self.RoundWeights = RoundWeights
         self.RoundDescriptorValues = RoundDescriptorValues
         self.knimemode = knimemode
+        self.executable = executable
 
     def script_wizard(self, script='new', output_directory='./'):
         """
@@ -525,13 +543,270 @@ class Dragon(object):
         etree.cleanup_namespaces(self.dragon)
         print(objectify.dump(self.dragon))
 
-    def run(self):
+    def _script_path(self):
+        """
+        The internal function to get the path of the saved or loaded script.
+        """
+        if hasattr(self, 'drs_name'):
+            return os.path.join(self.output_directory, self.drs_name)
+        return self.drs
+
+    def _command(self, script):
+        """
+        The internal function to build the command that runs Dragon with a script.
+        """
+        executable = self.executable if self.executable is not None else 'dragon%ishell' % self.version
+        return [executable, '-s', script]
+
+    def _not_available(self, detail=''):
+        msg = "Oops, dragon%ishell command didn't work! Are you sure Dragon%i software is installed on your machine?" % (
+            self.version, self.version)
+        if detail:
+            msg += '\n' + detail
+        return ImportError(msg)
+
+    def run(self, n_shards=1, n_jobs=1):
+        """
+        This function runs Dragon with the script that is built or loaded by the script_wizard method.
+
+        Parameters
+        ----------
+        n_shards: int, optional (default = 1)
+            The number of parts that the input molecules are split into. If larger than one, a script is generated
+            for each part (in the 'shard_i' subdirectories of the output directory) and the outputs are merged
+            into the data_path file. Only available for the scripts that are built with script='new', the
+            'singlefile' SaveType, and a single SMILES file or a dictionary of files as molFile.
+
+        n_jobs: int, optional (default = 1)
+            The maximum number of Dragon processes that run concurrently.
+
+        Attributes
+        ----------
+        shard_results_: list
+            A list of dictionaries with the 'script', 'returncode', 'stdout' and 'stderr' of each Dragon process.
+
+        """
+        if not isinstance(n_shards, int) or n_shards < 1:
+            msg = "The parameter 'n_shards' must be a positive integer."
+            raise ValueError(msg)
+        if not isinstance(n_jobs, int) or n_jobs < 1:
+            msg = "The parameter 'n_jobs' must be a positive integer."
+            raise ValueError(msg)
+
         print("running Dragon%i ..." % self.version)
-        os_ret = os.system('nohup dragon%sshell -s %s' %
-                           (self.version, os.path.join(self.output_directory, self.drs_name)))
-        if os_ret != 0:
-            msg = "Oops, dragon%ishell command didn't work! Are you sure Dragon%i software is installed on your machine?" % (
-                self.version, self.version)
-            raise ImportError(msg)
-        # print subprocess.check_output(['nohup dragon%sshell -s %s'%(self.version,self.drs)])
+        if n_shards == 1:
+            scripts = [self._script_path()]
+            outputs = None
+        else:
+            scripts, outputs = self._write_shards(n_shards)
+
+        def run_script(script):
+            try:
+                proc = subprocess.run(self._command(script), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            except OSError as err:
+                return {'script': script, 'returncode': None, 'stdout': '', 'stderr': str(err)}
+            return {'script': script, 'returncode': proc.returncode,
+                    'stdout': proc.stdout.decode(errors='replace'), 'stderr': proc.stderr.decode(errors='replace')}
+
+        with ThreadPoolExecutor(max_workers=min(n_jobs, len(scripts))) as executor:
+            self.shard_results_ = list(executor.map(run_script, scripts))
+        for result in self.shard_results_:
+            if result['returncode'] != 0:
+                raise self._not_available("%s: %s" % (result['script'], result['stderr'].strip()[-1000:]))
+
+        if outputs is not None:
+            _merge_outputs(outputs, self.data_path)
         print("... Dragon job completed!")
+
+    def load(self, path=None, chunk_size=10000, dtype=np.float32, drop=('No.', 'NAME'), store=None):
+        """
+        This function loads the tab-separated output file of Dragon in chunks, with an explicit numerical type for
+        the descriptors. The missing values (the 'na' tokens, or the Missing_String parameter) are parsed to NaN.
+
+        Parameters
+        ----------
+        path: string, optional (default = None)
+            The path to the output file. If None, the data_path attribute is used.
+
+        chunk_size: int, optional (default = 10000)
+            The number of rows that are parsed at a time.
+
+        dtype: numpy dtype, optional (default = np.float32)
+            The data type of the descriptors.
+
+        drop: tuple, optional (default = ('No.', 'NAME'))
+            The columns to be dropped. The 'NAME' column is read as string, if it's not dropped.
+
+        store: string, optional (default = None)
+            The path to a '.feather' or '.parquet' file (requires pyarrow). If the file is newer than the Dragon
+            output and was written with the same dtype and drop parameters, the descriptors are loaded from it;
+            otherwise the parsed chunks of the Dragon output are written to it one at a time and the descriptors
+            are loaded back from it. The store file is memory-mapped. It is only replaced once all the chunks are
+            parsed, so a parsing error never leaves a partial store behind.
+
+        Returns
+        -------
+        pandas dataframe
+            The descriptors.
+
+        Notes
+        -----
+        Without a store file, the parsed chunks are concatenated in the memory, so only the text parsing is chunked.
+
+        """
+        if path is None:
+            path = self.data_path
+        if store is not None:
+            extension = os.path.splitext(store)[1]
+            if extension not in ('.feather', '.parquet'):
+                msg = "The store file must be either a '.feather' or a '.parquet' file."
+                raise ValueError(msg)
+            # the parameters of the parsed chunks are recorded in the metadata of the store
+            params = json.dumps({'dtype': np.dtype(dtype).str, 'drop': list(drop)}).encode('utf-8')
+            table = None
+            if os.path.exists(store) and os.path.getmtime(store) >= os.path.getmtime(path):
+                table = self._read_store(store, extension)
+                if table is not None and (table.schema.metadata or {}).get(_STORE_KEY) != params:
+                    table = None
+            if table is None:
+                self._write_store(self._read_chunks(path, chunk_size, dtype, drop), store, extension, params)
+                table = self._read_store(store, extension)
+            return table.to_pandas(split_blocks=True)
+
+        return pd.concat(list(self._read_chunks(path, chunk_size, dtype, drop)), ignore_index=True)
+
+    def _read_chunks(self, path, chunk_size, dtype, drop):
+        """
+        The internal function to parse the tab-separated output file of Dragon in chunks.
+        """
+        header = pd.read_csv(path, sep='\t', nrows=0).columns
+        columns = [col for col in header if col not in drop]
+        dtypes = {col: (str if col == 'NAME' else dtype) for col in columns}
+        na_values = ['na', 'NaN', 'nan', self.Missing_String]
+        chunks = pd.read_csv(path, sep='\t', usecols=columns, dtype=dtypes, na_values=na_values,
+                             keep_default_na=False, chunksize=chunk_size)
+        for chunk in chunks:
+            # the order of columns is not preserved by usecols
+            yield chunk[columns]
+
+    @staticmethod
+    def _read_store(store, extension):
+        """
+        The internal function to read the feather/parquet store file as a memory-mapped arrow table.
+        It returns None if the file can't be read.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            if extension == '.feather':
+                return pa.ipc.open_file(pa.memory_map(store)).read_all()
+            else:
+                return pq.read_table(store, memory_map=True)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_store(chunks, store, extension, params):
+        """
+        The internal function to write the parsed chunks to the feather/parquet store file, one at a time.
+        The chunks are written to a temporary file first, which replaces the store file after the last chunk.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        temp = '%s.%i.tmp' % (store, os.getpid())
+        writer = None
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                    metadata = dict(schema.metadata or {})
+                    metadata[_STORE_KEY] = params
+                    schema = schema.with_metadata(metadata)
+                    if extension == '.feather':
+                        # uncompressed, so that it can be memory-mapped
+                        writer = pa.ipc.new_file(temp, schema)
+                    else:
+                        writer = pq.ParquetWriter(temp, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            writer.close()
+            writer = None
+            os.replace(temp, store)
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def _write_shards(self, n_shards):
+        """
+        The internal function to split the input molecules and build one script per shard with the script_wizard.
+        It returns the lists of script paths and output paths of the shards.
+        """
+        if not hasattr(self, 'drs_name'):
+            msg = "The sharded run is only available for the scripts that are built with script='new'."
+            raise ValueError(msg)
+        if not self.SaveFile or self.SaveType != 'singlefile':
+            msg = "The sharded run requires the 'singlefile' SaveType."
+            raise ValueError(msg)
+
+        if isinstance(self.molFile, dict):
+            items = [self.molFile[f] for f in range(1, len(self.molFile) + 1)]
+        elif isinstance(self.molFile, str) and self.molFile.endswith('.smi'):
+            with open(self.molFile) as f:
+                items = [line for line in f if line.strip()]
+        else:
+            msg = "The sharded run requires a SMILES file (.smi) or a dictionary of files as molFile."
+            raise ValueError(msg)
+        n_shards = min(n_shards, max(1, len(items)))
+        bounds = [int(round(k * len(items) / float(n_shards))) for k in range(n_shards + 1)]
+
+        scripts = []
+        outputs = []
+        for k in range(n_shards):
+            directory = os.path.join(self.output_directory, 'shard_%i' % k, '')
+            part = items[bounds[k]:bounds[k + 1]]
+            shard = copy.copy(self)
+            if isinstance(self.molFile, dict):
+                shard.molFile = {i + 1: entry for i, entry in enumerate(part)}
+            else:
+                if not os.path.exists(directory):
+                    os.makedirs(directory)
+                shard.molFile = os.path.join(directory, 'molecules.smi')
+                with open(shard.molFile, 'w') as f:
+                    f.writelines(part)
+            shard.script_wizard(script='new', output_directory=directory)
+            scripts.append(shard._script_path())
+            outputs.append(shard.data_path)
+        return scripts, outputs
+
+
+def _merge_outputs(outputs, path):
+    """
+    The internal function to concatenate the tab-separated output files of the shards, line by line.
+    The header is written once and the 'No.' column (if any) is renumbered.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    header = None
+    number = 0
+    with open(path, 'w') as merged:
+        for output in outputs:
+            with open(output) as f:
+                first = f.readline()
+                if header is None:
+                    header = first
+                    merged.write(header)
+                elif first != header:
+                    msg = "The output files of the shards don't have the same columns."
+                    raise ValueError(msg)
+                renumber = header.split('\t', 1)[0].strip() == 'No.'
+                for line in f:
+                    if not line.strip():
+                        continue
+                    if renumber:
+                        number += 1
+                        line = '%i\t%s' % (number, line.split('\t', 1)[1])
+                    merged.write(line)
@@ -1,11 +1,14 @@
 from __future__ import print_function
 from builtins import range
+import os
 import pandas as pd
 import numpy as np
 import scipy.sparse
-
+import multiprocessing
+from rdkit import Chem
 
 from chemml.chem import Molecule
+from chemml.utils.cache import params_hash
 
 class RDKitFingerprint(object):
     """
@@ -37,6 +40,15 @@ class RDKitFingerprint(object):
     radius: int, optional (default = 2)
         only applicable if calculating 'Morgan' fingerprint.
 
+    n_jobs: int, optional (default = 1)
+        The number of worker processes to compute the fingerprints. If -1, all the available CPUs will be used.
+        The workers receive SMILES strings of the molecules, and only the resulting fingerprint vectors are sent back.
+
+    cache: chemml.utils.FeatureCache, optional (default = None)
+        If provided, the 'bit' vectors are looked up in the cache by the canonical SMILES of molecules and the
+        fingerprint parameters, and only the missing ones are computed (and stored in the cache).
+        The cache is not used for the 'int' vectors.
+
     kwargs:
         Any additional argument that should be passed to the rdkit fingerprint function.
 
@@ -46,7 +58,13 @@ class RDKitFingerprint(object):
         The number of molecules that are received.
 
     fps_: list
-        The list of rdkit fingerprint objects.
+        The list of rdkit fingerprint objects. It is only available if n_jobs=1 and the cache is not used.
+
+    vocabulary_: ndarray or None
+        The sorted feature ids of the 'int' vectors that define the columns of the sparse output, i.e., the feature id
+        of the column j is vocabulary_[j]. It is built from the first batch of molecules that is represented with
+        output='sparse', and is reused for the next batches. You can store and load it with the `store_vocabulary` and
+        `load_vocabulary` methods.
 
     """
 
@@ -55,18 +73,23 @@ class RDKitFingerprint(object):
                  vector='bit',
                  n_bits=1024,
                  radius=2,
+                 n_jobs=1,
+                 cache=None,
                  **kwargs):
         self.fingerprint_type = fingerprint_type
         self.n_bits = n_bits
         self.radius = radius
+        self.n_jobs = n_jobs
+        self.cache = cache
         self.kwargs = kwargs
+        self.vocabulary_ = None
         if not isinstance(vector, str) or vector.lower() not in ('bit', 'int'):
             msg = "The parameter vector must be either 'int' or 'bit'."
             raise ValueError(msg)
         else:
             self.vector = vector.lower()
 
-    def represent(self, molecules):
+    def represent(self, molecules, output='dataframe'):
         """
         The main function to provide fingerprint representation of input molecule(s).
 
@@ -78,10 +101,21 @@ class RDKitFingerprint(object):
             smiles automatically. However, the automatic conversion may ignore your manual settings, for example removed hydrogens,
             kekulized, or canonical smiles.
 
+        output: str, optional (default = 'dataframe')
+            The type of output. Available options:
+                - 'dataframe' : a pandas dataframe (uint8 values for bit vectors)
+                - 'packed' : a numpy array of uint8 values with shape (n_molecules, ceil(n_bits/8)), i.e., the bit
+                        vectors packed with `np.packbits` along the rows (8 bits per byte). It is only available for 'bit' vectors.
+                        Use `np.unpackbits(packed, axis=1)[:, :n_bits]` to get the bits back.
+                - 'sparse' : a scipy.sparse.csr_matrix of the counts (int32) with shape (n_molecules, len(vocabulary_)).
+                        It is only available for 'int' vectors. The columns are defined by the `vocabulary_` attribute,
+                        and the feature ids that are not in the vocabulary are ignored.
+
         Returns
         -------
-        pandas.DataFrame
-            A 2-dimensional pandas dataframe of fingerprint features with same number of rows as number of molecules.
+        pandas.DataFrame or ndarray or scipy.sparse.csr_matrix
+            A 2-dimensional pandas dataframe of fingerprint features with same number of rows as number of molecules,
+            or the packed bits as a numpy array if output='packed', or the sparse matrix of counts if output='sparse'.
 
         """
         if isinstance(molecules, list):
@@ -97,117 +131,206 @@ class RDKitFingerprint(object):
             raise ValueError(msg)
 
         self.n_molecules_ = molecules.shape[0]
+        self._check_type()
+        if output not in ('dataframe', 'packed', 'sparse'):
+            msg = "The parameter 'output' must be one of 'dataframe', 'packed' or 'sparse'."
+            raise ValueError(msg)
+        packed = output == 'packed'
+        if packed and self.vector != 'bit':
+            msg = "The packed output is only available for the 'bit' vectors."
+            raise ValueError(msg)
+        if output == 'sparse' and self.vector != 'int':
+            msg = "The sparse output is only available for the 'int' vectors."
+            raise ValueError(msg)
 
-        if self.fingerprint_type.lower() == 'hashed_atom_pair' or self.fingerprint_type.lower() == 'hap':
-            return self._hap(molecules)
-        elif self.fingerprint_type == 'MACCS' or self.fingerprint_type.lower() == 'maccs':
-            return self._maccs(molecules)
-        elif self.fingerprint_type.lower() == 'morgan':
-            return self._morgan(molecules)
-        elif self.fingerprint_type.lower() == 'hashed_topological_torsion' or self.fingerprint_type.lower() == 'htt':
-            return self._htt(molecules)
-        elif self.fingerprint_type.lower() == 'topological_torsion' or self.fingerprint_type.lower() == 'tt':
-            return self._tt(molecules)
+        if self.cache is not None and self.vector == 'bit':
+            data = self._represent_cached(molecules)
+            if not packed:
+                data = np.unpackbits(data, axis=1)[:, :self._bit_length()]
         else:
-            msg = "The parameter 'fingerprint_type' is not a valid fingerprint type: '%s'" % self.fingerprint_type
-            raise ValueError(msg)
+            data = self._compute(molecules, packed)
 
-    def _hap(self, molecules):
-        if self.vector == 'int':
-            from rdkit.Chem.AtomPairs.Pairs import GetHashedAtomPairFingerprint
-            self.fps_ = [
-                GetHashedAtomPairFingerprint(self._sanitary(m), nBits=self.n_bits, **self.kwargs)
-                for m in molecules
-            ]
-            # get nonzero elements as a dictionary for each molecule
-            dict_nonzero = [fp.GetNonzeroElements() for fp in self.fps_]
-            data = pd.DataFrame(dict_nonzero)
-            data.fillna(0, inplace=True)
+        if packed:
             return data
+        elif output == 'sparse':
+            return self._sparse_counts(data)
         elif self.vector == 'bit':
-            from rdkit.Chem.rdMolDescriptors import GetHashedAtomPairFingerprintAsBitVect
-            self.fps_ = [
-                GetHashedAtomPairFingerprintAsBitVect(
-                    self._sanitary(m), nBits=self.n_bits, **self.kwargs) for m in molecules
-            ]
-            data = np.array(self.fps_)
+            return pd.DataFrame(data)
+        else:
             data = pd.DataFrame(data)
+            data.fillna(0, inplace=True)
             return data
 
-    def _maccs(self, molecules):
-        if self.vector == 'int':
+    def _compute(self, molecules, packed=False):
+        """
+        The internal function to compute the fingerprints of molecules in this process or in worker processes.
+        """
+        n_jobs = self._n_workers()
+        if n_jobs == 1:
+            self.fps_ = [self._fingerprint(self._sanitary(m)) for m in molecules]
+            if self.vector == 'bit':
+                data = np.zeros((len(molecules), _row_length(self._bit_length(), packed)), dtype=np.uint8)
+                _fill_bits(self.fps_, data, packed)
+            else:
+                # get nonzero elements as a dictionary for each molecule
+                data = [fp.GetNonzeroElements() for fp in self.fps_]
+        else:
+            self.fps_ = None
+            data = self._represent_parallel(molecules, n_jobs, packed)
+        return data
+
+    def _represent_cached(self, molecules):
+        """
+        The internal function to get the packed bit vectors from the cache and compute only the missing ones.
+        """
+        ftype, vector, n_bits, radius, kwargs = self._params()
+        namespace = params_hash('RDKitFingerprint', {'fingerprint_type': ftype, 'vector': vector,
+                                                     'n_bits': self._bit_length(), 'radius': radius,
+                                                     'kwargs': sorted(kwargs.items())})
+        keys = [Chem.MolToSmiles(self._sanitary(m)) for m in molecules]
+        data, found = self.cache.get(namespace, keys, np.uint8, _row_length(self._bit_length(), True))
+        missing = np.where(~found)[0]
+        if len(missing) > 0:
+            data[missing] = self._compute(molecules[missing], packed=True)
+            self.cache.put(namespace, [keys[i] for i in missing], data[missing])
+        self.fps_ = None
+        return data
+
+    def _check_type(self):
+        """
+        The internal function to validate the combination of fingerprint type and vector.
+        """
+        ftype = _fingerprint_type(self.fingerprint_type)
+        if ftype is None:
+            msg = "The parameter 'fingerprint_type' is not a valid fingerprint type: '%s'" % self.fingerprint_type
+            raise ValueError(msg)
+        elif ftype == 'maccs' and self.vector == 'int':
             msg = "There is no RDKit function to encode integer vectors for MACCS keys"
             raise ValueError(msg)
-        elif self.vector == 'bit':
-            from rdkit.Chem.MACCSkeys import GenMACCSKeys
-            self.fps_ = [GenMACCSKeys(self._sanitary(mol), **self.kwargs) for mol in molecules]
-            data = np.array(self.fps_)
-            data = pd.DataFrame(data)
-            return data
+        elif ftype == 'tt' and self.vector == 'bit':
+            msg = "There is no RDKit function to encode bit vectors for Topological Torsion Fingerprints"
+            raise ValueError(msg)
 
-    def _morgan(self, molecules):
-        if self.vector == 'int':
-            from rdkit.Chem.rdMolDescriptors import GetMorganFingerprint
-            self.fps_ = [
-                GetMorganFingerprint(self._sanitary(mol), self.radius, **self.kwargs)
-                for mol in molecules
-            ]
-            # get nonzero elements as a dictionary for each molecule
-            dict_nonzero = [fp.GetNonzeroElements() for fp in self.fps_]
-            # pairScores = []
-            # for fp in dict_nonzero:
-            #     pairScores += list(fp)
-            data = pd.DataFrame(dict_nonzero)#, columns=list(set(pairScores)))
-            data.fillna(0, inplace=True)
-            return data
-        elif self.vector == 'bit':
-            from rdkit.Chem.rdMolDescriptors import GetMorganFingerprintAsBitVect
-            self.fps_ = [
-                GetMorganFingerprintAsBitVect(
-                    self._sanitary(mol), self.radius, nBits=self.n_bits, **self.kwargs)
-                for mol in molecules
-            ]
-            data = np.array(self.fps_)
-            data = pd.DataFrame(data)
-            return data
+    def _bit_length(self):
+        """
+        The internal function to get the length of bit vectors.
+        """
+        if _fingerprint_type(self.fingerprint_type) == 'maccs':
+            return 167
+        return self.n_bits
 
-    def _htt(self, molecules):
-        if self.vector == 'int':
-            from rdkit.Chem.rdMolDescriptors import GetHashedTopologicalTorsionFingerprint
-            self.fps_ = [
-                GetHashedTopologicalTorsionFingerprint(
-                    self._sanitary(mol), nBits=self.n_bits, **self.kwargs) for mol in molecules
-            ]
-            # get nonzero elements as a dictionary for each molecule
-            dict_nonzero = [fp.GetNonzeroElements() for fp in self.fps_]
-            data = pd.DataFrame(dict_nonzero)
-            data.fillna(0, inplace=True)
-            return data
-        elif self.vector == 'bit':
-            from rdkit.Chem.rdMolDescriptors import GetHashedTopologicalTorsionFingerprintAsBitVect
-            self.fps_ = [
-                GetHashedTopologicalTorsionFingerprintAsBitVect(
-                    self._sanitary(mol), nBits=self.n_bits, **self.kwargs) for mol in molecules
-            ]
-            data = np.array(self.fps_)
-            data = pd.DataFrame(data)
-            return data
+    def _n_workers(self):
+        """
+        The internal function to get the number of worker processes.
+        """
+        if self.n_jobs == -1:
+            return multiprocessing.cpu_count()
+        elif isinstance(self.n_jobs, int) and self.n_jobs >= 1:
+            return self.n_jobs
+        else:
+            msg = "The parameter 'n_jobs' must be a positive integer or -1."
+            raise ValueError(msg)
 
-    def _tt(self, molecules):
-        if self.vector == 'int':
-            from rdkit.Chem.AtomPairs.Torsions import GetTopologicalTorsionFingerprintAsIntVect
-            self.fps_ = [
-                GetTopologicalTorsionFingerprintAsIntVect(self._sanitary(mol), **self.kwargs)
-                for mol in molecules
-            ]
-            dict_nonzero = [fp.GetNonzeroElements() for fp in self.fps_]
-            data = pd.DataFrame(dict_nonzero)
-            data.fillna(0, inplace=True)
-            return data
-        elif self.vector == 'bit':
-            msg = "There is no RDKit function to encode bit vectors for Topological Torsion Fingerprints"
+    def _params(self):
+        """
+        The internal function to collect the fingerprint parameters that are sent to the worker processes.
+        """
+        return (_fingerprint_type(self.fingerprint_type), self.vector, self.n_bits, self.radius, self.kwargs)
+
+    def _fingerprint(self, rdkit_mol):
+        """
+        The internal function to compute the rdkit fingerprint object of an rdkit molecule.
+        """
+        return _calc_fingerprint(rdkit_mol, *self._params())
+
+    def _represent_parallel(self, molecules, n_jobs, packed=False):
+        """
+        The internal function to compute the fingerprints using a pool of worker processes.
+        """
+        # SMILES strings are cheap to send to the workers; keep explicit hydrogens as they change the fingerprints
+        smiles = [Chem.MolToSmiles(self._sanitary(m), canonical=False) for m in molecules]
+        chunk_size = max(1, int(np.ceil(len(smiles) / float(4 * n_jobs))))
+        chunks = [(smiles[i:i + chunk_size], self._params(), packed) for i in range(0, len(smiles), chunk_size)]
+
+        if self.vector == 'bit':
+            data = np.zeros((len(molecules), _row_length(self._bit_length(), packed)), dtype=np.uint8)
+        else:
+            data = []
+        pool = multiprocessing.Pool(n_jobs)
+        try:
+            start = 0
+            for result in pool.imap(_fingerprint_smiles, chunks):
+                if self.vector == 'bit':
+                    data[start:start + result.shape[0]] = result
+                    start += result.shape[0]
+                else:
+                    data += result
+        finally:
+            pool.terminate()
+        return data
+
+    def _sparse_counts(self, dict_nonzero):
+        """
+        The internal function to build the sparse matrix of counts directly from the nonzero elements of fingerprints.
+        """
+        lengths = np.array([len(d) for d in dict_nonzero], dtype=np.int64)
+        n_nonzero = int(lengths.sum())
+        ids = np.fromiter((k for d in dict_nonzero for k in d), dtype=np.int64, count=n_nonzero)
+        counts = np.fromiter((v for d in dict_nonzero for v in d.values()), dtype=np.int32, count=n_nonzero)
+        rows = np.repeat(np.arange(len(dict_nonzero)), lengths)
+
+        if self.vocabulary_ is None:
+            self.vocabulary_ = np.unique(ids)
+
+        # map the feature ids to the columns and ignore the ones that are not in the vocabulary
+        if len(self.vocabulary_) > 0:
+            cols = np.minimum(np.searchsorted(self.vocabulary_, ids), len(self.vocabulary_) - 1)
+            known = self.vocabulary_[cols] == ids
+        else:
+            cols = np.zeros(n_nonzero, dtype=np.int64)
+            known = np.zeros(n_nonzero, dtype=bool)
+
+        return scipy.sparse.csr_matrix((counts[known], (rows[known], cols[known])),
+                                       shape=(len(dict_nonzero), len(self.vocabulary_)))
+
+    def store_vocabulary(self, file):
+        """
+        This function stores the `vocabulary_` of the sparse output using `.npy` format, so that you can reuse the same
+        columns for other batches of molecules, e.g., in another session using the `load_vocabulary` method.
+
+        Parameters
+        ----------
+        file: str
+            Must be a path to the file with .npy format.
+
+        """
+        if not isinstance(file, str):
+            msg = "The parameter 'file' must be a path to the file with .npy format."
+            raise ValueError(msg)
+
+        if self.vocabulary_ is None:
+            msg = "The vocabulary has not been built yet. Call the 'represent' method with output='sparse' first."
             raise ValueError(msg)
 
+        np.save(file, self.vocabulary_)
+
+    def load_vocabulary(self, file):
+        """
+        This function loads a vocabulary that is stored by the `store_vocabulary` method and sets the `vocabulary_`
+        attribute. The next calls of the `represent` method with output='sparse' will use the loaded columns.
+
+        Parameters
+        ----------
+        file: str
+            Must be a path to the file with .npy format.
+
+        """
+        if not isinstance(file, str):
+            msg = "The parameter 'file' must be a path to the file with .npy format."
+            raise ValueError(msg)
+
+        self.vocabulary_ = np.load(file).astype(np.int64)
+
     def _sanitary(self, mol):
         if not isinstance(mol, Molecule):
             msg = "The molecule must be a chemml.chem.Molecule object or a list of objets."
@@ -227,16 +350,20 @@ class RDKitFingerprint(object):
         file: str
             Must be a path to the file with .npz format.
 
-        features: pandas.DataFrame
-            Must be the pandas dataframe as you receive it from `represent` method.
+        features: pandas.DataFrame or scipy.sparse matrix
+            Must be the pandas dataframe or the sparse matrix as you receive it from `represent` method.
 
         """
         if not isinstance(file, str):
             msg = "The parameter 'file' must be a path to the file with .npz format."
             raise ValueError(msg)
 
+        if scipy.sparse.issparse(features):
+            scipy.sparse.save_npz(file, features)
+            return
+
         if not isinstance(features, pd.DataFrame):
-            msg = "The parameter 'features' must be a pandas dataframe."
+            msg = "The parameter 'features' must be a pandas dataframe or a scipy sparse matrix."
             raise ValueError(msg)
 
         temp = scipy.sparse.csc_matrix(features.values)
@@ -263,3 +390,355 @@ class RDKitFingerprint(object):
 
         temp = scipy.sparse.load_npz(file)
         return pd.DataFrame(temp.todense())
+
+
+class FingerprintIndex(object):
+    """
+    A similarity search index of bit vector fingerprints, e.g., the output of RDKitFingerprint with vector='bit'.
+    The fingerprints are stored as packed bits in a contiguous uint8 array and are sorted by their number of
+    on-bits (popcount). The queries scan the library in blocks with vectorized numpy operations, starting from the
+    fingerprints with the most similar popcount, and stop as soon as the popcount bound of the remaining fingerprints
+    can't beat the current top-k scores (Swamidass & Baldi, 2007, J. Chem. Inf. Model.).
+
+    Parameters
+    ----------
+    fingerprints: ndarray or pandas.DataFrame, optional (default = None)
+        The bit vectors of the library with shape (n_molecules, n_bits), or the packed bits with shape
+        (n_molecules, ceil(n_bits/8)) as you receive them from `RDKitFingerprint.represent(..., output='packed')`.
+        If None, you must load a stored index using the `load` method.
+
+    packed: bool, optional (default = True)
+        If True, the fingerprints (and the queries) are packed bits. A pandas dataframe is always considered as unpacked bits.
+
+    block_size: int, optional (default = 100000)
+        The number of library fingerprints that are compared to a query at once.
+
+    Attributes
+    ----------
+    fingerprints_: ndarray
+        The packed bits of the library, sorted by the popcount. It can be a numpy memory map if loaded from the disk.
+
+    popcounts_: ndarray
+        The number of on-bits of each fingerprint in `fingerprints_`.
+
+    indices_: ndarray
+        The original index of each fingerprint in `fingerprints_`.
+
+    Examples
+    --------
+    >>> from chemml.chem import Molecule, RDKitFingerprint, FingerprintIndex
+    >>> library = [Molecule(smi, 'smiles') for smi in ['CCO', 'CCN', 'c1ccccc1O']]
+    >>> rdfp = RDKitFingerprint(fingerprint_type='morgan', vector='bit')
+    >>> index = FingerprintIndex(rdfp.represent(library, output='packed'))
+    >>> indices, scores = index.search(rdfp.represent(Molecule('CCCO', 'smiles'), output='packed'), k=2)
+    >>> index.save('library_index')
+    >>> index = FingerprintIndex()
+    >>> index.load('library_index', mmap_mode='r')   # shared by processes without reloading into memory
+    """
+
+    def __init__(self, fingerprints=None, packed=True, block_size=100000):
+        self.packed = packed
+        self.block_size = block_size
+        if fingerprints is not None:
+            fingerprints = self._pack(fingerprints)
+            popcounts = _popcount(fingerprints)
+            order = np.argsort(popcounts, kind='mergesort')
+            self.fingerprints_ = np.ascontiguousarray(fingerprints[order])
+            self.popcounts_ = popcounts[order]
+            self.indices_ = order
+
+    def _pack(self, fingerprints):
+        """
+        The internal function to validate the input fingerprints and return them as a 2D array of packed bits.
+        """
+        if isinstance(fingerprints, pd.DataFrame):
+            fingerprints = np.packbits(fingerprints.values.astype(np.uint8), axis=1)
+        elif isinstance(fingerprints, np.ndarray):
+            if fingerprints.ndim == 1:
+                fingerprints = fingerprints.reshape(1, -1)
+            if not self.packed:
+                fingerprints = np.packbits(fingerprints.astype(np.uint8), axis=1)
+        else:
+            msg = "The fingerprints must be a numpy array or a pandas dataframe."
+            raise ValueError(msg)
+
+        if fingerprints.ndim != 2 or fingerprints.dtype != np.uint8:
+            msg = "The packed fingerprints must be a 2 dimensional array of uint8 values."
+            raise ValueError(msg)
+
+        return fingerprints
+
+    def search(self, queries, k=10, metric='tanimoto', threshold=0.0):
+        """
+        finds the k most similar library fingerprints to each of the query fingerprints.
+
+        Parameters
+        ----------
+        queries: ndarray or pandas.DataFrame
+            The query fingerprints, in the same format as the library fingerprints.
+
+        k: int, optional (default = 10)
+            The number of similar fingerprints to be returned for each query.
+
+        metric: str, optional (default = 'tanimoto')
+            The similarity metric, either 'tanimoto' or 'dice'.
+
+        threshold: float, optional (default = 0.0)
+            The minimum similarity of the returned fingerprints.
+
+        Returns
+        -------
+        indices: ndarray
+            The original indices of the most similar fingerprints with shape (n_queries, k), sorted by the similarity.
+            If less than k fingerprints pass the threshold, the remaining indices are -1.
+
+        scores: ndarray
+            The similarity scores with shape (n_queries, k). The scores of missing fingerprints are nan.
+
+        """
+        if not hasattr(self, 'fingerprints_'):
+            msg = "The index is empty. Pass the library fingerprints to the constructor or use the load method."
+            raise ValueError(msg)
+        if metric not in ('tanimoto', 'dice'):
+            msg = "The parameter 'metric' must be either 'tanimoto' or 'dice'."
+            raise ValueError(msg)
+        if not isinstance(k, int) or k < 1:
+            msg = "The parameter 'k' must be a positive integer."
+            raise ValueError(msg)
+
+        queries = self._pack(queries)
+        if queries.shape[1] != self.fingerprints_.shape[1]:
+            msg = "The queries must have the same number of bits as the library fingerprints."
+            raise ValueError(msg)
+
+        # the library is sorted by popcount, so each popcount is a contiguous slice
+        counts = np.unique(self.popcounts_)
+        starts = np.searchsorted(self.popcounts_, counts, side='left')
+        ends = np.searchsorted(self.popcounts_, counts, side='right')
+
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), np.nan)
+        for q, query in enumerate(queries):
+            best_ind, best_score = self._search_one(query, k, metric, threshold, counts, starts, ends)
+            indices[q, :len(best_ind)] = self.indices_[best_ind]
+            scores[q, :len(best_ind)] = best_score
+        return indices, scores
+
+    def _search_one(self, query, k, metric, threshold, counts, starts, ends):
+        """
+        The internal function to find the top-k fingerprints of a single query.
+        """
+        c = int(_popcount(query.reshape(1, -1))[0])
+        # the upper bound of similarity for each popcount of the library
+        if metric == 'tanimoto':
+            bounds = np.minimum(counts, c) / np.maximum(np.maximum(counts, c), 1).astype(float)
+        else:
+            bounds = 2.0 * np.minimum(counts, c) / np.maximum(counts + c, 1).astype(float)
+
+        best_ind = np.zeros(0, dtype=np.int64)
+        best_score = np.zeros(0)
+        for g in np.argsort(-bounds, kind='mergesort'):
+            if bounds[g] < threshold or (len(best_ind) == k and bounds[g] <= best_score[-1]):
+                break
+            for start in range(starts[g], ends[g], self.block_size):
+                end = min(start + self.block_size, ends[g])
+                common = _popcount(np.bitwise_and(self.fingerprints_[start:end], query))
+                union = self.popcounts_[start:end].astype(float) + c
+                if metric == 'tanimoto':
+                    union -= common
+                    block_score = np.where(union > 0, common / np.maximum(union, 1), 0.0)
+                else:
+                    block_score = np.where(union > 0, 2.0 * common / np.maximum(union, 1), 0.0)
+
+                keep = block_score >= threshold
+                cand_ind = np.concatenate([best_ind, np.arange(start, end)[keep]])
+                cand_score = np.concatenate([best_score, block_score[keep]])
+                if len(cand_ind) > k:
+                    top = np.argpartition(-cand_score, k - 1)[:k]
+                    cand_ind, cand_score = cand_ind[top], cand_score[top]
+                order = np.lexsort((cand_ind, -cand_score))
+                best_ind, best_score = cand_ind[order], cand_score[order]
+
+        return best_ind, best_score
+
+    def save(self, path):
+        """
+        stores the index in a directory, as numpy files that can be loaded as memory maps.
+
+        Parameters
+        ----------
+        path: str
+            The path to the directory. It will be created if it doesn't exist.
+
+        """
+        if not hasattr(self, 'fingerprints_'):
+            msg = "The index is empty and can't be stored."
+            raise ValueError(msg)
+        if not isinstance(path, str):
+            msg = "The parameter 'path' must be a path to a directory."
+            raise ValueError(msg)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        np.save(os.path.join(path, 'fingerprints.npy'), self.fingerprints_)
+        np.save(os.path.join(path, 'popcounts.npy'), self.popcounts_)
+        np.save(os.path.join(path, 'indices.npy'), self.indices_)
+
+    def load(self, path, mmap_mode='r'):
+        """
+        loads an index that is stored by the `save` method.
+
+        Parameters
+        ----------
+        path: str
+            The path to the directory of the stored index.
+
+        mmap_mode: str or None, optional (default = 'r')
+            The memory map mode of the `numpy.load` function. With the default value the fingerprints are read from the
+            disk on demand, and the operating system shares the pages between the processes that load the same index.
+            If None, the whole index is loaded into memory.
+
+        """
+        if not isinstance(path, str) or not os.path.isdir(path):
+            msg = "The parameter 'path' must be a path to the directory of a stored index."
+            raise ValueError(msg)
+        self.fingerprints_ = np.load(os.path.join(path, 'fingerprints.npy'), mmap_mode=mmap_mode)
+        self.popcounts_ = np.load(os.path.join(path, 'popcounts.npy'))
+        self.indices_ = np.load(os.path.join(path, 'indices.npy'))
+
+
+# number of on-bits of each byte value
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(packed):
+    """
+    The internal function to count the on-bits in each row of an array of packed bits.
+    """
+    return _BYTE_POPCOUNT[packed].sum(axis=1, dtype=np.int64)
+
+def _fingerprint_type(fingerprint_type):
+    """
+    The internal function to map the name of a fingerprint type to its short name (None if it's not valid).
+    """
+    if not isinstance(fingerprint_type, str):
+        return None
+    ftype = fingerprint_type.lower()
+    if ftype in ('hashed_atom_pair', 'hap'):
+        return 'hap'
+    elif ftype == 'maccs':
+        return 'maccs'
+    elif ftype == 'morgan':
+        return 'morgan'
+    elif ftype in ('hashed_topological_torsion', 'htt'):
+        return 'htt'
+    elif ftype in ('topological_torsion', 'tt'):
+        return 'tt'
+
+
+def _calc_fingerprint(mol, ftype, vector, n_bits, radius, kwargs):
+    """
+    The internal function to compute the rdkit fingerprint object of an rdkit molecule.
+    """
+    if ftype == 'hap':
+        if vector == 'int':
+            from rdkit.Chem.AtomPairs.Pairs import GetHashedAtomPairFingerprint
+            return GetHashedAtomPairFingerprint(mol, nBits=n_bits, **kwargs)
+        else:
+            from rdkit.Chem.rdMolDescriptors import GetHashedAtomPairFingerprintAsBitVect
+            return GetHashedAtomPairFingerprintAsBitVect(mol, nBits=n_bits, **kwargs)
+    elif ftype == 'maccs':
+        from rdkit.Chem.MACCSkeys import GenMACCSKeys
+        return GenMACCSKeys(mol, **kwargs)
+    elif ftype == 'morgan':
+        if vector == 'int':
+            from rdkit.Chem.rdMolDescriptors import GetMorganFingerprint
+            return GetMorganFingerprint(mol, radius, **kwargs)
+        else:
+            from rdkit.Chem.rdMolDescriptors import GetMorganFingerprintAsBitVect
+            return GetMorganFingerprintAsBitVect(mol, radius, nBits=n_bits, **kwargs)
+    elif ftype == 'htt':
+        if vector == 'int':
+            from rdkit.Chem.rdMolDescriptors import GetHashedTopologicalTorsionFingerprint
+            return GetHashedTopologicalTorsionFingerprint(mol, nBits=n_bits, **kwargs)
+        else:
+            from rdkit.Chem.rdMolDescriptors import GetHashedTopologicalTorsionFingerprintAsBitVect
+            return GetHashedTopologicalTorsionFingerprintAsBitVect(mol, nBits=n_bits, **kwargs)
+    elif ftype == 'tt':
+        from rdkit.Chem.AtomPairs.Torsions import GetTopologicalTorsionFingerprintAsIntVect
+        return GetTopologicalTorsionFingerprintAsIntVect(mol, **kwargs)
+
+
+def _row_length(n_bits, packed):
+    """
+    The internal function to get the number of uint8 elements per row of the bit vectors.
+    """
+    if packed:
+        return int(np.ceil(n_bits / 8.0))
+    return n_bits
+
+
+def _fill_bits(fps, out, packed=False, block_size=4096):
+    """
+    The internal function to copy the bits of rdkit bit vectors into the rows of a preallocated uint8 array.
+    The bit strings of a block of fingerprints are converted with a single buffer read, instead of iterating
+    over the bits of each vector in python.
+
+    Parameters
+    ----------
+    fps: list
+        The list of rdkit bit vectors of the same length.
+
+    out: ndarray
+        The preallocated uint8 array of shape (len(fps), n_bits), or (len(fps), ceil(n_bits/8)) if packed.
+
+    packed: bool, optional (default = False)
+        If True, the bits are packed into bytes along the rows with np.packbits.
+
+    block_size: int, optional (default = 4096)
+        The number of fingerprints that are converted together.
+
+    """
+    for start in range(0, len(fps), block_size):
+        block = fps[start:start + block_size]
+        bits = np.frombuffer(''.join([fp.ToBitString() for fp in block]).encode('ascii'), dtype=np.uint8)
+        bits = (bits - ord('0')).reshape(len(block), -1)
+        if packed:
+            out[start:start + len(block)] = np.packbits(bits, axis=1)
+        else:
+            out[start:start + len(block)] = bits
+
+
+def _fingerprint_smiles(args):
+    """
+    The worker function to compute the fingerprints of a chunk of SMILES strings.
+
+    Parameters
+    ----------
+    args: tuple
+        The list of SMILES strings, the fingerprint parameters, i.e., (ftype, vector, n_bits, radius, kwargs),
+        and whether the bits must be packed.
+
+    Returns
+    -------
+    ndarray or list
+        The uint8 array of (packed) bits for bit vectors, otherwise the list of nonzero elements of each fingerprint.
+
+    """
+    smiles, params, packed = args
+    ps = Chem.SmilesParserParams()
+    ps.removeHs = False
+    fps = []
+    for smi in smiles:
+        mol = Chem.MolFromSmiles(smi, ps)
+        if mol is None:
+            msg = "The SMILES string '%s' can not be parsed by RDKit." % smi
+            raise ValueError(msg)
+        fps.append(_calc_fingerprint(mol, *params))
+
+    if params[1] == 'bit':
+        length = 167 if params[0] == 'maccs' else params[2]
+        data = np.zeros((len(fps), _row_length(length, packed)), dtype=np.uint8)
+        _fill_bits(fps, data, packed)
+        return data
+    else:
+        return [fp.GetNonzeroElements() for fp in fps]
@@ -1,26 +1,32 @@
 """
 The chemml.chem module includes (please click on links adjacent to function names for more information):
     - Molecule: :func:`~chemml.chem.Molecule`
+    - MoleculeBatch: :func:`~chemml.chem.MoleculeBatch`
     - XYZ: :func:`~chemml.chem.XYZ`
     - CoulombMatrix: :func:`~chemml.chem.CoulombMatrix`
     - BagofBonds: :func:`~chemml.chem.BagofBonds`
     - RDKitFingerprint: :func:`~chemml.chem.RDKitFingerprint`
+    - FingerprintIndex: :func:`~chemml.chem.FingerprintIndex`
     - Dragon: :func:`~chemml.chem.Dragon`
 """
 
 from .molecule import Molecule
+from .molecule import MoleculeBatch
 from .molecule import XYZ
 from .CoulMat import CoulombMatrix
 from .CoulMat import BagofBonds
 from .RDKFP import RDKitFingerprint
+from .RDKFP import FingerprintIndex
 from .Dragon import Dragon
 
 
 __all__ = [
     'Molecule',
+    'MoleculeBatch',
     'XYZ',
     'CoulombMatrix',
     'BagofBonds',
     'RDKitFingerprint',
+    'FingerprintIndex',
     'Dragon',
 ]
\ No newline at end of file
@@ -1,14 +1,23 @@
 from __future__ import print_function
 import os
+import time
+import multiprocessing
+from collections import deque
 from rdkit import Chem
 import pybel
 from rdkit.Chem import AllChem
 import warnings
 import numpy as np
+import pandas as pd
 
 from ..utils import update_default_kwargs
 
 
+# the atomic symbols indexed by the atomic number
+_PERIODIC_TABLE = Chem.GetPeriodicTable()
+_ATOMIC_SYMBOLS = np.array([_PERIODIC_TABLE.GetElementSymbol(z) for z in range(119)])
+
+
 class XYZ(object):
     """
     This class stores the information that is typically carried by standard XYZ files.
@@ -23,40 +32,59 @@ class XYZ(object):
         The numpy array of shape (number_of_atoms, 1).
         It stores the atomic numbers of each atom in the molecule (in the same order as geometry).
 
-    atomic_symbols: ndarray
+    atomic_symbols: ndarray, optional (default = None)
         The numpy array of shape (number_of_atoms, 1).
         It stores the atomic symbols of each atom in the molecule (in the same order as geometry).
+        The symbols must match the atomic numbers. They are not stored, they are always looked up from the atomic numbers.
+
+    Notes
+    -----
+        - The atomic numbers are stored as uint8. The geometry is stored as it is passed (e.g., a float32 view into
+        the buffer of a `MoleculeBatch.compact`).
 
     """
-    def __init__(self,geometry, atomic_numbers, atomic_symbols):
+    __slots__ = ('geometry', 'atomic_numbers')
+
+    def __init__(self,geometry, atomic_numbers, atomic_symbols=None):
         # check data type
         if not (isinstance(geometry, np.ndarray) and isinstance(atomic_numbers,np.ndarray)
-                and isinstance(atomic_symbols, np.ndarray)):
+                and (atomic_symbols is None or isinstance(atomic_symbols, np.ndarray))):
             msg = "The parameters' value must be numpy array."
             raise ValueError(msg)
         else:
             # check dimensions
-            if geometry.ndim != 2 or atomic_symbols.ndim != 2 or atomic_numbers.ndim != 2:
+            if geometry.ndim != 2 or atomic_numbers.ndim != 2 or \
+                    (atomic_symbols is not None and atomic_symbols.ndim != 2):
                 msg = "The parameters' arrays must be 2 dimensional."
                 raise ValueError(msg)
         # cast data format
         try:
-            geometry.astype(float)
-            atomic_numbers.astype(int)
-            atomic_symbols.astype(str)
+            if geometry.dtype.kind != 'f':
+                geometry = geometry.astype(float)
+            atomic_numbers = atomic_numbers.astype(int)
+            if atomic_symbols is not None:
+                atomic_symbols = atomic_symbols.astype(str)
         except ValueError:
             msg = "The input data must be able to be casted to the following specified types:\n" \
                   "    - geoometry      >> float\n" \
                   "    - atomic_numbers >> integer\n" \
                   "    - atomic_symbols >> string"
             raise ValueError(msg)
+        # check atomic numbers before the uint8 cast, which would wrap them
+        if atomic_numbers.size > 0 and (atomic_numbers.min() < 0 or atomic_numbers.max() > 118):
+            msg = "The atomic numbers must be between 0 and 118."
+            raise ValueError(msg)
+        atomic_numbers = atomic_numbers.astype(np.uint8)
         # check shapes
         if geometry.shape[1] == 3:
-            if geometry.shape[0] == atomic_symbols.shape[0] and \
-               geometry.shape[0] == atomic_numbers.shape[0] :
+            if geometry.shape[0] == atomic_numbers.shape[0] and \
+               (atomic_symbols is None or geometry.shape[0] == atomic_symbols.shape[0]):
+                if atomic_symbols is not None and \
+                        not np.array_equal(atomic_symbols.ravel(), _ATOMIC_SYMBOLS[atomic_numbers.ravel()]):
+                    msg = "The atomic symbols don't match the atomic numbers."
+                    raise ValueError(msg)
                 self.geometry = geometry
                 self.atomic_numbers = atomic_numbers
-                self.atomic_symbols = atomic_symbols
             else:
                 msg = "The number of atoms in the molecule is different between entries."
                 raise ValueError(msg)
@@ -69,6 +97,20 @@ class XYZ(object):
                ' atomic_numbers: {self.atomic_numbers.shape!r},' \
                ' atomic_symbols: {self.atomic_symbols.shape!r})>'.format(self=self)
 
+    @property
+    def atomic_symbols(self):
+        return _ATOMIC_SYMBOLS[self.atomic_numbers]
+
+    @classmethod
+    def _from_arrays(cls, geometry, atomic_numbers):
+        """
+        The internal function to build the object from pre-validated arrays (e.g., views into a batch buffer).
+        """
+        xyz = cls.__new__(cls)
+        xyz.geometry = geometry
+        xyz.atomic_numbers = atomic_numbers
+        return xyz
+
 
 class Molecule(object):
     """
@@ -265,14 +307,45 @@ class Molecule(object):
            ['H'],
            ['H'],
            ['H'],
-           ['H']], dtype='<U1')
+           ['H']], dtype='<U2')
     """
+    __slots__ = ('_rdkit_molecule', '_pybel_molecule', '_rdkit_source', '_pybel_source', 'creator',
+                 '_smiles', '_smiles_args', '_smarts', '_smarts_args', '_inchi', '_inchi_args',
+                 '_xyz', '_UFF_args', '_MMFF_args')
+
+    # default arguments
+    _default_rdkit_smiles_args = {"isomericSmiles":True, "kekuleSmiles":False, "rootedAtAtom":-1, "canonical":True, "allBondsExplicit":False,
+            "allHsExplicit":False} #"doRandom":False
+    _default_rdkit_smarts_args = {"isomericSmiles":True}
+    _default_rdkit_inchi_args = {"options":'', 'logLevel':None, 'treatWarningAsError':False}
+    _default_UFF_args = {'maxIters':200, 'vdwThresh':10.0, 'confId':-1, 'ignoreInterfragInteractions':True}
+    _default_MMFF_args = {'mmffVariant':'MMFF94', 'maxIters':200, 'nonBondedThresh':100.0, 'confId':-1, 'ignoreInterfragInteractions':True}
+
+    # method: to_smiles
+    _to_smiles_core_names = ("rdkit.Chem.MolToSmarts",)
+    _to_smiles_core_docs = ("http://rdkit.org/docs/source/rdkit.Chem.inchi.html?highlight=inchi#rdkit.Chem.inchi.MolToInchi",)
+    # method: to_smarts
+    _to_smarts_core_names = ("rdkit.Chem.MolToSmarts",)
+    _to_smarts_core_docs = ("http://rdkit.org/docs/source/rdkit.Chem.inchi.html?highlight=inchi#rdkit.Chem.inchi.MolToInchi",)
+    # method: to_inchi
+    _to_inchi_core_names = ("rdkit.Chem.MolToInchi",)
+    _to_inchi_core_docs = ("http://rdkit.org/docs/source/rdkit.Chem.inchi.html?highlight=inchi#rdkit.Chem.inchi.MolToInchi",)
+    # method: hydrogens
+    _hydrogens_core_names = ("rdkit.Chem.AddHs","rdkit.Chem.RemoveHs")
+    _hydrogens_core_docs = ("http://rdkit.org/docs/source/rdkit.Chem.rdmolops.html?highlight=addhs#rdkit.Chem.rdmolops.AddHs",
+                            "http://rdkit.org/docs/source/rdkit.Chem.rdmolops.html?highlight=addhs#rdkit.Chem.rdmolops.RemoveHs")
+    #
+    _to_xyz_core_names = ("rdkit.Chem.AllChem.MMFFOptimizeMolecule","rdkit.Chem.AllChem.UFFOptimizeMolecule")
+    _to_xyz_core_docs =(
+        "http://rdkit.org/docs/source/rdkit.Chem.rdForceFieldHelpers.html?highlight=mmff#rdkit.Chem.rdForceFieldHelpers.MMFFOptimizeMolecule",
+        "http://rdkit.org/docs/source/rdkit.Chem.rdForceFieldHelpers.html?highlight=mmff#rdkit.Chem.rdForceFieldHelpers.UFFOptimizeMolecule"
+    )
+
     def __init__(self, input, input_type, **kwargs):
         self.rdkit_molecule = None
         self.pybel_molecule = None
         self.creator = None
         self._init_attributes()
-        self._extra_docs()
         self._load(input, input_type, **kwargs)
 
     def __repr__(self):
@@ -299,34 +372,124 @@ class Molecule(object):
         self._xyz = None
         self._UFF_args = None
         self._MMFF_args = None
-        # default arguments
-        self._default_rdkit_smiles_args = {"isomericSmiles":True, "kekuleSmiles":False, "rootedAtAtom":-1, "canonical":True, "allBondsExplicit":False,
-                "allHsExplicit":False} #"doRandom":False
-        self._default_rdkit_smarts_args = {"isomericSmiles":True}
-        self._default_rdkit_inchi_args = {"options":'', 'logLevel':None, 'treatWarningAsError':False}
-        self._default_UFF_args = {'maxIters':200, 'vdwThresh':10.0, 'confId':-1, 'ignoreInterfragInteractions':True}
-        self._default_MMFF_args = {'mmffVariant':'MMFF94', 'maxIters':200, 'nonBondedThresh':100.0, 'confId':-1, 'ignoreInterfragInteractions':True}
-
-    def _extra_docs(self):
-        # method: to_smiles
-        self._to_smiles_core_names = ("rdkit.Chem.MolToSmarts",)
-        self._to_smiles_core_docs = ("http://rdkit.org/docs/source/rdkit.Chem.inchi.html?highlight=inchi#rdkit.Chem.inchi.MolToInchi",)
-        # method: to_smarts
-        self._to_smarts_core_names = ("rdkit.Chem.MolToSmarts",)
-        self._to_smarts_core_docs = ("http://rdkit.org/docs/source/rdkit.Chem.inchi.html?highlight=inchi#rdkit.Chem.inchi.MolToInchi",)
-        # method: to_inchi
-        self._to_inchi_core_names = ("rdkit.Chem.MolToInchi",)
-        self._to_inchi_core_docs = ("http://rdkit.org/docs/source/rdkit.Chem.inchi.html?highlight=inchi#rdkit.Chem.inchi.MolToInchi",)
-        # method: hydrogens
-        self._hydrogens_core_names = ("rdkit.Chem.AddHs","rdkit.Chem.RemoveHs")
-        self._hydrogens_core_docs = ("http://rdkit.org/docs/source/rdkit.Chem.rdmolops.html?highlight=addhs#rdkit.Chem.rdmolops.AddHs",
-                                    "http://rdkit.org/docs/source/rdkit.Chem.rdmolops.html?highlight=addhs#rdkit.Chem.rdmolops.RemoveHs")
-        #
-        self._to_xyz_core_names = ("rdkit.Chem.AllChem.MMFFOptimizeMolecule","rdkit.Chem.AllChem.UFFOptimizeMolecule")
-        self._to_xyz_core_docs =(
-            "http://rdkit.org/docs/source/rdkit.Chem.rdForceFieldHelpers.html?highlight=mmff#rdkit.Chem.rdForceFieldHelpers.MMFFOptimizeMolecule",
-            "http://rdkit.org/docs/source/rdkit.Chem.rdForceFieldHelpers.html?highlight=mmff#rdkit.Chem.rdForceFieldHelpers.UFFOptimizeMolecule"
-        )
+
+    def __getstate__(self):
+        # the toolkit objects are replaced by their compact sources (rebuilt on demand after unpickling)
+        state = {name: getattr(self, name) for name in self.__slots__
+                 if name not in ('_rdkit_molecule', '_pybel_molecule', '_rdkit_source', '_pybel_source', '_xyz')}
+        if self._rdkit_molecule is not None:
+            state['_rdkit_source'] = self._pack_rdkit()
+        else:
+            state['_rdkit_source'] = self._rdkit_source
+        if self._pybel_molecule is not None:
+            state['_pybel_source'] = self._pybel_molecule.write('mol')
+        else:
+            state['_pybel_source'] = self._pybel_source
+        if self._xyz is not None:
+            state['_xyz'] = (self._xyz.geometry, self._xyz.atomic_numbers)
+        else:
+            state['_xyz'] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._rdkit_molecule = None
+        self._pybel_molecule = None
+        if state['_xyz'] is not None:
+            self._xyz = XYZ._from_arrays(*state['_xyz'])
+
+    def _pack_rdkit(self):
+        """
+        The internal function to pack the rdkit molecule as its canonical SMILES (with explicit hydrogens), the order
+        of atoms in the SMILES string, and the coordinates of the first conformation (if any).
+        """
+        mol = self._rdkit_molecule
+        if self.creator is not None and self.creator[0] == 'SMARTS':
+            # query molecules don't survive a round trip through SMILES
+            return ('binary', mol.ToBinary())
+        smiles = Chem.MolToSmiles(mol)
+        order = np.array(mol.GetPropsAsDict(True, True)['_smilesAtomOutputOrder'], dtype=np.int32)
+        positions = None
+        if mol.GetNumConformers() > 0:
+            positions = mol.GetConformer().GetPositions()
+            if self._xyz is not None and np.array_equal(self._xyz.geometry, positions):
+                positions = 'xyz'   # don't store the same coordinates twice
+        return ('state', (smiles, order, positions))
+
+    @property
+    def rdkit_molecule(self):
+        if self._rdkit_molecule is None and self._rdkit_source is not None:
+            fmt, text = self._rdkit_source
+            if fmt == 'mol':
+                self._rdkit_molecule = Chem.MolFromMolBlock(text, removeHs=False)
+            elif fmt == 'binary':
+                self._rdkit_molecule = Chem.Mol(text)
+            elif fmt == 'state':
+                self._rdkit_molecule = self._unpack_rdkit(*text)
+            else:
+                params = Chem.SmilesParserParams()
+                params.removeHs = False
+                self._rdkit_molecule = Chem.MolFromSmiles(text, params)
+        return self._rdkit_molecule
+
+    def _unpack_rdkit(self, smiles, order, positions):
+        """
+        The internal function to rebuild the rdkit molecule from the output of the `_pack_rdkit` method.
+        """
+        params = Chem.SmilesParserParams()
+        params.removeHs = False
+        mol = Chem.MolFromSmiles(smiles, params)
+        # restore the original order of atoms
+        mol = Chem.RenumberAtoms(mol, [int(i) for i in np.argsort(order)])
+        if positions is not None:
+            if isinstance(positions, str):
+                positions = self._xyz.geometry
+            conf = Chem.Conformer(mol.GetNumAtoms())
+            for i, position in enumerate(np.asarray(positions, dtype=float)):
+                conf.SetAtomPosition(i, position.tolist())
+            conf.Set3D(True)
+            mol.AddConformer(conf, assignId=True)
+        return mol
+
+    @rdkit_molecule.setter
+    def rdkit_molecule(self, value):
+        self._rdkit_molecule = value
+        self._rdkit_source = None
+
+    @property
+    def pybel_molecule(self):
+        if self._pybel_molecule is None and self._pybel_source is not None:
+            self._pybel_molecule = pybel.readstring('mol', self._pybel_source)
+        return self._pybel_molecule
+
+    @pybel_molecule.setter
+    def pybel_molecule(self, value):
+        self._pybel_molecule = value
+        self._pybel_source = None
+
+    def compact(self):
+        """
+        This function releases the rdkit and pybel molecule objects to save memory.
+        They are rebuilt on demand (i.e., the first time that they are accessed) from their stored molblock, or from
+        the SMILES string if the rdkit molecule has no 3D conformation.
+
+        Notes
+        -----
+            - Only the first conformation of the rdkit molecule is kept.
+            - The rdkit molecule is rebuilt with the same atoms (including explicit hydrogens), but any custom atom or
+            molecule property is not preserved.
+
+        """
+        if self._rdkit_molecule is not None:
+            if self._rdkit_molecule.GetNumConformers() > 0:
+                self._rdkit_source = ('mol', Chem.MolToMolBlock(self._rdkit_molecule))
+            else:
+                self._rdkit_source = ('smiles', Chem.MolToSmiles(self._rdkit_molecule, canonical=False))
+            self._rdkit_molecule = None
+        if self._pybel_molecule is not None:
+            self._pybel_source = self._pybel_molecule.write('mol')
+            self._pybel_molecule = None
 
     @property
     def smiles(self):
@@ -514,6 +677,37 @@ class Molecule(object):
         if self.creator[0]=='XYZ':
             self.to_xyz()
 
+    @classmethod
+    def _from_rdkit(cls, rdkit_mol, creator, smiles=None):
+        """
+        The internal function to build a molecule from a pre-built rdkit molecule object, without parsing the creator
+        string again. The SMILES string is only stored if it is provided.
+        """
+        mol = cls.__new__(cls)
+        mol.rdkit_molecule = rdkit_mol
+        mol.pybel_molecule = None
+        mol.creator = creator
+        mol._init_attributes()
+        if smiles is not None:
+            mol._smiles = smiles
+            mol._smiles_args = dict(mol._default_rdkit_smiles_args)
+        return mol
+
+    @staticmethod
+    def from_smiles_file(path, n_jobs=1, chunk_size=10000, smiles_column='smiles', canonical=False, **kwargs):
+        """
+        This function builds a batch of molecules from a file of SMILES strings.
+        It's a shortcut to the `MoleculeBatch.from_smiles_file` method, please check its documentation for the details.
+
+        Returns
+        -------
+        MoleculeBatch
+            The batch of molecules and the indices of the SMILES strings that couldn't be parsed.
+
+        """
+        return MoleculeBatch.from_smiles_file(path, n_jobs=n_jobs, chunk_size=chunk_size,
+                                              smiles_column=smiles_column, canonical=canonical, **kwargs)
+
     def _multiple_molecules(self, mols, creator):
         for mol in mols:
             m = Molecule()
@@ -723,8 +917,7 @@ class Molecule(object):
         geometry = conf.GetPositions()
         atoms_list = self.rdkit_molecule.GetAtoms()
         atomic_nums = np.array([i.GetAtomicNum() for i in atoms_list])
-        atomic_symbols = np.array([i.GetSymbol() for i in atoms_list])
-        self._xyz = XYZ(geometry, atomic_nums.reshape(-1,1), atomic_symbols.reshape(-1,1))
+        self._xyz = XYZ(geometry, atomic_nums.reshape(-1,1))
 
         if optimizer=='UFF':
             self._UFF_args = update_default_kwargs(self._default_UFF_args, kwargs,
@@ -739,127 +932,7 @@ class Molecule(object):
         """
         geometry = np.array([atom.coords for atom in self.pybel_molecule])
         atomic_nums = np.array([atom.atomicnum for atom in self.pybel_molecule])
-        # pybel atom types are extended
-        Z = {44: 'Ru',
-             75: 'Re',
-             104: 'Rf',
-             111: 'Rg',
-             88: 'Ra',
-             37: 'Rb',
-             86: 'Rn',
-             45: 'Rh',
-             4: 'Be',
-             56: 'Ba',
-             107: 'Bh',
-             83: 'Bi',
-             97: 'Bk',
-             35: 'Br',
-             1: 'H',
-             15: 'P',
-             76: 'Os',
-             99: 'Es',
-             80: 'Hg',
-             32: 'Ge',
-             64: 'Gd',
-             31: 'Ga',
-             59: 'Pr',
-             78: 'Pt',
-             94: 'Pu',
-             6: 'C',
-             82: 'Pb',
-             91: 'Pa',
-             46: 'Pd',
-             48: 'Cd',
-             84: 'Po',
-             61: 'Pm',
-             108: 'Hs',
-             115: 'Uup',
-             117: 'Uus',
-             118: 'Uuo',
-             67: 'Ho',
-             72: 'Hf',
-             19: 'K',
-             2: 'He',
-             101: 'Md',
-             12: 'Mg',
-             42: 'Mo',
-             25: 'Mn',
-             8: 'O',
-             109: 'Mt',
-             16: 'S',
-             74: 'W',
-             30: 'Zn',
-             63: 'Eu',
-             40: 'Zr',
-             68: 'Er',
-             28: 'Ni',
-             102: 'No',
-             11: 'Na',
-             41: 'Nb',
-             60: 'Nd',
-             10: 'Ne',
-             93: 'Np',
-             87: 'Fr',
-             26: 'Fe',
-             114: 'Fl',
-             100: 'Fm',
-             5: 'B',
-             9: 'F',
-             38: 'Sr',
-             7: 'N',
-             36: 'Kr',
-             14: 'Si',
-             50: 'Sn',
-             62: 'Sm',
-             23: 'V',
-             21: 'Sc',
-             51: 'Sb',
-             106: 'Sg',
-             34: 'Se',
-             27: 'Co',
-             112: 'Cn',
-             96: 'Cm',
-             17: 'Cl',
-             20: 'Ca',
-             98: 'Cf',
-             58: 'Ce',
-             54: 'Xe',
-             71: 'Lu',
-             55: 'Cs',
-             24: 'Cr',
-             29: 'Cu',
-             57: 'La',
-             3: 'Li',
-             116: 'Lv',
-             81: 'Tl',
-             69: 'Tm',
-             103: 'Lr',
-             90: 'Th',
-             22: 'Ti',
-             52: 'Te',
-             65: 'Tb',
-             43: 'Tc',
-             73: 'Ta',
-             70: 'Yb',
-             105: 'Db',
-             66: 'Dy',
-             110: 'Ds',
-             53: 'I',
-             92: 'U',
-             39: 'Y',
-             89: 'Ac',
-             47: 'Ag',
-             113: 'Uut',
-             77: 'Ir',
-             95: 'Am',
-             13: 'Al',
-             33: 'As',
-             18: 'Ar',
-             79: 'Au',
-             85: 'At',
-             49: 'In'}
-        atomic_symbols = np.array([Z[i] for i in atomic_nums])
-        self._xyz = XYZ(geometry, atomic_nums.reshape(-1, 1), atomic_symbols.reshape(-1, 1))
+        self._xyz = XYZ(geometry, atomic_nums.reshape(-1, 1))
 
     def visualize(self, filename=None, **kwargs):
         """
@@ -897,3 +970,640 @@ class Molecule(object):
             else:
                 return self.pybel_molecule # it seems that the object alone is displayable
 
+
+
+class MoleculeBatch(object):
+    """
+    A compact collection of molecules that are built from a large number of SMILES strings.
+    The SMILES strings are parsed in chunks (optionally by a pool of worker processes), and the invalid ones are
+    recorded as failures instead of raising an error.
+
+    Parameters
+    ----------
+    molecules: list
+        The list of Molecule objects.
+
+    indices: array-like, optional (default = None)
+        The index of the input SMILES string of each molecule. If None, the molecules are indexed from zero.
+
+    failures: array-like, optional (default = None)
+        The indices of the input SMILES strings that couldn't be parsed.
+
+    Attributes
+    ----------
+    molecules: list
+        The list of Molecule objects.
+
+    indices: ndarray
+        The index of the input SMILES string of each molecule.
+
+    failures: ndarray
+        The indices of the input SMILES strings that couldn't be parsed.
+
+    geometry: ndarray
+        The float32 array of shape (total_number_of_atoms, 3) that holds the geometries of all the molecules, after
+        calling the `compact` method. Otherwise, None.
+
+    atomic_numbers: ndarray
+        The uint8 array of shape (total_number_of_atoms, 1) that holds the atomic numbers of all the molecules, after
+        calling the `compact` method. Otherwise, None.
+
+    atom_offsets: ndarray
+        The array of length (number_of_molecules + 1); the atoms of the i-th molecule are stored between
+        atom_offsets[i] and atom_offsets[i+1] of the above arrays. Otherwise, None.
+
+    Notes
+    -----
+        - By default the creator SMILES strings are not re-serialized to the canonical SMILES (i.e., the `smiles`
+        attribute of the molecules is None) unless you set the `canonical` parameter. You can still call the
+        `to_smiles` method of each molecule later on.
+
+    Examples
+    --------
+    >>> from chemml.chem import Molecule
+    >>> batch = Molecule.from_smiles_file('molecules.smi', n_jobs=4)
+    >>> len(batch), batch.failures
+    (99998, array([   17, 52011]))
+    >>> from chemml.chem import RDKitFingerprint
+    >>> X = RDKitFingerprint().represent(batch.molecules)
+    """
+    def __init__(self, molecules, indices=None, failures=None):
+        self.molecules = list(molecules)
+        if indices is None:
+            self.indices = np.arange(len(self.molecules), dtype=np.int64)
+        else:
+            self.indices = np.asarray(indices, dtype=np.int64)
+        if failures is None:
+            self.failures = np.zeros(0, dtype=np.int64)
+        else:
+            self.failures = np.asarray(failures, dtype=np.int64)
+        if len(self.indices) != len(self.molecules):
+            msg = "The number of indices must be same as the number of molecules."
+            raise ValueError(msg)
+        self.geometry = None
+        self.atomic_numbers = None
+        self.atom_offsets = None
+        self._shared_memory = None
+
+    def __repr__(self):
+        return '<chemml.chem.MoleculeBatch(molecules: {n!r}, failures: {f!r})>'.format(n=len(self.molecules),
+                                                                                       f=len(self.failures))
+
+    def __len__(self):
+        return len(self.molecules)
+
+    def __getstate__(self):
+        # the shared memory block is owned by this process; the unpickled batch gets private copies of the arrays
+        state = self.__dict__.copy()
+        state['_shared_memory'] = None
+        return state
+
+    def __iter__(self):
+        return iter(self.molecules)
+
+    def __getitem__(self, item):
+        return self.molecules[item]
+
+    def to_shared_memory(self):
+        """
+        This function moves the packed geometries, atomic numbers and atom offsets of the batch (please check the
+        `compact` method) into a block of shared memory, so that worker processes can attach to them without copying.
+        The `xyz` attribute of each molecule becomes a view into the shared memory as well.
+
+        Returns
+        -------
+        dict
+            The description of the shared memory block, to be passed to the `attach_shared_memory` function
+            (e.g., in a worker process).
+
+        Notes
+        -----
+            - The shared memory block is released by calling the `close_shared_memory` method.
+            - The batch is compacted first if it's not, without releasing the toolkit objects.
+
+        Examples
+        --------
+        >>> from chemml.chem import MoleculeBatch
+        >>> spec = batch.to_shared_memory()
+        >>> # in a worker process:
+        >>> shm, geometry, atomic_numbers, atom_offsets = MoleculeBatch.attach_shared_memory(spec)
+        >>> shm.close()
+        """
+        from multiprocessing import shared_memory
+
+        if self.geometry is None:
+            self.compact(release_toolkit=False)
+        self.close_shared_memory()
+        n_atoms = self.geometry.shape[0]
+        n_offsets = self.atom_offsets.shape[0]
+        spec = {'n_atoms': n_atoms, 'n_offsets': n_offsets}
+        # size 0 is not allowed for a shared memory block
+        shm = shared_memory.SharedMemory(create=True, size=max(1, n_atoms * 13 + n_offsets * 8))
+        spec['name'] = shm.name
+        geometry, atomic_numbers, atom_offsets = _shared_arrays(shm, spec)
+        geometry[:] = self.geometry
+        atomic_numbers[:] = self.atomic_numbers
+        atom_offsets[:] = self.atom_offsets
+        self._shared_memory = shm
+        self._set_buffers(geometry, atomic_numbers, atom_offsets)
+        return spec
+
+    @staticmethod
+    def attach_shared_memory(spec):
+        """
+        This function attaches to the shared memory block that is created by the `to_shared_memory` method.
+
+        Parameters
+        ----------
+        spec: dict
+            The output of the `to_shared_memory` method.
+
+        Returns
+        -------
+        SharedMemory
+            The shared memory object. It must be kept alive while the arrays are used, and closed afterwards.
+
+        ndarray
+            The float32 array of geometries with shape (total_number_of_atoms, 3).
+
+        ndarray
+            The uint8 array of atomic numbers with shape (total_number_of_atoms, 1).
+
+        ndarray
+            The array of atom offsets with length (number_of_molecules + 1).
+
+        """
+        from multiprocessing import shared_memory
+
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        return (shm,) + _shared_arrays(shm, spec)
+
+    def close_shared_memory(self):
+        """
+        This function copies the packed arrays back to the private memory and releases the shared memory block.
+        """
+        shm = getattr(self, '_shared_memory', None)
+        if shm is None:
+            return
+        self._set_buffers(self.geometry.copy(), self.atomic_numbers.copy(), self.atom_offsets.copy())
+        self._shared_memory = None
+        shm.close()
+        shm.unlink()
+
+    def _set_buffers(self, geometry, atomic_numbers, atom_offsets):
+        """
+        The internal function to replace the packed arrays and point the xyz attribute of the molecules to them.
+        """
+        self.geometry = geometry
+        self.atomic_numbers = atomic_numbers
+        self.atom_offsets = atom_offsets
+        for i, mol in enumerate(self.molecules):
+            if mol.xyz is not None:
+                start, end = atom_offsets[i], atom_offsets[i + 1]
+                mol._xyz = XYZ._from_arrays(geometry[start:end], atomic_numbers[start:end])
+
+    def compact(self, release_toolkit=True):
+        """
+        This function reduces the memory footprint of the molecules in the batch.
+        The geometries and atomic numbers of all the molecules are packed into two contiguous arrays (float32 and
+        uint8, respectively) and the `xyz` attribute of each molecule becomes a view into them.
+
+        Parameters
+        ----------
+        release_toolkit: bool, optional (default = True)
+            If True, the rdkit and pybel molecule objects are released as well, and rebuilt on demand.
+            Please check the `compact` method of the Molecule class for more information.
+
+        """
+        n_atoms = np.array([0 if m.xyz is None else m.xyz.atomic_numbers.shape[0] for m in self.molecules],
+                           dtype=np.int64)
+        self.atom_offsets = np.concatenate([[0], np.cumsum(n_atoms)]).astype(np.int64)
+        geometry = np.zeros((self.atom_offsets[-1], 3), dtype=np.float32)
+        atomic_numbers = np.zeros((self.atom_offsets[-1], 1), dtype=np.uint8)
+        for i, mol in enumerate(self.molecules):
+            if mol.xyz is not None:
+                start, end = self.atom_offsets[i], self.atom_offsets[i + 1]
+                geometry[start:end] = mol.xyz.geometry
+                atomic_numbers[start:end] = mol.xyz.atomic_numbers
+            if release_toolkit:
+                mol.compact()
+        self._set_buffers(geometry, atomic_numbers, self.atom_offsets)
+
+    @classmethod
+    def from_arrays(cls, geometry, atomic_numbers, atom_offsets, creators=None, indices=None):
+        """
+        This function builds a batch of molecules directly from the packed arrays of geometries and atomic numbers
+        (e.g., the output of a fast XYZ reader). The molecules only carry the `xyz` attribute, as views into the
+        packed arrays; no rdkit or pybel molecule object is created.
+
+        Parameters
+        ----------
+        geometry: ndarray
+            The array of shape (total_number_of_atoms, 3). It's stored as float32.
+
+        atomic_numbers: ndarray
+            The array of shape (total_number_of_atoms,) or (total_number_of_atoms, 1). It's stored as uint8.
+
+        atom_offsets: array-like
+            The array of length (number_of_molecules + 1); the atoms of the i-th molecule are stored between
+            atom_offsets[i] and atom_offsets[i+1] of the above arrays.
+
+        creators: list, optional (default = None)
+            The creator of each molecule, e.g., ('XYZ', file_path).
+
+        indices: array-like, optional (default = None)
+            The index of the input of each molecule. If None, the molecules are indexed from zero.
+
+        Returns
+        -------
+        MoleculeBatch
+            The batch of molecules.
+
+        """
+        geometry = np.ascontiguousarray(geometry, dtype=np.float32)
+        atomic_numbers = np.ascontiguousarray(atomic_numbers, dtype=np.uint8).reshape(-1, 1)
+        atom_offsets = np.asarray(atom_offsets, dtype=np.int64)
+        if geometry.ndim != 2 or geometry.shape[1] != 3 or geometry.shape[0] != atomic_numbers.shape[0] or \
+                atom_offsets.ndim != 1 or len(atom_offsets) == 0 or atom_offsets[0] != 0 or \
+                atom_offsets[-1] != geometry.shape[0] or (np.diff(atom_offsets) < 0).any():
+            msg = "The packed arrays are not consistent with each other."
+            raise ValueError(msg)
+        n_molecules = len(atom_offsets) - 1
+        if creators is None:
+            creators = [None] * n_molecules
+        elif len(creators) != n_molecules:
+            msg = "The number of creators must be same as the number of molecules."
+            raise ValueError(msg)
+        molecules = []
+        for i, creator in enumerate(creators):
+            mol = Molecule._from_rdkit(None, creator)
+            start, end = atom_offsets[i], atom_offsets[i + 1]
+            mol._xyz = XYZ._from_arrays(geometry[start:end], atomic_numbers[start:end])
+            molecules.append(mol)
+        batch = cls(molecules, indices)
+        batch.geometry = geometry
+        batch.atomic_numbers = atomic_numbers
+        batch.atom_offsets = atom_offsets
+        return batch
+
+    @classmethod
+    def from_smiles(cls, smiles, n_jobs=1, chunk_size=10000, canonical=False, **kwargs):
+        """
+        This function builds a batch of molecules from a list of SMILES strings.
+
+        Parameters
+        ----------
+        smiles: list
+            The list of SMILES strings.
+
+        n_jobs: int, optional (default = 1)
+            The number of worker processes to parse the SMILES strings. If -1, all the CPU cores are used.
+
+        chunk_size: int, optional (default = 10000)
+            The number of SMILES strings that are sent to a worker process at a time.
+
+        canonical: bool, optional (default = False)
+            If True, the canonical SMILES string of each molecule is also computed and stored.
+
+        kwargs:
+            The arguments for the rdkit.Chem.MolFromSmiles function.
+
+        Returns
+        -------
+        MoleculeBatch
+            The batch of molecules and the indices of the SMILES strings that couldn't be parsed.
+
+        """
+        if not isinstance(smiles, (list, tuple, np.ndarray)):
+            msg = "The parameter 'smiles' must be a list of SMILES strings."
+            raise ValueError(msg)
+        smiles = list(smiles)
+        _check_chunk_size(chunk_size)
+        chunks = (smiles[i:i + chunk_size] for i in range(0, len(smiles), chunk_size))
+        return cls._from_chunks(chunks, n_jobs, canonical, kwargs)
+
+    @classmethod
+    def from_smiles_file(cls, path, n_jobs=1, chunk_size=10000, smiles_column='smiles', canonical=False, **kwargs):
+        """
+        This function builds a batch of molecules from a file of SMILES strings. The file is read in chunks, so that
+        the whole text is never loaded in the memory.
+
+        Parameters
+        ----------
+        path: str
+            The path to the '.smi' or '.csv' file.
+            In a '.smi' file the SMILES string is the first whitespace-separated token of each line. The blank lines
+            are recorded as failures.
+            In a '.csv' file the SMILES strings are read from the `smiles_column` column.
+
+        n_jobs: int, optional (default = 1)
+            The number of worker processes to parse the SMILES strings. If -1, all the CPU cores are used.
+
+        chunk_size: int, optional (default = 10000)
+            The number of SMILES strings that are read from the file and sent to a worker process at a time.
+
+        smiles_column: str, optional (default = 'smiles')
+            The header of the SMILES column in a '.csv' file.
+
+        canonical: bool, optional (default = False)
+            If True, the canonical SMILES string of each molecule is also computed and stored.
+
+        kwargs:
+            The arguments for the rdkit.Chem.MolFromSmiles function.
+
+        Returns
+        -------
+        MoleculeBatch
+            The batch of molecules and the indices of the SMILES strings (i.e., 0-based line numbers of a '.smi'
+            file or data rows of a '.csv' file) that couldn't be parsed.
+
+        """
+        if not isinstance(path, str) or not os.path.isfile(path):
+            msg = "The parameter 'path' must be the path to an existing file."
+            raise ValueError(msg)
+        _check_chunk_size(chunk_size)
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.smi':
+            chunks = _read_smi_chunks(path, chunk_size)
+        elif extension == '.csv':
+            header = pd.read_csv(path, nrows=0).columns
+            if smiles_column not in header:
+                msg = "The column '%s' is not available in the csv file." % str(smiles_column)
+                raise ValueError(msg)
+            chunks = (['' if pd.isnull(s) else str(s) for s in df[smiles_column]]
+                      for df in pd.read_csv(path, usecols=[smiles_column], chunksize=chunk_size))
+        else:
+            msg = "The file extension must be either of '.smi' or '.csv'."
+            raise ValueError(msg)
+        return cls._from_chunks(chunks, n_jobs, canonical, kwargs)
+
+    def to_xyz(self, optimizer='MMFF', n_jobs=1, timeout=None, n_conformers=1, num_threads=1, random_seed=-1,
+               **kwargs):
+        """
+        This function embeds and optimizes the 3D geometries of all the molecules in the batch, optionally by a pool
+        of worker processes. The molecules are modified in place, as by the `to_xyz` method of each Molecule.
+
+        Parameters
+        ----------
+        optimizer: str, optional (default = 'MMFF')
+            Any of the 'UFF' or 'MMFF' force fileds to optimize the embedded geometries.
+
+        n_jobs: int, optional (default = 1)
+            The number of worker processes. If -1, all the CPU cores are used.
+
+        timeout: float, optional (default = None)
+            The maximum number of seconds to embed and optimize each molecule. A molecule that takes longer is
+            reported as a failure and its worker process is restarted. If None, there is no time limit.
+
+        n_conformers: int, optional (default = 1)
+            The number of conformers that are embedded by 'rdkit.Chem.AllChem.EmbedMultipleConfs' and optimized for
+            each molecule. Only the conformer with the lowest energy is kept.
+
+        num_threads: int, optional (default = 1)
+            The number of threads that rdkit uses to embed and optimize the conformers of each molecule.
+            If 0, all the available threads are used.
+
+        random_seed: int, optional (default = -1)
+            The random seed of the embedding. If -1, the embedding is not reproducible.
+
+        kwargs:
+            The arguments that can be passed to the corresponding forcefileds (except 'confId').
+            The documentation is available at:
+                - UFFOptimizeMolecule: http://rdkit.org/docs/source/rdkit.Chem.rdForceFieldHelpers.html?highlight=mmff#rdkit.Chem.rdForceFieldHelpers.UFFOptimizeMolecule
+                - MMFFOptimizeMolecule: http://rdkit.org/docs/source/rdkit.Chem.rdForceFieldHelpers.html?highlight=mmff#rdkit.Chem.rdForceFieldHelpers.MMFFOptimizeMolecule
+
+        Returns
+        -------
+        pandas.DataFrame
+            The report of the optimization with one row per molecule (indexed by the `indices` attribute) and the
+            following columns:
+                - success: True if the geometry is available in the `xyz` attribute of the molecule.
+                - energy: The force field energy of the selected conformer.
+                - converged: True if the optimization of the selected conformer converged.
+                - message: The error message of the failures.
+
+        Notes
+        -----
+            - The hydrogens won't be added to the molecules automatically. You should add them using the `hydrogens` method.
+
+        """
+        if optimizer == 'MMFF':
+            args = update_default_kwargs(Molecule._default_MMFF_args, kwargs,
+                                         Molecule._to_xyz_core_names[0], Molecule._to_xyz_core_docs[0])
+        elif optimizer == 'UFF':
+            args = update_default_kwargs(Molecule._default_UFF_args, kwargs,
+                                         Molecule._to_xyz_core_names[1], Molecule._to_xyz_core_docs[1])
+        else:
+            msg = "The parameter 'optimizer' must be either of 'MMFF' or 'UFF'."
+            raise ValueError(msg)
+        if 'confId' in kwargs:
+            msg = "The argument 'confId' is not supported for a batch of molecules."
+            raise ValueError(msg)
+        if timeout is not None and not (isinstance(timeout, (int, float)) and timeout > 0):
+            msg = "The parameter 'timeout' must be a positive number or None."
+            raise ValueError(msg)
+        if not isinstance(n_conformers, int) or n_conformers < 1:
+            msg = "The parameter 'n_conformers' must be a positive integer."
+            raise ValueError(msg)
+        n_jobs = _n_workers(n_jobs)
+
+        report = pd.DataFrame({'success': False, 'energy': np.nan, 'converged': False, 'message': ''},
+                              index=self.indices, columns=['success', 'energy', 'converged', 'message'])
+        tasks = []
+        for i, mol in enumerate(self.molecules):
+            if mol.rdkit_molecule is None:
+                report.iloc[i, 3] = "The rdkit molecule object has not been created."
+            else:
+                tasks.append((i, mol.rdkit_molecule, optimizer, n_conformers, num_threads, random_seed, kwargs))
+
+        if n_jobs == 1 and timeout is None:
+            results = (_embed_optimize(task) for task in tasks)
+        else:
+            results = _run_with_timeout(_embed_optimize, tasks, n_jobs, timeout)
+
+        for i, rdkit_mol, energy, converged, message in results:
+            if rdkit_mol is None:
+                report.iloc[i, 3] = message
+                continue
+            mol = self.molecules[i]
+            mol.rdkit_molecule = rdkit_mol
+            mol._to_xyz_rdkit(None)
+            if optimizer == 'MMFF':
+                mol._MMFF_args = args
+            else:
+                mol._UFF_args = args
+            report.iloc[i, :3] = [True, energy, converged]
+        return report
+
+    @classmethod
+    def _from_chunks(cls, chunks, n_jobs, canonical, kwargs):
+        """
+        The internal function to parse the chunks of SMILES strings, in the main process or in a pool of workers.
+        """
+        n_jobs = _n_workers(n_jobs)
+        tasks = ((chunk, canonical, kwargs) for chunk in chunks)
+        molecules = []
+        indices = []
+        failures = []
+        start = 0
+
+        pool = None
+        if n_jobs == 1:
+            results = (_parse_smiles(task) for task in tasks)
+        else:
+            pool = multiprocessing.Pool(n_jobs)
+            results = pool.imap(_parse_smiles, tasks)
+        try:
+            for chunk, parsed in results:
+                for i, (smiles, (rdkit_mol, canonical_smiles)) in enumerate(zip(chunk, parsed)):
+                    if rdkit_mol is None:
+                        failures.append(start + i)
+                    else:
+                        molecules.append(Molecule._from_rdkit(rdkit_mol, ('SMILES', smiles), canonical_smiles))
+                        indices.append(start + i)
+                start += len(chunk)
+        finally:
+            if pool is not None:
+                pool.terminate()
+        return cls(molecules, indices, failures)
+
+
+def _shared_arrays(shm, spec):
+    """
+    The internal function to build the packed arrays of a MoleculeBatch on top of a shared memory block.
+    """
+    n_atoms, n_offsets = spec['n_atoms'], spec['n_offsets']
+    # the arrays are laid out by decreasing alignment: int64, float32, uint8
+    atom_offsets = np.ndarray((n_offsets,), dtype=np.int64, buffer=shm.buf, offset=0)
+    geometry = np.ndarray((n_atoms, 3), dtype=np.float32, buffer=shm.buf, offset=n_offsets * 8)
+    atomic_numbers = np.ndarray((n_atoms, 1), dtype=np.uint8, buffer=shm.buf, offset=n_offsets * 8 + n_atoms * 12)
+    return geometry, atomic_numbers, atom_offsets
+
+
+def _check_chunk_size(chunk_size):
+    """
+    The internal function to check the chunk size of the batch readers.
+    """
+    if not isinstance(chunk_size, int) or chunk_size < 1:
+        msg = "The parameter 'chunk_size' must be a positive integer."
+        raise ValueError(msg)
+
+
+def _n_workers(n_jobs):
+    """
+    The internal function to get the number of worker processes.
+    """
+    if n_jobs == -1:
+        return multiprocessing.cpu_count()
+    elif isinstance(n_jobs, int) and n_jobs >= 1:
+        return n_jobs
+    else:
+        msg = "The parameter 'n_jobs' must be a positive integer or -1."
+        raise ValueError(msg)
+
+
+def _run_with_timeout(func, tasks, n_jobs, timeout):
+    """
+    The internal generator to run the tasks by a pool of worker processes, one task per worker at a time.
+    The pool is restarted if a task exceeds the timeout; the other running tasks are submitted again.
+    It yields the results of `func` or, for the timed out tasks, (task[0], None, nan, False, message).
+    """
+    pending = deque(tasks)
+    running = []
+    pool = multiprocessing.Pool(n_jobs)
+    try:
+        while pending or running:
+            while pending and len(running) < n_jobs:
+                task = pending.popleft()
+                running.append((task, pool.apply_async(func, (task,)), time.time()))
+            still_running = []
+            timed_out = False
+            for task, result, start in running:
+                if result.ready():
+                    yield result.get()
+                elif timeout is not None and time.time() - start > timeout:
+                    timed_out = True
+                    yield (task[0], None, np.nan, False, "The time limit of %s seconds was exceeded." % str(timeout))
+                else:
+                    still_running.append((task, result, start))
+            running = still_running
+            if timed_out:
+                # the only way to stop a busy worker is to restart the pool
+                pool.terminate()
+                pool = multiprocessing.Pool(n_jobs)
+                pending.extendleft(reversed([task for task, _, _ in running]))
+                running = []
+            elif running:
+                time.sleep(0.005)
+    finally:
+        pool.terminate()
+
+
+def _embed_optimize(args):
+    """
+    The internal function to embed and optimize the conformers of a molecule (in a worker process) and keep the one
+    with the lowest energy. It returns (index, rdkit molecule, energy, converged, message); the molecule is None for
+    the failures.
+    """
+    index, rdkit_mol, optimizer, n_conformers, num_threads, random_seed, kwargs = args
+    try:
+        rdkit_mol = Chem.Mol(rdkit_mol)
+        if n_conformers == 1:
+            conf_ids = [AllChem.EmbedMolecule(rdkit_mol, randomSeed=random_seed)]
+        else:
+            conf_ids = list(AllChem.EmbedMultipleConfs(rdkit_mol, numConfs=n_conformers, randomSeed=random_seed,
+                                                       numThreads=num_threads))
+        if len(conf_ids) == 0 or conf_ids[0] == -1:
+            return index, None, np.nan, False, "The embedding of the 3D geometry failed."
+
+        if optimizer == 'MMFF':
+            if not AllChem.MMFFHasAllMoleculeParams(rdkit_mol):
+                msg = "The MMFF parameters are not available for all of the molecule’s atoms."
+                return index, None, np.nan, False, msg
+            results = AllChem.MMFFOptimizeMoleculeConfs(rdkit_mol, numThreads=num_threads, **kwargs)
+        else:
+            if not AllChem.UFFHasAllMoleculeParams(rdkit_mol):
+                msg = "The UFF parameters are not available for all of the molecule’s atoms."
+                return index, None, np.nan, False, msg
+            results = AllChem.UFFOptimizeMoleculeConfs(rdkit_mol, numThreads=num_threads, **kwargs)
+
+        best = int(np.argmin([energy for _, energy in results]))
+        not_converged, energy = results[best]
+        rdkit_mol = Chem.Mol(rdkit_mol, False, rdkit_mol.GetConformers()[best].GetId())
+        return index, rdkit_mol, float(energy), not_converged == 0, ''
+    except Exception as err:
+        return index, None, np.nan, False, str(err)
+
+
+def _read_smi_chunks(path, chunk_size):
+    """
+    The internal generator to read the SMILES strings of a '.smi' file in chunks, one per line.
+    A blank line is read as an empty string (i.e., a failure), so the indices of the batch are line numbers.
+    """
+    chunk = []
+    with open(path) as f:
+        for line in f:
+            tokens = line.split()
+            chunk.append(tokens[0] if tokens else '')
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_smiles(args):
+    """
+    The internal function to parse a chunk of SMILES strings (in a worker process).
+    It returns the chunk and a list of (rdkit molecule, canonical SMILES) tuples; the molecule is None for invalid inputs.
+    """
+    chunk, canonical, kwargs = args
+    parsed = []
+    for smiles in chunk:
+        # an empty string is parsed to an empty molecule by rdkit
+        rdkit_mol = Chem.MolFromSmiles(smiles, **kwargs) if smiles else None
+        if rdkit_mol is None:
+            parsed.append((None, None))
+        else:
+            parsed.append((rdkit_mol, Chem.MolToSmiles(rdkit_mol) if canonical else None))
+    return chunk, parsed
@@ -5,6 +5,7 @@ The chemml.datasets module includes (please click on links adjacent to function
     - load_xyz_polarizability: :func:`~chemml.datasets.load_xyz_polarizability`
     - load_comp_energy: :func:`~chemml.datasets.load_comp_energy`
     - load_crystal_structures: :func:`~chemml.datasets.load_crystal_structures`
+    - clear_cache: :func:`~chemml.datasets.clear_cache`
 """
 
 from .base import load_cep_homo
@@ -12,12 +13,14 @@ from .base import load_organic_density
 from .base import load_xyz_polarizability
 from .base import load_comp_energy
 from .base import load_crystal_structures
+from .base import clear_cache
 
 __all__ = [
     'load_cep_homo',
     'load_organic_density',
     'load_xyz_polarizability',
     'load_comp_energy',
-    'load_crystal_structures'
+    'load_crystal_structures',
+    'clear_cache'
 ]
 
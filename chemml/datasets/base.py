@@ -1,10 +1,125 @@
 from __future__ import print_function
 import pkg_resources
 import os
+import glob
+import shutil
+import pickle
+import hashlib
 import pandas as pd
 
+import chemml
 from chemml.chem import Molecule
 
+# the version of the format of cached datasets, to be increased if the loaders change their outputs
+_CACHE_VERSION = 2
+
+
+def _cache_dir():
+    """
+    The internal function to find the directory of cached datasets: the CHEMML_CACHE_DIR environment variable or
+    ~/.chemml/cache. An empty CHEMML_CACHE_DIR disables the cache.
+    """
+    path = os.environ.get('CHEMML_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.chemml', 'cache'))
+    if not path:
+        return None
+    return os.path.join(path, 'datasets', 'v%i_%s' % (_CACHE_VERSION, chemml.__version__))
+
+
+def _files_hash(paths):
+    """
+    The internal function to hash the names and contents of the source files of a dataset.
+    """
+    h = hashlib.sha1()
+    for path in paths:
+        h.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _files_stat(paths):
+    """
+    The internal function to describe the source files of a dataset by their paths, sizes and modification times.
+    """
+    stats = []
+    for path in paths:
+        stat = os.stat(path)
+        stats.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    return stats
+
+
+def _write_cache(path, stats, digest, result):
+    """
+    The internal function to write a dataset to the binary cache. The result is pickled after the stats and the
+    digest of the source files, so that they can be checked without loading the result. The cache is skipped
+    silently if its directory is not writable. The caches of other format or chemml versions are removed when the
+    directory of the current version is created.
+    """
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            for stale in glob.glob(os.path.join(os.path.dirname(directory), 'v*_*')):
+                if os.path.basename(stale) != os.path.basename(directory):
+                    shutil.rmtree(stale, ignore_errors=True)
+            os.makedirs(directory)
+        # write to a temporary file first, so that concurrent loads never read a partial file
+        temp = '%s.%i.tmp' % (path, os.getpid())
+        with open(temp, 'wb') as f:
+            pickle.dump((stats, digest), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+    except (OSError, pickle.PicklingError):
+        pass
+
+
+def _cached(name, paths, loader):
+    """
+    The internal function to load a dataset from the binary cache, if the source files have not changed since it
+    was cached. The files are only hashed if their sizes or modification times have changed. Otherwise, the
+    dataset is parsed by the loader and cached.
+    """
+    directory = _cache_dir()
+    if directory is None:
+        return loader()
+    stats = _files_stat(paths)
+    path = os.path.join(directory, name + '.pkl')
+    digest = None
+    try:
+        with open(path, 'rb') as f:
+            cached_stats, cached_digest = pickle.load(f)
+            if cached_stats == stats:
+                return pickle.load(f)
+            digest = _files_hash(paths)
+            if cached_digest == digest:
+                result = pickle.load(f)
+                # e.g., the files are touched or installed in another place
+                _write_cache(path, stats, digest, result)
+                return result
+    except Exception:
+        pass
+
+    result = loader()
+    if digest is None:
+        digest = _files_hash(paths)
+    _write_cache(path, stats, digest, result)
+    return result
+
+
+def clear_cache():
+    """
+    Remove the binary cache of parsed datasets. The cache is located in the directory of the CHEMML_CACHE_DIR
+    environment variable (default: ~/.chemml/cache) and is rebuilt by the next call of each loader.
+
+    Examples
+    --------
+    >>> from chemml.datasets import clear_cache
+    >>> clear_cache()
+    """
+    directory = _cache_dir()
+    if directory is not None:
+        shutil.rmtree(os.path.dirname(directory), ignore_errors=True)
+
+
 def load_cep_homo():
     """Load and return a small sample of HOMO energies of organic photovoltaic candidates from CEP database (regression).
     Clean Energy Project (CEP) database is available at: https://cepdb.molecularspace.org
@@ -38,12 +153,14 @@ def load_cep_homo():
     (500, 1)
     """
     DATA_PATH = pkg_resources.resource_filename('chemml', os.path.join('datasets','data','cep_homo.csv'))
-    df = pd.read_csv(DATA_PATH)
 
-    smi = pd.DataFrame(df['smiles'], columns=['smiles'])
-    homo = pd.DataFrame(df['homo_eV'], columns=['homo_eV'])
+    def load():
+        df = pd.read_csv(DATA_PATH)
+        smi = pd.DataFrame(df['smiles'], columns=['smiles'])
+        homo = pd.DataFrame(df['homo_eV'], columns=['homo_eV'])
+        return smi, homo
 
-    return smi, homo
+    return _cached('cep_homo', [DATA_PATH], load)
 
 
 def load_organic_density():
@@ -79,13 +196,15 @@ def load_organic_density():
     (500, 200)
     """
     DATA_PATH = pkg_resources.resource_filename('chemml', os.path.join('datasets','data','moldescriptor_density_smiles.csv'))
-    df = pd.read_csv(DATA_PATH)
 
-    smi = pd.DataFrame(df['smiles'], columns=['smiles'])
-    density = pd.DataFrame(df['density_Kg/m3'], columns=['density_Kg/m3'])
-    features = df.drop(['smiles', 'density_Kg/m3'],1)
+    def load():
+        df = pd.read_csv(DATA_PATH)
+        smi = pd.DataFrame(df['smiles'], columns=['smiles'])
+        density = pd.DataFrame(df['density_Kg/m3'], columns=['density_Kg/m3'])
+        features = df.drop(['smiles', 'density_Kg/m3'], axis=1)
+        return smi, density, features
 
-    return smi, density, features
+    return _cached('organic_density', [DATA_PATH], load)
 
 
 def load_xyz_polarizability():
@@ -126,12 +245,20 @@ def load_xyz_polarizability():
     #                    reader='manual',
     #                    skip_lines=[2, 0])
     # molecules = reader.read()
-    molecules = []
-    for i in range(1,51):
-        molecule = Molecule(os.path.join(DATA_PATH,"%i_opt.xyz"%i), "xyz")
-        molecules.append(molecule)
-
-    df = pd.read_csv(os.path.join(DATA_PATH,'pol.csv'))
+    paths = [os.path.join(DATA_PATH, "%i_opt.xyz" % i) for i in range(1, 51)]
+
+    def load():
+        molecules = []
+        for path in paths:
+            molecule = Molecule(path, "xyz")
+            molecules.append(molecule)
+        df = pd.read_csv(os.path.join(DATA_PATH,'pol.csv'))
+        return molecules, df
+
+    molecules, df = _cached('xyz_polarizability', paths + [os.path.join(DATA_PATH, 'pol.csv')], load)
+    # the cache may be shared by several installations of the data files
+    for molecule, path in zip(molecules, paths):
+        molecule.creator = ('XYZ', path)
     return molecules, df
 
 
@@ -164,11 +291,15 @@ def load_comp_energy():
     """
     DATA_PATH = pkg_resources.resource_filename('chemml', os.path.join('datasets', 'data', 'magpie_python_test', 'small_set_comp.txt'))
     TARGET_PATH = pkg_resources.resource_filename('chemml', os.path.join('datasets', 'data', 'magpie_python_test', 'small_set_delta_e.txt'))
-    from chemml.chem.magpie_python import CompositionEntry
-    entries = CompositionEntry.import_composition_list(DATA_PATH)
-    df = pd.read_csv(TARGET_PATH,header=None)
-    df.columns = ['formation_energy']
-    return entries, df
+
+    def load():
+        from chemml.chem.magpie_python import CompositionEntry
+        entries = CompositionEntry.import_composition_list(DATA_PATH)
+        df = pd.read_csv(TARGET_PATH,header=None)
+        df.columns = ['formation_energy']
+        return entries, df
+
+    return _cached('comp_energy', [DATA_PATH, TARGET_PATH], load)
 
 
 def load_crystal_structures():
@@ -196,7 +327,14 @@ def load_crystal_structures():
     18
     """
     DATA_PATH = pkg_resources.resource_filename('chemml', os.path.join('datasets', 'data', 'magpie_python_test'))
-    from chemml.chem.magpie_python import CrystalStructureEntry
-    entries = CrystalStructureEntry.import_structures_list(DATA_PATH)
-    return entries
+
+    def load():
+        from chemml.chem.magpie_python import CrystalStructureEntry
+        return CrystalStructureEntry.import_structures_list(DATA_PATH)
+
+    # the structures and the covalent radii of elements
+    paths = sorted(glob.glob(os.path.join(DATA_PATH, '*.vasp')))
+    paths.append(pkg_resources.resource_filename('chemml', os.path.join('chem', 'magpie_python', 'lookup-data',
+                                                                        'CovalentRadius.table')))
+    return _cached('crystal_structures', paths, load)
 
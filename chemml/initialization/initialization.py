@@ -3,10 +3,17 @@ from builtins import range
 import os
 import pandas as pd
 import numpy as np
+import re
+import time
 import warnings
+import multiprocessing
 import fnmatch
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from chemml.chem.molecule import Molecule
+from chemml.chem.molecule import MoleculeBatch
+from chemml.chem.molecule import _n_workers
 
 class Split(object):
     """
@@ -95,11 +102,13 @@ class XYZreader(object):
         A dictionary of nuclear charges with respect to the chemical symbols of all atom types in the xyz files.
 
     reader: string, optional (default = 'auto')
-        Available options : 'auto' and 'manual'
+        Available options : 'auto', 'manual' and 'fast'
         If 'auto', the openbabel readstring function creat the molecule object.
         The type of files for openbabel class has been set to 'xyz', thus the format
         of the file should also follow a typical xyz format. However, with 'manual'
         reader you can skip some lines from top or bottom of xyz files.
+        If 'fast', the files are parsed in bulk by numpy. The files must follow the typical xyz format, and
+        only the first frame of multi-frame files is read (use the `read_batch` method to read all the frames).
 
     skip_lines: list of two integers, optional (default = [2,0])
         Number of lines to skip (int) from top and bottom of the xyz files, respectively.
@@ -108,6 +117,18 @@ class XYZreader(object):
         can also be ignored.
         Only available for 'manual' reader.
 
+    path_only: bool, optional (default = False)
+        If True, only the paths of the files are returned and the files are not read.
+
+    n_threads: int, optional (default = 1)
+        The number of threads to read the files concurrently. The read method with the 'auto' reader reads the
+        files serially, while the read_batch method always uses n_threads threads.
+
+    cache_manifest: bool, optional (default = True)
+        If True, the list of files under the path_root is cached in the memory, and reused as long as the
+        modification times of the directories don't change (i.e., no file is added, removed or renamed).
+        Only the file lists of the 32 most recently scanned path_root/path_pattern are kept.
+
     Attributes
     ----------
     max_n_atoms_: int
@@ -115,6 +136,9 @@ class XYZreader(object):
         This can be useful if you want to set this parameter in the feature representation methods,
         e.g. Coulomb_Matrix.
 
+    files_: list
+        The list of paths to the files that are read by the `read_batch` method.
+
     Notes
     --------
         Some pattern examples:
@@ -270,13 +294,17 @@ class XYZreader(object):
             },
             reader='auto',
             skip_lines=[2, 0],
-            path_only=False):
+            path_only=False,
+            n_threads=1,
+            cache_manifest=True):
         self.path_pattern = path_pattern
         self.path_root = path_root
         self.Z = Z
         self.reader = reader
         self.skip_lines = skip_lines
         self.path_only = path_only
+        self.n_threads = n_threads
+        self.cache_manifest = cache_manifest
 
     def __file_reader(self, filename):
         if self.reader == 'auto':
@@ -305,21 +333,34 @@ class XYZreader(object):
                     float(atom[3])
                 ])
             return np.array(molecule)
+        elif self.reader == 'fast':
+            frames = _read_xyz_file(filename, self.Z)
+            if len(frames) == 0:
+                return np.array([])
+            atomic_numbers, geometry = frames[0]
+            return np.column_stack([atomic_numbers.astype(float), geometry])
+        else:
+            msg = "The parameter 'reader' must be any of 'auto', 'manual' or 'fast'."
+            raise ValueError(msg)
 
-    def read(self):
+    def _map(self, func, items, n_threads):
         """
-        read the XYZ files based on the path_pattern and path_root parameters and create a list of chemml.chem.Molecule objects.
+        The internal function to apply a reader function to a list of files, by a pool of n_threads threads.
+        """
+        if not isinstance(self.n_threads, int) or self.n_threads < 1:
+            msg = "The parameter 'n_threads' must be a positive integer."
+            raise ValueError(msg)
+        if n_threads == 1 or len(items) < 2:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            return list(executor.map(func, items))
 
-        Return
-        ------
-        molecules: list
-            A list of chemml.chem.Molecule objects
+    def _check_patterns(self):
+        """
+        The internal function to check the extension of the path patterns.
         """
         if isinstance(self.path_pattern, str):
             self.path_pattern = [self.path_pattern]
-        molecules = {}
-        it = 0
-        max_nAtoms = 1
         for pattern in self.path_pattern:
             file_name, file_extension = os.path.splitext(pattern)
             if file_extension == '':
@@ -329,40 +370,300 @@ class XYZreader(object):
                 msg = "file extension '%s' not available - xyz is the only acceptable extension" % file_extension
                 raise ValueError(msg)
 
-            if self.path_root:
-                for root, directories, filenames in os.walk(self.path_root):
-                    file_path = [
-                        os.path.join(root, filename) for filename in filenames
-                    ]
-                    for fn in sorted(
-                            fnmatch.filter(
-                                file_path, os.path.join(
-                                    self.path_root, pattern))):
-                        if not self.path_only:
-                            mol = self.__file_reader(fn)
-                            max_nAtoms = max(max_nAtoms, len(mol))
-                        else:
-                            mol = None
-                            max_nAtoms = max(max_nAtoms, 0)
-                        it += 1
-                        molecules[it] = {'file': fn, 'mol': mol}
+    def _find_files(self):
+        """
+        The internal function to find the files that match the path_pattern and path_root parameters.
+        It returns a list of (path, name) tuples, where the name is stored as the 'file' entry of the read method.
+        The files are ordered by pattern, and by the top-down walk order of the directories for each pattern.
+        """
+        self._check_patterns()
+        if not self.path_root:
+            return [(pattern, os.path.splitext(pattern)[0]) for pattern in self.path_pattern]
+        if self.cache_manifest:
+            manifest = _manifest(self.path_root, self.path_pattern)
+        else:
+            manifest = list(_scan_files(self.path_root, self.path_pattern))
+        files = []
+        for k in range(len(self.path_pattern)):
+            files += [(fn, fn) for fn, matched in manifest if k in matched]
+        return files
+
+    def iter_files(self):
+        """
+        This function finds the files that match the path_pattern and path_root parameters in a single pass
+        over the directories, and yields their paths lazily (each file once, in the top-down walk order).
+
+        Yields
+        ------
+        str
+            The path to a file.
+
+        """
+        self._check_patterns()
+        if not self.path_root:
+            for pattern in self.path_pattern:
+                yield pattern
+        elif self.cache_manifest:
+            key = _manifest_key(self.path_root, self.path_pattern)
+            cached = _cached_manifest(key)
+            if cached is not None:
+                for fn, _ in cached:
+                    yield fn
             else:
-                if not self.path_only:
-                    mol = self.__file_reader(file_name + file_extension)
-                    max_nAtoms = max(max_nAtoms, len(mol))
-                else:
-                    mol = None
-                    max_nAtoms = max(max_nAtoms, 0)
-                it += 1
-                molecules[it] = {'file': file_name, 'mol': mol}
+                # the manifest is only cached when the scan is complete
+                directories = []
+                manifest = []
+                for fn, matched in _scan_files(self.path_root, self.path_pattern, directories):
+                    manifest.append((fn, matched))
+                    yield fn
+                _cache_manifest(key, directories, manifest)
+        else:
+            for fn, _ in _scan_files(self.path_root, self.path_pattern):
+                yield fn
+
+    def read(self):
+        """
+        read the XYZ files based on the path_pattern and path_root parameters and create a list of chemml.chem.Molecule objects.
+
+        Return
+        ------
+        molecules: list
+            A list of chemml.chem.Molecule objects
+        """
+        files = self._find_files()
+        if self.path_only:
+            mols = [None] * len(files)
+        else:
+            # the openbabel reader is not guaranteed to be thread-safe
+            n_threads = 1 if self.reader == 'auto' else self.n_threads
+            mols = self._map(self.__file_reader, [fn for fn, _ in files], n_threads)
+        molecules = {}
+        max_nAtoms = 1
+        for it, ((fn, name), mol) in enumerate(zip(files, mols)):
+            if mol is not None:
+                max_nAtoms = max(max_nAtoms, len(mol))
+            molecules[it + 1] = {'file': name, 'mol': mol}
         self.max_n_atoms_ = max_nAtoms
         return molecules
 
+    def read_batch(self):
+        """
+        read all the frames of the XYZ files based on the path_pattern and path_root parameters with the fast bulk
+        parser, regardless of the reader parameter.
+
+        Return
+        ------
+        MoleculeBatch
+            The batch of chemml.chem.Molecule objects with the `xyz` attribute only. The geometries and atomic numbers
+            of all the molecules are stored in the flat `geometry` and `atomic_numbers` arrays of the batch, and the
+            atoms of the i-th molecule are between `atom_offsets[i]` and `atom_offsets[i+1]`.
+            The `indices` attribute of the batch is the index of the file (in the `files_` attribute) of each molecule.
+        """
+        self.files_ = [fn for fn, _ in self._find_files()]
+        all_frames = self._map(lambda fn: _read_xyz_file(fn, self.Z), self.files_, self.n_threads)
+
+        creators = []
+        indices = []
+        n_atoms = []
+        for i, frames in enumerate(all_frames):
+            for atomic_numbers, _ in frames:
+                creators.append(('XYZ', self.files_[i]))
+                indices.append(i)
+                n_atoms.append(len(atomic_numbers))
+        flat = [frame for frames in all_frames for frame in frames]
+        if len(flat) > 0:
+            atomic_numbers = np.concatenate([frame[0] for frame in flat])
+            geometry = np.concatenate([frame[1] for frame in flat])
+        else:
+            atomic_numbers = np.zeros(0, dtype=np.uint8)
+            geometry = np.zeros((0, 3))
+        atom_offsets = np.concatenate([[0], np.cumsum(n_atoms, dtype=np.int64)])
+        self.max_n_atoms_ = max([1] + n_atoms)
+        return MoleculeBatch.from_arrays(geometry, atomic_numbers, atom_offsets, creators, indices)
+
+
+# the cached file lists of the most recently scanned directories: {key: (directories, manifest)}
+_MANIFESTS = OrderedDict()
+_MAX_MANIFESTS = 32
+
+
+def _manifest_key(path_root, patterns):
+    # the cached paths are joined with the literal path_root, so it's a part of the key
+    return (path_root, os.path.abspath(path_root), tuple(patterns))
+
+
+def _cache_manifest(key, directories, manifest):
+    """
+    The internal function to cache a manifest, and drop the least recently used ones beyond _MAX_MANIFESTS.
+    """
+    _MANIFESTS[key] = (directories, manifest)
+    _MANIFESTS.move_to_end(key)
+    while len(_MANIFESTS) > _MAX_MANIFESTS:
+        _MANIFESTS.popitem(last=False)
+
+
+def _cached_manifest(key):
+    """
+    The internal function to get a cached manifest, if none of its directories has been modified since the scan.
+    """
+    cached = _MANIFESTS.get(key)
+    if cached is None:
+        return None
+    if not _is_fresh(cached[0]):
+        del _MANIFESTS[key]
+        return None
+    _MANIFESTS.move_to_end(key)
+    return cached[1]
+
+
+def _is_fresh(directories):
+    """
+    The internal function to check that none of the scanned directories has been modified since the scan.
+    """
+    for directory, mtime in directories:
+        try:
+            if os.stat(directory).st_mtime_ns != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def _manifest(path_root, patterns):
+    """
+    The internal function to get the (cached) list of files that match the patterns under the path_root.
+    """
+    key = _manifest_key(path_root, patterns)
+    manifest = _cached_manifest(key)
+    if manifest is not None:
+        return manifest
+    directories = []
+    manifest = list(_scan_files(path_root, patterns, directories))
+    _cache_manifest(key, directories, manifest)
+    return manifest
+
+
+def _scan_files(path_root, patterns, directories=None):
+    """
+    The internal generator to walk the directories under the path_root once, in the same top-down order as os.walk,
+    and yield the (path, indices of matched patterns) of the files that match any of the patterns.
+    The paths are sorted in each directory. If a list of directories is passed, the (path, mtime) of the scanned
+    directories are appended to it.
+    """
+    regexes = [re.compile(fnmatch.translate(os.path.normcase(os.path.join(path_root, pattern))))
+               for pattern in patterns]
+    stack = [path_root]
+    while stack:
+        root = stack.pop()
+        try:
+            mtime = os.stat(root).st_mtime_ns
+            with os.scandir(root) as it:
+                entries = list(it)
+        except OSError:
+            # os.walk ignores the unreadable directories as well
+            continue
+        if directories is not None:
+            directories.append((root, mtime))
+        subdirectories = []
+        files = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # the symbolic links to directories are not followed, as in os.walk
+                if not entry.is_symlink():
+                    subdirectories.append(entry.path)
+            else:
+                files.append(entry.path)
+        for fn in sorted(files):
+            name = os.path.normcase(fn)
+            matched = [k for k, regex in enumerate(regexes) if regex.match(name)]
+            if matched:
+                yield fn, matched
+        stack.extend(reversed(subdirectories))
+
+
+def _read_xyz_file(filename, Z):
+    """
+    The internal function to read and parse an xyz file.
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    try:
+        return _parse_xyz(data, Z)
+    except ValueError as err:
+        msg = "The file '%s' is not a valid xyz file: %s" % (filename, str(err))
+        raise ValueError(msg)
+
+
+def _parse_xyz(data, Z):
+    """
+    The internal function to parse the content of a (multi-frame) xyz file in bulk.
+
+    Parameters
+    ----------
+    data: bytes
+        The content of the file.
+
+    Z: dict
+        The nuclear charges with respect to the chemical symbols. The symbols can also be the atomic numbers.
+
+    Returns
+    -------
+    list
+        A list of (atomic_numbers, geometry) tuples for the frames, with shapes (n_atoms,) and (n_atoms, 3).
+
+    """
+    lines = data.splitlines()
+    frames = []
+    i = 0
+    while i < len(lines):
+        header = lines[i].strip()
+        if len(header) == 0:
+            i += 1
+            continue
+        try:
+            n_atoms = int(header)
+        except ValueError:
+            raise ValueError("the line %i must be the number of atoms." % (i + 1))
+        block = lines[i + 2:i + 2 + n_atoms]
+        if len(block) != n_atoms:
+            raise ValueError("the frame at line %i is truncated." % (i + 1))
+        i += 2 + n_atoms
+
+        # a single split for the whole frame, unless some lines have extra columns
+        tokens = b' '.join(block).split()
+        if len(tokens) == 4 * n_atoms:
+            table = np.array(tokens).reshape(n_atoms, 4)
+        else:
+            fields = [line.split()[:4] for line in block]
+            if any(len(f) < 4 for f in fields):
+                raise ValueError("each atom line must contain a symbol and three coordinates.")
+            table = np.array(fields).reshape(n_atoms, 4)
+        try:
+            geometry = table[:, 1:].astype(float)
+        except ValueError:
+            raise ValueError("the coordinates must be numbers.")
+        symbols, inverse = np.unique(table[:, 0], return_inverse=True)
+        charges = np.zeros(len(symbols))
+        for k, symbol in enumerate(symbols):
+            symbol = symbol.decode()
+            if symbol.isdigit():
+                charges[k] = int(symbol)
+            elif symbol in Z:
+                charges[k] = Z[symbol]
+            else:
+                raise ValueError("the nuclear charge of '%s' is not available." % symbol)
+        frames.append((charges[inverse.ravel()], geometry))
+    return frames
+
 
 class ConvertFile(object):
     """(ConvertFile)
     Specify file path, 'from_format' and 'to_format' to convert a file form 'from_format' to 'to_format'
-    using openbabel (https://openbabel.org/wiki/Babel).
+    using openbabel (https://openbabel.org/wiki/Babel) or RDKit, in the same process or by a pool of worker processes.
 
     Parameters:
     ----------
@@ -377,9 +678,27 @@ class ConvertFile(object):
 
     to_format: string
         String of letters that specify the target file format or the desired format.
-        An openbabel command is generated which converts the files specified by 'file_path' to the target format.
         List of possible 'to_format's are on https://openbabel.org/wiki/Babel
 
+    engine: string, optional (default = 'pybel')
+        The toolkit that converts the files: 'pybel' (openbabel python bindings) or 'rdkit'.
+        The rdkit engine reads 'xyz' (with bond perception), 'mol', 'sdf', 'mol2', 'pdb' and 'smi' files, and writes
+        'mol', 'sdf', 'xyz', 'pdb', 'smi' and 'inchi' files.
+
+    n_jobs: int, optional (default = 1)
+        The number of worker processes. If -1, all the CPU cores are used.
+
+    output: string, optional (default = None)
+        If None, each converted file is written next to its input file (with the extension of to_format).
+        Otherwise, the path to a single multi-molecule file that collects all the converted molecules; the to_format
+        must be 'sdf' in this case.
+
+    Attributes:
+    ----------
+    report_: pandas dataframe
+        The report of the last conversion with one row per input file (indexed as the output dictionary) and the
+        columns 'file', 'output', 'success', 'time' (seconds) and 'message'.
+
     Returns:
     ------
     converted_file_paths: dictionary
@@ -392,45 +711,161 @@ class ConvertFile(object):
     >>> coordinates
     {1: {'file': 'cheml/datasets/data/organic_xyz/1_opt.xyz', ...
     >>> from chemml.initialization import ConvertFile
-    >>> model = ConvertFile(file_path=coordinates,from_format='xyz',to_format='cml')
+    >>> model = ConvertFile(file_path=coordinates,from_format='xyz',to_format='cml', n_jobs=4)
     >>> converted_file_paths = model.convert()
     {1: {'file': 'cheml/datasets/data/organic_xyz/1_opt.cml'}, 2: ...
+    >>> model.report_['success'].all()
+    True
 
     """
 
-    def __init__(self, file_path, from_format, to_format):
+    def __init__(self, file_path, from_format, to_format, engine='pybel', n_jobs=1, output=None):
         self.file_path = file_path
         self.from_format = from_format
         self.to_format = to_format
+        self.engine = engine
+        self.n_jobs = n_jobs
+        self.output = output
 
-    def convert(self):
-        converted_file_paths = {}
+    def _input_files(self):
+        """
+        The internal function to collect and check the (index, path) of the input files.
+        """
         if isinstance(self.file_path, str):
-            if not self.from_format == self.file_path[-len(self.from_format):]:
+            files = [(1, self.file_path)]
+        elif isinstance(self.file_path, dict):
+            files = [(it, self.file_path[it]['file']) for it in range(1, len(self.file_path) + 1)]
+        else:
+            msg = "The parameter 'file_path' must be a string or a dictionary."
+            raise ValueError(msg)
+        for _, fpath in files:
+            if not fpath[-len(self.from_format):] == self.from_format:
                 msg = 'file format is not the same as from_format'
                 raise ValueError(msg)
+        return files
 
+    def convert(self):
+        files = self._input_files()
+        if self.engine not in ('pybel', 'rdkit'):
+            msg = "The parameter 'engine' must be either of 'pybel' or 'rdkit'."
+            raise ValueError(msg)
+        if self.output is not None and self.to_format != 'sdf':
+            msg = "The to_format must be 'sdf' to collect all the molecules in a single output file."
+            raise ValueError(msg)
+        n_jobs = _n_workers(self.n_jobs)
+
+        tasks = []
+        for it, fpath in files:
+            if self.output is None:
+                target = fpath[:fpath.rfind('.') + 1] + self.to_format
             else:
-                ob_from_format = '-i' + self.from_format
-                ob_to_format = '-o' + self.to_format
-                path = self.file_path[:self.file_path.rfind('.') + 1]
-                command = 'babel ' + ob_from_format + ' ' + self.file_path + ' ' + ob_to_format + ' ' + path + self.to_format
-                print(command)
-                os.system(command)
-                converted_file_paths[1] = {'file': path + self.to_format}
+                target = None
+            tasks.append((it, fpath, target, self.from_format, self.to_format, self.engine))
 
-        elif isinstance(self.file_path, dict):
-            for it in range(1, len(self.file_path) + 1):
-                fpath = self.file_path[it]['file']
-                if not fpath[-len(self.from_format):] == self.from_format:
-                    msg = 'file format is not the same as from_format'
-                    raise ValueError(msg)
-                else:
-                    ob_from_format = '-i' + self.from_format
-                    ob_to_format = '-o' + self.to_format
-                    path = fpath[:fpath.rfind('.') + 1]
-                    command = 'babel ' + ob_from_format + ' ' + fpath + ' ' + ob_to_format + ' ' + path + self.to_format
-                    os.system(command)
-                    converted_file_paths[it] = {'file': path + self.to_format}
+        if n_jobs == 1:
+            results = [_convert_file(task) for task in tasks]
+        else:
+            pool = multiprocessing.Pool(n_jobs)
+            try:
+                chunk_size = max(1, int(np.ceil(len(tasks) / float(4 * n_jobs))))
+                results = pool.map(_convert_file, tasks, chunk_size)
+            finally:
+                pool.terminate()
 
+        converted_file_paths = {}
+        rows = []
+        if self.output is not None:
+            with open(self.output, 'w') as f:
+                for (it, fpath, _, _, _, _), (text, success, seconds, message) in zip(tasks, results):
+                    if success:
+                        f.write(text)
+                        converted_file_paths[it] = {'file': self.output}
+                    rows.append((it, fpath, self.output if success else None, success, seconds, message))
+        else:
+            for (it, fpath, target, _, _, _), (_, success, seconds, message) in zip(tasks, results):
+                if success:
+                    converted_file_paths[it] = {'file': target}
+                rows.append((it, fpath, target if success else None, success, seconds, message))
+        self.report_ = pd.DataFrame([row[1:] for row in rows], index=[row[0] for row in rows],
+                                    columns=['file', 'output', 'success', 'time', 'message'])
         return converted_file_paths
+
+
+def _convert_file(args):
+    """
+    The internal function to convert a file (in a worker process).
+    If the target is None, the converted text is returned instead of being written to a file.
+    It returns (text, success, seconds, message).
+    """
+    it, fpath, target, from_format, to_format, engine = args
+    start = time.time()
+    try:
+        if engine == 'pybel':
+            text = _convert_pybel(fpath, from_format, to_format)
+        else:
+            text = _convert_rdkit(fpath, from_format, to_format)
+        if target is not None:
+            with open(target, 'w') as f:
+                f.write(text)
+            text = None
+        return text, True, time.time() - start, ''
+    except Exception as err:
+        return None, False, time.time() - start, str(err) or type(err).__name__
+
+
+def _convert_pybel(fpath, from_format, to_format):
+    """
+    The internal function to convert all the molecules of a file with openbabel.
+    """
+    import pybel
+    molecules = list(pybel.readfile(from_format, fpath))
+    if len(molecules) == 0:
+        msg = "No molecule was read from the file."
+        raise ValueError(msg)
+    return ''.join(mol.write(to_format) for mol in molecules)
+
+
+def _convert_rdkit(fpath, from_format, to_format):
+    """
+    The internal function to convert all the molecules of a file with rdkit.
+    """
+    from rdkit import Chem
+
+    if from_format == 'xyz':
+        from rdkit.Chem import rdDetermineBonds
+        mol = Chem.MolFromXYZFile(fpath)
+        if mol is not None:
+            rdDetermineBonds.DetermineBonds(mol, charge=0)
+        molecules = [mol]
+    elif from_format == 'mol':
+        molecules = [Chem.MolFromMolFile(fpath, removeHs=False)]
+    elif from_format == 'sdf':
+        molecules = list(Chem.SDMolSupplier(fpath, removeHs=False))
+    elif from_format == 'mol2':
+        molecules = [Chem.MolFromMol2File(fpath, removeHs=False)]
+    elif from_format == 'pdb':
+        molecules = [Chem.MolFromPDBFile(fpath, removeHs=False)]
+    elif from_format == 'smi':
+        with open(fpath) as f:
+            molecules = [Chem.MolFromSmiles(line.split()[0]) for line in f if line.strip()]
+    else:
+        msg = "The format '%s' can't be read by rdkit." % from_format
+        raise ValueError(msg)
+    if len(molecules) == 0 or any(mol is None for mol in molecules):
+        msg = "The file couldn't be parsed by rdkit."
+        raise ValueError(msg)
+
+    if to_format in ('mol', 'sdf'):
+        return ''.join(Chem.MolToMolBlock(mol) + '$$$$\n' for mol in molecules) if to_format == 'sdf' \
+            else Chem.MolToMolBlock(molecules[0])
+    elif to_format == 'xyz':
+        return ''.join(Chem.MolToXYZBlock(mol) for mol in molecules)
+    elif to_format == 'pdb':
+        return ''.join(Chem.MolToPDBBlock(mol) for mol in molecules)
+    elif to_format == 'smi':
+        return ''.join(Chem.MolToSmiles(mol) + '\n' for mol in molecules)
+    elif to_format == 'inchi':
+        return ''.join(Chem.MolToInchi(mol) + '\n' for mol in molecules)
+    else:
+        msg = "The format '%s' can't be written by rdkit." % to_format
+        raise ValueError(msg)
@@ -5,6 +5,7 @@ This module loads trained models to predict properties of organic molecules
 from __future__ import print_function
 
 import os
+import hashlib
 import pkg_resources
 import numpy as np
 import pandas as pd
@@ -14,6 +15,7 @@ from rdkit import Chem
 from rdkit.Chem.rdMolDescriptors import GetMorganFingerprintAsBitVect
 
 from chemml.models.keras.trained.engine import check_array_input
+from chemml.utils.cache import params_hash
 
 
 class OrganicLorentzLorenz():
@@ -28,8 +30,15 @@ class OrganicLorentzLorenz():
 
     The model is a fully connected artificial neural network with 3 hidden layers. The number of neurons per layers from
     input layer to the output layer are as follow: 1024 --> 128 --> 64 --> 32 --> [1, 1, 1].
+
+    Parameters
+    ----------
+    cache: chemml.utils.FeatureCache, optional (default = None)
+        If provided, the predictions are looked up in the cache by the canonical SMILES of the molecule and the hash of
+        the model weights, and only the missing ones are computed (and stored in the cache).
     """
-    def __init__(self):
+    def __init__(self, cache=None):
+        self.cache = cache
         self.path = pkg_resources.resource_filename('chemml', os.path.join('datasets', 'data', 'models',
                                                                            'keras', 'organic_lorentz_lorenz'))
         # load x and y scalers
@@ -46,10 +55,20 @@ class OrganicLorentzLorenz():
 
         """
         self.model = load_model(os.path.join(self.path, 'Morgan_100k.h5'))
+        self._set_namespace()
         if isinstance(summary, bool):
             if summary:
                 self.model.summary()
 
+    def _set_namespace(self):
+        """
+        The internal function to hash the model weights, so that the cached predictions of a retrained model are not reused.
+        """
+        h = hashlib.sha1()
+        for w in self.model.get_weights():
+            h.update(np.ascontiguousarray(w).tobytes())
+        self._namespace = params_hash('OrganicLorentzLorenz', {'weights': h.hexdigest()})
+
     def __represent(self, smiles):
         # The descriptor must be a binary Morgan fingerprint with radius 2 and 1024 bits.
 
@@ -80,22 +99,23 @@ class OrganicLorentzLorenz():
         """
         # Todo: smiles can be a list or file path?!
         # check smiles type
-        if isinstance(smiles, str):
-            # find descriptor
-            self.descriptor = self.__represent(smiles)
-        else:
+        if not isinstance(smiles, str):
             msg = "smiles must has `str` type."
             raise ValueError(msg)
 
-        # preprocess fingerprint: keep all of them for this model
-        xin = (self.descriptor - self.x_scaler['ss_mean'].values) / self.x_scaler['ss_scale'].values
-        xin = xin.reshape(1, 1024)
+        # find descriptor (it's also kept for the cached predictions)
+        self.descriptor = self.__represent(smiles)
 
-        # y1: RI, y2: polarizability (Bohr^3), y3: density (Kg/m^3)
-        y1, y2, y3 = self.model.predict(xin)
-        ri = float(y1 * self.y_scaler['ss_scale'][0] + self.y_scaler['ss_mean'][0])
-        pol = float(y2 * self.y_scaler['ss_scale'][1] + self.y_scaler['ss_mean'][1])
-        den = float(y3 * self.y_scaler['ss_scale'][2] + self.y_scaler['ss_mean'][2])
+        if self.cache is not None:
+            key = Chem.MolToSmiles(Chem.MolFromSmiles(smiles.strip()))
+            values, found = self.cache.get(self._namespace, [key], np.float64, 3)
+            if found[0]:
+                ri, pol, den = [float(v) for v in values[0]]
+            else:
+                ri, pol, den = self._predict(self.descriptor)
+                self.cache.put(self._namespace, [key], np.array([[ri, pol, den]]))
+        else:
+            ri, pol, den = self._predict(self.descriptor)
 
         # print out predictions
         if pprint:
@@ -105,6 +125,21 @@ class OrganicLorentzLorenz():
             print ('   density (Kg/m^3):       ', '%.2f' % den)
         return (ri, pol, den)
 
+    def _predict(self, descriptor):
+        """
+        The internal function to predict the properties of a molecule from its descriptor with the keras model.
+        """
+        # preprocess fingerprint: keep all of them for this model
+        xin = (descriptor - self.x_scaler['ss_mean'].values) / self.x_scaler['ss_scale'].values
+        xin = xin.reshape(1, 1024)
+
+        # y1: RI, y2: polarizability (Bohr^3), y3: density (Kg/m^3)
+        y1, y2, y3 = self.model.predict(xin)
+        ri = float(y1 * self.y_scaler['ss_scale'][0] + self.y_scaler['ss_mean'][0])
+        pol = float(y2 * self.y_scaler['ss_scale'][1] + self.y_scaler['ss_mean'][1])
+        den = float(y3 * self.y_scaler['ss_scale'][2] + self.y_scaler['ss_mean'][2])
+        return (ri, pol, den)
+
     def train(self, X, Y, scale=True, kwargs_for_compile={}, kwargs_for_fit={}):
         """
         This function allows the user to retrain the model on a given data set for some further steps.
@@ -201,6 +236,7 @@ class OrganicLorentzLorenz():
         default_kwargs.update(kwargs_for_compile)
         self.model.compile(**default_kwargs)
         self.model.fit(X, [y1, y2, y3], **kwargs_for_fit)
+        self._set_namespace()
 
     def get_hidden_layer(self, X, id=1):
         """
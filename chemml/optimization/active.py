@@ -8,6 +8,10 @@ from builtins import range
 import warnings
 import types
 import copy
+import random
+import mmap
+import contextlib
+import multiprocessing
 
 import numpy as np
 import pandas as pd
@@ -16,6 +20,10 @@ from sklearn.model_selection import ShuffleSplit, KFold
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
+from sklearn.utils import check_random_state
+
+# the number of candidates per block of the (m,d) arrays in the bemcm approach
+_BLOCK_SIZE = 65536
 
 
 class ActiveLearning(object):
@@ -38,6 +46,8 @@ class ActiveLearning(object):
 
     U: array-like
         The features/descriptors of unlabeled candidates that are available to be labeled.
+        A memory-mapped numpy array (e.g., np.load(path, mmap_mode='r')) or an h5py dataset is not loaded into
+        the memory: the candidates are read, scaled and predicted in blocks of `block_size` rows.
 
     target_layer: str or list or FunctionType
         If str, it's the name of a layer of the Keras model that is linearly mapped to the outputs.
@@ -78,6 +88,13 @@ class ActiveLearning(object):
         This parameter must be an integer and greater than one. It specifies the number of previous active learning
         rounds to memorize for the distribution shift alleviation (DSA) approach.
 
+    block_size: int, optional (default = 100000)
+        The number of candidates that are scaled, predicted and passed to the target layer at a time.
+
+    sample_size: int, optional (default = 100000)
+        The maximum number of candidates that are randomly sampled to fit the scaler of the features.
+        If U is smaller than sample_size, the scaler is fitted to all of the candidates.
+
     Attributes
     ----------
     queries: list
@@ -116,15 +133,19 @@ class ActiveLearning(object):
     random_search
     visualize
     get_target_layer
+    save
+    load
 
     Notes
     -----
     - You won't be able to resume the search unless you deposit the requested labeled data.
+    - The state of a search (e.g., between the rounds of a long campaign) can be stored with the `save` method and
+      restored by the `load` method of a new instance with the same model_creator and U.
 
     """
 
     def __init__(self, model_creator, U, target_layer, train_size=100, test_size=100,
-                 test_type='passive', batch_size=[10], history=2):
+                 test_type='passive', batch_size=[10], history=2, block_size=100000, sample_size=100000):
         self.model_creator = model_creator
         self.U = U
         self.target_layer = target_layer
@@ -133,15 +154,46 @@ class ActiveLearning(object):
         self.test_type = test_type
         self.batch_size = batch_size
         self.history = history
+        self.block_size = block_size
+        self.sample_size = sample_size
         self._fit()
 
+    def __getstate__(self):
+        # a memory-mapped U is pickled by reference to its file
+        state = self.__dict__.copy()
+        state['U'] = _array_spec(self.U)
+        return state
+
+    def __setstate__(self, state):
+        state['U'] = _open_array(state['U'])
+        self.__dict__.update(state)
+
     def _X_train(self):
         """ We don't want to keep a potentially big matrix in the memory."""
-        return self.U[self.train_indices]
+        return _take(self.U, self.train_indices)
 
     def _X_test(self):
         """ We don't want to keep a potentially big matrix in the memory."""
-        return self.U[self.test_indices]
+        return _take(self.U, self.test_indices)
+
+    def _fit_scaler(self, X_scaler, random_state):
+        """
+        The internal function to fit the scaler of features to all of the candidates or to a random sample of them.
+        """
+        X = self._sample(random_state)
+        if hasattr(X_scaler, 'fit'):
+            X_scaler.fit(X)
+        else:
+            X_scaler.fit_transform(X)
+
+    def _sample(self, random_state):
+        """
+        The internal function to read all of the candidates or a random sample of `sample_size` of them.
+        """
+        if self.U_size <= self.sample_size:
+            return np.asarray(self.U[:])
+        rng = check_random_state(random_state)
+        return _take(self.U, np.sort(rng.choice(self.U_size, self.sample_size, replace=False)))
 
     @property
     def queries(self):
@@ -182,9 +234,15 @@ class ActiveLearning(object):
         return df
 
     def _fit(self):
-        # np array the input U
-        self.U = np.array(self.U)
-        self.U_size = self.U.shape[0]
+        # np array the input U, unless it's memory-mapped or an h5py dataset
+        if not isinstance(self.U, np.ndarray) and not _is_h5py(self.U):
+            self.U = np.array(self.U)
+        self.U_size = int(self.U.shape[0])
+
+        if not isinstance(self.block_size, int) or self.block_size < 1 or \
+                not isinstance(self.sample_size, int) or self.sample_size < 1:
+            msg = "The parameters 'block_size' and 'sample_size' must be positive int."
+            raise ValueError(msg)
 
         # Todo: support for sklearn linear models
         if not isinstance(self.model_creator, types.FunctionType):
@@ -259,6 +317,87 @@ class ActiveLearning(object):
                            'results', 'random_results']
 
         self.lr = 0
+        # the weights of the last trained models, by (kind, iteration)
+        self._weights = {}
+
+    def save(self, path):
+        """
+        This function stores the state of the search and the weights of the last trained models in a compressed
+        numpy file (.npz). The U, the model_creator and the other parameters are not stored.
+
+        Parameters
+        ----------
+        path: str
+            The path to the file.
+
+        """
+        arrays = {'U_size': np.array(self.U_size),
+                  'query_number': np.array(self.query_number),
+                  'lr': np.array(self.lr),
+                  'history': self._history,
+                  'train_indices': np.asarray(self.train_indices, dtype=int),
+                  'test_indices': np.asarray(self.test_indices, dtype=int),
+                  'initial_test_indices': np.asarray(self.initial_test_indices, dtype=int),
+                  'U_indices': np.asarray(self.U_indices, dtype=int),
+                  'qbc_queries': np.asarray(self.qbc_queries, dtype=int),
+                  'dsa_queries': np.asarray(self.dsa_queries, dtype=int),
+                  'bemcm_queries': np.asarray(self.bemcm_queries, dtype=int),
+                  'results': np.array(self._results, dtype=float).reshape(-1, 9),
+                  'random_results': np.array(self._random_results, dtype=float).reshape(-1, 9),
+                  'query_names': np.array([q[0] for q in self._queries], dtype=str),
+                  'query_offsets': np.cumsum([0] + [len(q[1]) for q in self._queries]),
+                  'query_indices': np.concatenate([np.asarray(q[1], dtype=int) for q in self._queries] +
+                                                  [np.array([], dtype=int)])}
+        for name in ('Y_train', 'Y_test', 'Y_pred'):
+            if getattr(self, '_' + name) is not None:
+                arrays[name] = getattr(self, '_' + name)
+        # the weights of each model, e.g., weights/ensemble/2/0 is the first array of the third ensemble model
+        for (kind, it), weights in self._weights.items():
+            for i, w in enumerate(weights):
+                arrays['weights/%s/%i/%i' % (kind, it, i)] = w
+        np.savez_compressed(path, **arrays)
+
+    def load(self, path):
+        """
+        This function restores the state of the search and the weights of the last trained models from a file that
+        is stored by the `save` method. The instance must be created with the same U.
+
+        Parameters
+        ----------
+        path: str
+            The path to the file.
+
+        """
+        with np.load(path, allow_pickle=False) as f:
+            if int(f['U_size']) != self.U_size:
+                msg = "The stored search has %i candidates, but the U has %i." % (int(f['U_size']), self.U_size)
+                raise ValueError(msg)
+            if f['history'].shape != self._history.shape:
+                msg = "The stored search has a different 'history' parameter."
+                raise ValueError(msg)
+            self.query_number = int(f['query_number'])
+            self.lr = float(f['lr'])
+            self._history = f['history']
+            self.train_indices = f['train_indices']
+            self.test_indices = f['test_indices']
+            self.initial_test_indices = f['initial_test_indices']
+            self.U_indices = f['U_indices']
+            self.qbc_queries = [int(i) for i in f['qbc_queries']]
+            self.dsa_queries = [int(i) for i in f['dsa_queries']]
+            self.bemcm_queries = [int(i) for i in f['bemcm_queries']]
+            self._results = [[int(r[0]), int(r[1]), int(r[2])] + list(r[3:]) for r in f['results']]
+            self._random_results = [[int(r[0]), int(r[1]), int(r[2])] + list(r[3:]) for r in f['random_results']]
+            offsets = f['query_offsets']
+            self._queries = [[str(name), f['query_indices'][offsets[i]:offsets[i + 1]]]
+                             for i, name in enumerate(f['query_names'])]
+            for name in ('Y_train', 'Y_test', 'Y_pred'):
+                setattr(self, '_' + name, f[name] if name in f.files else None)
+            weights = {}
+            for key in f.files:
+                if key.startswith('weights/'):
+                    _, kind, it, i = key.split('/')
+                    weights.setdefault((kind, int(it)), {})[int(i)] = f[key]
+            self._weights = {model: [arrays[i] for i in range(len(arrays))] for model, arrays in weights.items()}
 
     def get_target_layer(self, model, X):
         """
@@ -520,7 +659,8 @@ class ActiveLearning(object):
             else:
                 return None, None
 
-    def search(self, n_evaluation=3, ensemble='bootstrap', n_ensemble=4, normalize_input=True, normalize_internal=False, random_state=90, **kwargs):
+    def search(self, n_evaluation=3, ensemble='bootstrap', n_ensemble=4, normalize_input=True, normalize_internal=False,
+               random_state=90, n_jobs=1, warm_start=False, **kwargs):
         """
         The main function to start or continue an active learning search.
         The bootstrap approach is used to generate an ensemble of models that estimate the prediction
@@ -552,6 +692,23 @@ class ActiveLearning(object):
         random_state: int or RandomState, optional (default = 90)
             The random state will be directly passed to the sklearn.model_selection.KFold or ShuffleSplit
             Additional info at: https://scikit-learn.org/stable/modules/generated/sklearn.model_selection.KFold.html
+            It also draws the bootstrap samples and the seeds (numpy, random and tensorflow) of each model, so that
+            the queries are identical for a fixed int random_state, regardless of n_jobs.
+            The global states of numpy and random and the global seed of tensorflow are restored after each model.
+            If None, no seed is set.
+
+        n_jobs: int, optional (default = 1)
+            The number of worker processes to train the evaluation and ensemble models concurrently.
+            Each worker clears its Keras session before building a model. If -1, all the CPUs are used.
+            The workers only receive the model_creator, the training and test arrays, and the seed and initial
+            weights of each model; the candidates (U) are predicted by the trained weights in the main process.
+            Note that the workers are spawned, thus the model_creator must be picklable (i.e., defined at the module
+            level) and the main script must be guarded by `if __name__ == '__main__':`.
+
+        warm_start: bool, optional (default = False)
+            If True, each model starts from the weights of the same model of the previous search (or of the loaded
+            state), so that a few epochs (passed by kwargs) are enough to fine-tune it on the updated training set.
+            The models without previous weights are trained from scratch.
 
         kwargs
             Any argument (except input data) that should be passed to the model's fit method.
@@ -563,6 +720,12 @@ class ActiveLearning(object):
             This is a 1D array.
 
         """
+        if n_jobs == -1:
+            n_jobs = multiprocessing.cpu_count()
+        elif not isinstance(n_jobs, int) or n_jobs < 1:
+            msg = "The parameter 'n_jobs' must be a positive integer or -1."
+            raise ValueError(msg)
+
         # check if queries are provided
         if len(self._queries) > 0 :
             msg = "The requested data must be provided first. Check the 'queries' attribute for the info regarding the indices of the queried candidates."
@@ -589,58 +752,90 @@ class ActiveLearning(object):
         # scale
         X_scaler, Y_scaler = self._scaler(normalize_input)
         if X_scaler is not None:
-            # scale X arrays
-            Utr = X_scaler.fit_transform(self.U)
+            # scale X arrays, U is scaled block by block
+            self._fit_scaler(X_scaler, random_state)
             X_tr = X_scaler.transform(X_tr)
             X_te = X_scaler.transform(X_te)
             # scale Y
             Y_tr = Y_scaler.fit_transform(Y_tr)
-        else:
-            Utr = self.U
-
-        # assert not (Utr == self.U).all()  # run just for test
+        Utr = _CandidatePool(self.U, X_scaler, self.block_size)
 
         # make sure the data is not overwritten
         # assert not (X_tr == self.U[self.train_indices]).all()   # run just for test
         assert not (Y_tr == self._Y_train).all()
 
+        # Ensemble
+        if ensemble=='kfold' and n_ensemble>1:
+            cv = KFold(n_splits=n_ensemble, shuffle=True, random_state=random_state)
+            g = cv.split(X_tr)
+        elif ensemble=='shuffle':
+            cv = ShuffleSplit(n_splits=n_ensemble, train_size = X_tr.shape[0]-1, test_size= None, random_state=random_state)
+            g = cv.split(X_tr)
+        elif ensemble == 'bootstrap' or n_ensemble == 1:
+            g = None
+        else:
+            msg = "You must select between 'bootstrap', 'kfold' or 'shuffle' sampling methods with the `n_ensemble` greater than zero."
+            raise ValueError(msg)
+
+        # the seeds and training samples of all models are drawn before training, to be independent of n_jobs
+        rng = check_random_state(random_state)
+        if random_state is None:
+            seeds = [None] * (n_evaluation + n_ensemble)
+        else:
+            seeds = list(rng.randint(np.iinfo(np.int32).max, size=n_evaluation + n_ensemble))
+        weights = self._weights if warm_start else {}
+        tasks = [('evaluation', it, seeds[it], None, weights.get(('evaluation', it)))
+                 for it in range(n_evaluation)]
+        for it in range(n_ensemble):
+            if g is None:
+                train_index = rng.choice(range(len(X_tr)), size=len(X_tr), replace=True)
+            else:
+                train_index, _ = next(g)
+            tasks.append(('ensemble', it, seeds[n_evaluation + it], train_index, weights.get(('ensemble', it))))
+
+        # train the evaluation and ensemble models, serially or by a pool of worker processes
+        state = {'model_creator': self.model_creator, 'X_tr': X_tr, 'Y_tr': Y_tr, 'X_te': X_te, 'Y_te': Y_te,
+                 'Y_scaler': Y_scaler, 'bemcm': bemcm, 'kwargs': kwargs}
+        if n_jobs == 1:
+            outputs = [_train_member(task, state) for task in tasks]
+        else:
+            # tensorflow is not fork-safe: the workers are spawned
+            context = multiprocessing.get_context('spawn')
+            pool = context.Pool(min(n_jobs, len(tasks)), initializer=_init_worker, initargs=(state,))
+            try:
+                outputs = pool.map(_run_member, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        del state
+
+        # keep the weights of the trained models
+        self._weights = {(kind, it): output['weights'] for (kind, it, _, _, _), output in zip(tasks, outputs)}
+
+        # predict the candidates with the trained models
+        for task, output in zip(tasks, outputs):
+            self._predict_member(task, output, Utr, Y_scaler, bemcm)
+
         # training and evaluation
         it_results = {'mae':[], 'rmse':[], 'r2':[]}
         Y_U_pred_df = pd.DataFrame()  # empty dataframe to collect f(U) at each iteration
         learning_rate = []
         lin_layers = {}
-        for it in range(n_evaluation):
-            model = self.model_creator()
-            model, _, mae, rmse, r2 = self._train_predict_evaluate(model,
-                                                                           [X_tr, Y_tr, X_te],
-                                                                           Y_scaler,
-                                                                           Y_te,
-                                                                           **kwargs)
+        for it, output in enumerate(outputs[:n_evaluation]):
             # Todo: how can we support multioutput?
             # predict Y of remaining U, f(Utr)
-            if Y_scaler is not None:
-                Y_U_pred_df[it] = Y_scaler.inverse_transform(model.predict(Utr)).reshape(-1,)
+            Y_U_pred_df[it] = output['Y_U_pred']
 
-            # calculate the linear layer, phi(U), and collect lr for bemcm approach
+            # the linear layer, phi(U), and lr for bemcm approach
             if bemcm:
-                lin_layers[it] = self.get_target_layer(model, Utr[self.U_indices])
-                # if it == 0:
-                #     lin_layer = self.get_target_layer(model, Utr[self.U_indices])
-                # else:
-                #     temp = self.get_target_layer(model, Utr[self.U_indices])
-                #     lin_layer = lin_layer + temp
-
+                lin_layers[it] = output['lin_layer']
                 assert lin_layers[it].shape[0] == self.U_indices.shape[0]
-
-                # collect lr
-                from keras import backend as K
-                learning_rate.append(K.eval(model.optimizer.lr))
+                learning_rate.append(output['lr'])
 
             # metrics
-            it_results['mae'].append(mae)
-            it_results['rmse'].append(rmse)
-            it_results['r2'].append(r2)
-            del model
+            it_results['mae'].append(output['mae'])
+            it_results['rmse'].append(output['rmse'])
+            it_results['r2'].append(output['r2'])
 
         # store evaluation results
         results_temp = [self.query_number, len(self.train_indices), len(self.test_indices)]
@@ -675,42 +870,10 @@ class ActiveLearning(object):
             alpha = float(np.mean(learning_rate))
             self.lr = alpha
 
-        # Ensemble
-        if ensemble=='kfold' and n_ensemble>1:
-            cv = KFold(n_splits=n_ensemble, shuffle=True, random_state=random_state)
-            g = cv.split(X_tr)
-        elif ensemble=='shuffle':
-            cv = ShuffleSplit(n_splits=n_ensemble, train_size = X_tr.shape[0]-1, test_size= None, random_state=random_state)
-            g = cv.split(X_tr)
-        elif ensemble == 'bootstrap' or n_ensemble == 1:
-            g = None
-        else:
-            msg = "You must select between 'bootstrap', 'kfold' or 'shuffle' sampling methods with the `n_ensemble` greater than zero."
-            raise ValueError(msg)
-
-        for it in range(n_ensemble):
-            if g is None:
-                train_index = np.random.choice(range(len(X_tr)), size=len(X_tr), replace=True)
-            else:
-                train_index, _ = next(g)
-            Xtr = X_tr[train_index]
-            Ytr = Y_tr[train_index]
-            # model
-            model = self.model_creator()
-            model, Z_U_pred, _, _, _ = self._train_predict_evaluate(model,
-                                                                    [Xtr,Ytr,Utr],
-                                                                    None,   # don't inverse_transform preds
-                                                                    False,
-                                                                    **kwargs)
-            deviation = fU_preds_scaled - Z_U_pred     # shape: (m,1)
-
-            # collect the bootstrap deviation from actual predictions
-            if it==0:
-                deviations = deviation
-            else:
-                deviations = np.append(deviations, deviation, axis=1)
-
-            del Xtr, Z_U_pred, model
+        # collect the bootstrap deviation from actual predictions, shape: (m,n_ensemble)
+        deviations = np.concatenate([fU_preds_scaled - output['Z_U_pred'] for output in outputs[n_evaluation:]],
+                                    axis=1)
+        del outputs
         del X_tr, Y_tr, Utr      # from now on we only need deviations and lin_layer
 
         assert deviations.shape == (self.U_size, n_ensemble)
@@ -759,10 +922,7 @@ class ActiveLearning(object):
         """
         qbc approach
         """
-        votes = pd.DataFrame(deviations)
-        votes['sigma'] = deviations.std(axis=1)
-        votes['ind'] = votes.index
-        votes.sort_values('sigma', ascending=False, inplace=True)
+        sigma = deviations.std(axis=1)
 
         # check if qbc should compensate underselection by dsa approach
         if former_queries is None:
@@ -772,74 +932,69 @@ class ActiveLearning(object):
             former_queries = np.unique(former_queries)
             qbc_size = sum(self.batch_size) - len(former_queries)
 
-        # start query
-        i_qbc_queries = []
-        n = 1
-        while len(i_qbc_queries) < qbc_size:
-            select = list(votes.head(n)['ind'])
-            while select[-1] in former_queries:
-                n += 1
-                select = list(votes.head(n)['ind'])
-            i_qbc_queries += select[-1:]
-            n += 1
-        return i_qbc_queries
+        # the candidates with the largest disagreement of the committee, except the former queries
+        return _top_k(sigma, qbc_size, exclude=former_queries)
 
     def _dsa_y_dist(self):
         """
         dsa approach based on the distribution of the test data and predicted y values
         """
-        # test distribuiton
-        f = pd.DataFrame(self._Y_test, columns=['yt'])
-        f['ind'] = f.index
-        out, bins = pd.cut(f.yt, 100, retbins=True)
-        groups = f.groupby(['ind', out])
-        _ytest_dist = pd.DataFrame(groups.size().unstack().sum())
-        _ytest_dist.sort_values(0, ascending=False, inplace=True)
-        _ytest_dist['prob'] = _ytest_dist[0]/sum(_ytest_dist[0])
-
-        # train distribution
-        f = pd.DataFrame(self._Y_train, columns=['yt'])
-        f['ind'] = f.index
-        groups = f.groupby(['ind', pd.cut(f.yt, bins)])
-        _ytrain_dist = pd.DataFrame(groups.size().unstack().sum())
-        _ytrain_dist.sort_values(0, ascending=False, inplace=True)
-        _ytrain_dist['prob'] = _ytrain_dist[0]/sum(_ytrain_dist[0])
-        del f
+        # test distribuiton in 100 bins
+        _, bins = pd.cut(self._Y_test.reshape(-1,), 100, retbins=True)
+        n_bins = len(bins) - 1
+        test_counts = np.bincount(_bin_index(self._Y_test.reshape(-1,), bins), minlength=n_bins + 1)[:n_bins]
+
+        # train distribution (the values out of the bins are not counted)
+        train_counts = np.bincount(_bin_index(self._Y_train.reshape(-1,), bins), minlength=n_bins + 1)[:n_bins]
 
         # difference in distribution
-        self._dist_shift = pd.DataFrame(_ytest_dist['prob'] - _ytrain_dist['prob'])
-        self._dist_shift.sort_values('prob', ascending=False, inplace=True)
+        shift = test_counts / float(test_counts.sum()) - train_counts / float(train_counts.sum())
+        order = np.argsort(-shift, kind='stable')
+        self._dist_shift = pd.DataFrame({'prob': shift[order]}, index=pd.IntervalIndex.from_breaks(bins)[order])
 
         # find n selection per bin for underrepresented points in training data
-        intervals = tuple(self._dist_shift[self._dist_shift['prob'] > 0].index)
+        intervals = order[shift[order] > 0]
         if len(intervals) == 0:
             return []   # if no distribution shift was diagnosed this method will be ineffective
         n_selection_p_bin = int(self.batch_size[2]/len(intervals))
         leftovers = self.batch_size[2] - len(intervals)*n_selection_p_bin
 
-        # select based on unlabeled U and y preds
-        unlabeled_y_preds = pd.DataFrame(self._Y_pred[self.U_indices], columns=['yp'])
+        # select based on unlabeled U and y preds: the unlabeled indices sorted by their bin
+        unlabeled_bins = _bin_index(self._Y_pred[self.U_indices].reshape(-1,), bins).astype(np.uint8)
+        members = np.argsort(unlabeled_bins, kind='stable')    # a radix sort of the small integers
+        bounds = np.searchsorted(unlabeled_bins[members], np.arange(n_bins + 1))
+
+        def indices_of(bin):
+            return members[bounds[bin]:bounds[bin + 1]]
 
         i_dsa_queries = []
         if n_selection_p_bin > 0:
-            for i, bin in enumerate(intervals):
-                indices = list(unlabeled_y_preds[(unlabeled_y_preds['yp'] > bin.left) & (unlabeled_y_preds['yp'] <= bin.right)].index)
+            for bin in intervals:
+                indices = indices_of(bin)
                 if len(indices) > n_selection_p_bin:
                     select = list(np.random.choice(indices, n_selection_p_bin, replace=False))
                 else:
-                    select = indices
+                    select = list(indices)
                     leftovers += n_selection_p_bin - len(indices)
                 i_dsa_queries += select
 
-        # leftovers
+        # leftovers: the members of each bin are partitioned, the available (not selected) ones first
+        selected = np.zeros(len(unlabeled_bins), dtype=bool)
+        selected[np.array(i_dsa_queries, dtype=int)] = True
+        pool = members[np.lexsort((selected[members], unlabeled_bins[members]))]
+        n_available = np.bincount(unlabeled_bins[~selected], minlength=n_bins + 1)
+        eligible = np.diff(bounds) > n_selection_p_bin + int(leftovers/len(intervals))
         n = 0
         while len(i_dsa_queries) < self.batch_size[2]:
             bin = intervals[n]
-            indices = list(unlabeled_y_preds[(unlabeled_y_preds['yp'] > bin.left) & (unlabeled_y_preds['yp'] <= bin.right)].index)
-            if len(indices)> n_selection_p_bin+int(leftovers/len(intervals)) :
-                select = np.random.choice(indices, 1)[0]
-                while select in i_dsa_queries:
-                    select = np.random.choice(indices, 1)[0]
+            if eligible[bin] and n_available[bin] > 0:
+                # draw one of the available members and move it after them
+                start = bounds[bin]
+                last = start + n_available[bin] - 1
+                k = start + np.random.randint(n_available[bin])
+                select = pool[k]
+                pool[k], pool[last] = pool[last], select
+                n_available[bin] -= 1
             else:
                 if n == len(intervals) - 1:
                     break
@@ -854,7 +1009,7 @@ class ActiveLearning(object):
 
         assert len(i_dsa_queries) <= self.batch_size[2]
 
-        return i_dsa_queries
+        return [int(i) for i in i_dsa_queries]
 
     def _dsa_test_y(self):
         """
@@ -863,16 +1018,17 @@ class ActiveLearning(object):
         self._history_update(self._Y_pred.reshape(-1,))
         uncertainty_change = self._uncertainty_tracker(self._history[:,-1], self.history-1)      #shape: (m,)
         uncertainty_change_test = uncertainty_change[self.test_indices]
-        votes = pd.DataFrame(uncertainty_change_test, columns=['uc'])
-        votes['ind'] = votes.index
-        votes.sort_values('uc', ascending=False, inplace=True)
-        unlabeled_y_preds = self._Y_pred[self.U_indices]
+        votes = np.argsort(-uncertainty_change_test, kind='stable')
+
+        # the sorted predictions of unlabeled candidates to find the nearest one to each test prediction
+        unlabeled_y_preds = self._Y_pred[self.U_indices].reshape(-1,)
+        order = np.argsort(unlabeled_y_preds, kind='stable')
+        sorted_preds = unlabeled_y_preds[order]
         i_dsa_queries = []
-        n = 1
-        while len(i_dsa_queries) < self.batch_size[2]:
-            select = list(votes.head(n)['ind'])
-            idx = self.find_nearest(unlabeled_y_preds, self._Y_pred[self.test_indices[select[-1]]])
-            n+=1
+        for select in votes:
+            if len(i_dsa_queries) >= self.batch_size[2]:
+                break
+            idx = _nearest(sorted_preds, order, float(self._Y_pred[self.test_indices[select]]))
             if idx not in i_dsa_queries:
                 i_dsa_queries.append(idx)
         return i_dsa_queries
@@ -890,11 +1046,7 @@ class ActiveLearning(object):
         self._history_update(dev)
         uncertainty_change = self._uncertainty_tracker(self._history[:,-1], self.history-1)      #shape: (m,)
         uncertainty_change = uncertainty_change[self.U_indices]
-        uncertainty_change = pd.DataFrame(uncertainty_change, columns=['uc'])
-        uncertainty_change['ind'] = uncertainty_change.index
-        uncertainty_change.sort_values('uc', ascending=False, inplace=True)
-        i_dsa_queries = list(uncertainty_change.head(self.batch_size[2])['ind'])
-        return i_dsa_queries
+        return _top_k(uncertainty_change, self.batch_size[2])
 
     def _uncertainty_tracker(self, dev, i):
         """
@@ -910,8 +1062,7 @@ class ActiveLearning(object):
         """
         update last column of the history with dev and shift all the previous columns to the left.
         """
-        for i in range(self.history-1):
-            self._history[:,i] = self._history[:,i+1]
+        self._history[:,:-1] = self._history[:,1:]
         self._history[:,-1] = dev
 
     def _bemcm(self, deviations, lin_layer, alpha, normalize_internal, former_queries):
@@ -919,48 +1070,64 @@ class ActiveLearning(object):
         bemcm approach
         B_EMCM = EMCM - correlation_term
         EMCM = mean(deviations * lin_layer)
+
+        The correlation term of each candidate is a multiple of its own latent features, thus the norm of B_EMCM is
+        updated incrementally with a scalar per candidate and ensemble model (or, if normalize_internal, with a (d,d)
+        matrix per ensemble model). The (m,d) arrays are only computed in float32 blocks of candidates.
         """
         former_queries = np.unique(former_queries)
         bemcm_size = sum(self.batch_size) - len(former_queries)
-        # shapes: m = number of samples, d = length of latent features
-        i_queries = []              # the indices of queries based on the length of U_indices (not original U)
-        correlation_term = {it: np.zeros(lin_layer.shape) for it in range(deviations.shape[1])}   # shape of each: (m,d)
-        while len(i_queries) < bemcm_size:
-            norms = pd.DataFrame()  # store the norms of n_ensemble models
-            for it in range(deviations.shape[1]):
-                # EMCM
-                EMCM = deviations[:,it].reshape(-1,1) * lin_layer
-
-                # correlation term acts after first selection
-                if len(i_queries) > 0:
-                    correlation_term[it] += self._correlation_term(i_queries[-1], deviations[:,it], lin_layer, normalize_internal)
+        # shapes: m = number of samples, d = length of latent features, k = number of ensemble models
+        lin_layer = np.asarray(lin_layer, dtype=np.float32)
+        deviations = np.asarray(deviations, dtype=np.float64)
+        m, d = lin_layer.shape
+        n_ensemble = deviations.shape[1]
+        blocks = [slice(start, min(start + _BLOCK_SIZE, m)) for start in range(0, m, _BLOCK_SIZE)]
 
-                # calculate batch EMCM
-                B_EMCM = EMCM - alpha * correlation_term[it]    # shape: (m,d)
+        # the candidates that can't be selected
+        selected = np.zeros(m, dtype=bool)
+        selected[former_queries.astype(int)] = True
 
-                # find norm and
-                norm = np.linalg.norm(B_EMCM, axis=1)
-                norms[it] = norm.reshape(-1,)
+        if normalize_internal:
+            W = np.zeros((n_ensemble, d, d), dtype=np.float32)
+            b = np.zeros((n_ensemble, d), dtype=np.float32)
+        else:
+            lin_norm = np.concatenate([np.linalg.norm(lin_layer[block], axis=1) for block in blocks])
+            corr = np.zeros((m, n_ensemble))     # the correlation term is corr * lin_layer
 
-            # average and argmax of norms
-            assert norms.shape == (self.U_indices.shape[0], deviations.shape[1])
-            norms['mean'] = norms.mean(axis=1)
-            norms['ind'] = norms.index
-            norms = norms.drop(i_queries, axis=0)   # remove rows of previously selected points
-            norms.sort_values('mean', ascending=False, inplace=True)
+        i_queries = []              # the indices of queries based on the length of U_indices (not original U)
+        while len(i_queries) < bemcm_size:
+            # the average norm of B_EMCM over the ensemble models, shape: (m,)
+            if normalize_internal:
+                norms = np.empty(m)
+                for block in blocks:
+                    phi = lin_layer[block]
+                    norm = np.zeros(phi.shape[0])
+                    for it in range(n_ensemble):
+                        B_EMCM = phi * deviations[block, it, None].astype(np.float32)
+                        if len(i_queries) > 0:
+                            B_EMCM -= alpha * (phi * np.dot(phi, W[it]) - b[it])
+                        norm += np.linalg.norm(B_EMCM, axis=1)
+                    norms[block] = norm / n_ensemble
+            else:
+                norms = lin_norm * np.abs(deviations - alpha * corr).mean(axis=1)
 
             # memorize the initial ranking of the norms
             if len(i_queries) == 0:
-                initial_ranking = list(norms.head(bemcm_size)['ind'])
-
-            # select top candidate and update i_queries
-            n = 1
-            select = list(norms.head(n)['ind'])
-            while select[0] in former_queries:
-                n += 1
-                select = [list(norms.head(n)['ind'])[-1]]
-
-            i_queries += select
+                initial_ranking = np.argsort(-norms, kind='stable')[:bemcm_size]
+
+            # select top candidate that is not selected yet
+            select = int(np.argmax(np.where(selected, -np.inf, norms)))
+            selected[select] = True
+            i_queries.append(select)
+
+            # update the correlation term with the selected candidate
+            if len(i_queries) < bemcm_size:
+                gram = np.concatenate([np.dot(lin_layer[block], lin_layer[select]) for block in blocks])   # (m,)
+                if normalize_internal:
+                    self._update_normalized_correlation(W, b, gram, lin_layer, select, deviations[select], blocks)
+                else:
+                    corr += gram.reshape(-1, 1) * deviations[select]
 
         # make sure correlation term is making any difference than simple sorting of the initial norms
         if set(initial_ranking) <= set(i_queries):
@@ -969,19 +1136,56 @@ class ActiveLearning(object):
 
         return i_queries
 
-    def _correlation_term(self, ind, dev, lin_layer, normalize_internal):
+    def _update_normalized_correlation(self, W, b, gram, lin_layer, select, deviation, blocks):
         """
-        The internal function to find the correlation term
+        The internal function to add the standardized correlation term of the selected candidate to W and b.
+        The correlation term of the selected candidate for the ensemble model `it` is deviation[it] * gram * lin_layer,
+        and its column-wise standardization (as the sklearn StandardScaler) is sign(deviation[it]) * (y - mean) / std,
+        where y = gram * lin_layer and gram = lin_layer . lin_layer[select]. Thus, y / std = lin_layer * (lin_layer @ W).
         """
-        deviations_asterisk = dev[ind] * lin_layer[ind]    # shape: (d,)
-        deviations_asterisk_transpose = deviations_asterisk.reshape(-1,1).T  # shape (1,d)
-        lin_layer_transpose = lin_layer.T       # shape: (d,m)
-        dot = np.dot(deviations_asterisk_transpose, lin_layer_transpose)  # shape: (1,m)
-        correlation_term_of_ind = dot.T * lin_layer       # shape (m,d) same shape as lin_layer
-        if normalize_internal:
-            scaler = StandardScaler()
-            correlation_term_of_ind = scaler.fit_transform(correlation_term_of_ind)
-        return correlation_term_of_ind
+        m = lin_layer.shape[0]
+        # two passes over the blocks for the mean and standard deviation of y
+        mean = sum(np.sum(gram[block, None] * lin_layer[block], axis=0, dtype=np.float64) for block in blocks) / m
+        var = sum(np.sum((gram[block, None] * lin_layer[block] - mean) ** 2, axis=0, dtype=np.float64)
+                  for block in blocks) / m
+        std = np.sqrt(var)
+        # the constant columns are zero after centering
+        constant = std <= 10 * np.finfo(np.float32).eps * np.maximum(np.abs(mean), 1.0)
+        inv_std = np.where(constant, 0.0, 1.0 / np.where(constant, 1.0, std))
+        sign = np.sign(deviation)
+        W += (sign[:, None, None] * np.outer(lin_layer[select], inv_std)[None]).astype(np.float32)
+        b += (sign[:, None] * (mean * inv_std)[None]).astype(np.float32)
+
+    def _predict_member(self, task, output, Utr, Y_scaler, bemcm):
+        """
+        The internal function to predict the candidates with a trained evaluation or ensemble model of the search.
+        The model of a worker process is rebuilt from its weights. The predictions (and the target layer and the
+        learning rate of an evaluation model for the bemcm approach) are added to the output.
+        """
+        model = output.pop('model', None)
+        if model is None:
+            if task[2] is None:
+                model = self.model_creator()
+            else:
+                # building the model doesn't change the global random states
+                with _seeded(int(task[2])):
+                    model = self.model_creator()
+            model.set_weights(output['weights'])
+
+        if task[0] == 'ensemble':
+            # don't inverse_transform preds
+            output['Z_U_pred'] = Utr.predict(model)
+            return
+
+        Y_U_pred = Utr.predict(model)
+        if Y_scaler is not None:
+            Y_U_pred = Y_scaler.inverse_transform(Y_U_pred)
+        output['Y_U_pred'] = Y_U_pred.reshape(-1,)
+
+        # calculate the linear layer, phi(U), for bemcm approach
+        if bemcm:
+            output['lin_layer'] = np.concatenate([self.get_target_layer(model, X)
+                                                  for X in Utr.blocks(self.U_indices)], axis=0)
 
     def _train_predict_evaluate(self, model=None, data_list=None, Y_scaler=None, metrics=None, **kwargs):
         """
@@ -1004,18 +1208,7 @@ class ActiveLearning(object):
         float
             R-squared
         """
-        model.fit(data_list[0], data_list[1], **kwargs)
-        preds = model.predict(data_list[2])
-        if Y_scaler is not None:
-            preds = Y_scaler.inverse_transform(preds)
-
-        mae=None; rmse=None; r2=None
-        if isinstance(metrics, np.ndarray):
-            mae = mean_absolute_error(metrics, preds)
-            rmse = np.sqrt(mean_squared_error(metrics, preds))
-            r2 = r2_score(metrics, preds)
-
-        return model, preds, mae, rmse, r2
+        return _train_predict_evaluate(model, data_list, Y_scaler, metrics, **kwargs)
 
     def random_search(self, Y, test_type='passive', scale=True, n_evaluation=10, random_state=90, **kwargs):
         """
@@ -1102,17 +1295,17 @@ class ActiveLearning(object):
             for train_indices, _ in ss.split(except_test_inds):
                 # training indices based on the original U
                 actual_tr_inds = np.array(except_test_inds)[train_indices]
-                X_tr = self.U[actual_tr_inds]
+                X_tr = _take(self.U, actual_tr_inds)
                 Y_tr = Y[actual_tr_inds]
 
                 # test set based on the test type
-                X_te = self.U[test_indices]
+                X_te = _take(self.U, test_indices)
                 Y_te = Y[test_indices]
                 # scale
                 X_scaler, Y_scaler = self._scaler(scale)
                 if X_scaler is not None:
                     # scale X arrays
-                    _ = X_scaler.fit_transform(self.U)
+                    self._fit_scaler(X_scaler, random_state)
                     X_tr = X_scaler.transform(X_tr)
                     X_te = X_scaler.transform(X_te)
                     # scale Y
@@ -1141,7 +1334,7 @@ class ActiveLearning(object):
 
         return True
 
-    def visualize(self, Y=None):
+    def visualize(self, Y=None, random_state=90):
         """
         This function plot distribution of labels and principal components of the features for the last round of the
         active learning search.
@@ -1155,6 +1348,10 @@ class ActiveLearning(object):
             The 2-dimensional label for all the candidates in the pool (in case you have them!!!).
             If you have all the labels, we will be able to produce additional cool visualizations.
 
+        random_state: int or RandomState, optional (default = 90)
+            The random state to draw the sample of candidates that the principal components are fitted to,
+            in case U is larger than sample_size. The default value is the same as in the search method,
+            thus both the scaler and the principal components are fitted to the same sample.
 
         Returns
         -------
@@ -1169,8 +1366,11 @@ class ActiveLearning(object):
         collect_plots = {}
 
         # feature transformation
+        # the pca is fitted to a sample of U and transforms U block by block
         pca = PCA(n_components=2)
-        u = pca.fit_transform(self.U)   # use this (original) transformed feature space for all the X data
+        pca.fit(self._sample(random_state))
+        pool = _CandidatePool(self.U, block_size=self.block_size)
+        u = np.concatenate([pca.transform(X) for X in pool.blocks()], axis=0)   # use this (original) transformed feature space for all the X data
         u_rem = u[self.U_indices]
         # test is fixed
         xte = u[self.test_indices]
@@ -1389,4 +1589,296 @@ class ActiveLearning(object):
                      ax.get_xticklabels() + ax.get_yticklabels()):
             item.set_fontsize(14)
 
-        return fig
\ No newline at end of file
+        return fig
+
+class _CandidatePool(object):
+    """
+    The internal class to read the candidates of U in blocks and scale them. It is pickled by reference to the file
+    of a memory-mapped U, thus the worker processes don't copy the pool.
+    """
+    def __init__(self, U, scaler=None, block_size=100000):
+        self.U = U
+        self.scaler = scaler
+        self.block_size = block_size
+
+    def __len__(self):
+        return int(self.U.shape[0])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['U'] = _array_spec(self.U)
+        return state
+
+    def __setstate__(self, state):
+        state['U'] = _open_array(state['U'])
+        self.__dict__.update(state)
+
+    def blocks(self, indices=None):
+        """
+        generates the scaled blocks of all the candidates or of the candidates with the given indices.
+        """
+        n = len(self) if indices is None else len(indices)
+        for start in range(0, n, self.block_size):
+            if indices is None:
+                X = np.asarray(self.U[start:start + self.block_size])
+            else:
+                X = _take(self.U, indices[start:start + self.block_size])
+            if self.scaler is not None:
+                X = self.scaler.transform(X)
+            yield X
+
+    def predict(self, model):
+        """
+        predicts all the candidates with the model, block by block.
+        """
+        return np.concatenate([model.predict(X) for X in self.blocks()], axis=0)
+
+
+def _is_h5py(U):
+    """
+    The internal function to check if U is an h5py dataset.
+    """
+    return type(U).__module__.startswith('h5py')
+
+
+def _array_spec(U):
+    """
+    The internal function to describe a memory-mapped array or an h5py dataset by its file, to be pickled.
+    """
+    if isinstance(U, np.memmap) and isinstance(U.base, mmap.mmap) and U.filename is not None:
+        order = 'F' if U.flags.f_contiguous and not U.flags.c_contiguous else 'C'
+        return ('memmap', U.filename, U.dtype.str, U.shape, U.offset, order)
+    elif _is_h5py(U):
+        return ('h5py', U.file.filename, U.name)
+    return ('array', U)
+
+
+def _open_array(spec):
+    """
+    The internal function to open an array that is described by the `_array_spec` function.
+    """
+    if spec[0] == 'memmap':
+        _, filename, dtype, shape, offset, order = spec
+        return np.memmap(filename, dtype=np.dtype(dtype), mode='r', shape=shape, offset=offset, order=order)
+    elif spec[0] == 'h5py':
+        return _H5Dataset(spec[1], spec[2])
+    return spec[1]
+
+
+class _H5Dataset(object):
+    """
+    The internal class to read an h5py dataset by its file and name. The file is opened for each read, thus the
+    unpickled pools (e.g., in the worker processes) don't leave any file handle open.
+    """
+    def __init__(self, filename, name):
+        import h5py
+        self.filename = filename
+        self.name = name
+        with h5py.File(filename, 'r') as f:
+            self.shape = f[name].shape
+            self.dtype = f[name].dtype
+
+    def __len__(self):
+        return int(self.shape[0])
+
+    def __getitem__(self, key):
+        import h5py
+        with h5py.File(self.filename, 'r') as f:
+            return f[self.name][key]
+
+    def __array__(self, dtype=None):
+        return np.asarray(self[()], dtype=dtype)
+
+
+def _take(U, indices):
+    """
+    The internal function to read the rows of U with the given indices into the memory.
+    """
+    indices = np.asarray(indices, dtype=int)
+    if isinstance(U, np.ndarray):
+        return np.asarray(U[indices])
+    # h5py datasets are indexed by increasing indices
+    unique, inverse = np.unique(indices, return_inverse=True)
+    return np.asarray(U[unique])[inverse]
+
+
+def _top_k(values, k, exclude=None):
+    """
+    The internal function to find the indices of the k largest values in descending order, except the excluded
+    indices, with a partial sort.
+    """
+    values = np.asarray(values, dtype=float).reshape(-1,)
+    if exclude is not None and len(exclude) > 0:
+        values = values.copy()
+        values[np.asarray(exclude, dtype=int)] = -np.inf
+    k = min(k, len(values))
+    if k <= 0:
+        return []
+    top = np.argpartition(-values, k - 1)[:k] if k < len(values) else np.arange(len(values))
+    top = top[np.argsort(-values[top], kind='stable')]
+    return [int(i) for i in top]
+
+
+def _bin_index(values, bins):
+    """
+    The internal function to find the index of right-closed bins, e.g. (bins[0], bins[1]], of the values.
+    The values out of the bins get the index len(bins) - 1.
+    """
+    index = np.searchsorted(bins, values, side='left') - 1
+    index[(index < 0) | (index >= len(bins) - 1)] = len(bins) - 1
+    return index
+
+
+def _nearest(sorted_values, order, value):
+    """
+    The internal function to find the index of the nearest value to `value` in an array, given the sorted values
+    and the sorting indices of the array. As numpy argmin, the first index is returned for ties.
+    """
+    pos = np.searchsorted(sorted_values, value)
+    candidates = []
+    for p in (pos - 1, pos):
+        if 0 <= p < len(sorted_values):
+            # the first index of the run of equal values (order is a stable argsort)
+            first = np.searchsorted(sorted_values, sorted_values[p], side='left')
+            candidates.append((abs(sorted_values[p] - value), int(order[first])))
+    return min(candidates)[1]
+
+
+def _train_predict_evaluate(model, data_list, Y_scaler=None, metrics=None, **kwargs):
+    """
+    The internal function to train the model, predict the test values and calculate the metrics if requested.
+    It doesn't depend on the ActiveLearning object, so it also runs in the worker processes of the search.
+    """
+    model.fit(data_list[0], data_list[1], **kwargs)
+    if isinstance(data_list[2], _CandidatePool):
+        preds = data_list[2].predict(model)
+    else:
+        preds = model.predict(data_list[2])
+    if Y_scaler is not None:
+        preds = Y_scaler.inverse_transform(preds)
+
+    mae=None; rmse=None; r2=None
+    if isinstance(metrics, np.ndarray):
+        mae = mean_absolute_error(metrics, preds)
+        rmse = np.sqrt(mean_squared_error(metrics, preds))
+        r2 = r2_score(metrics, preds)
+
+    return model, preds, mae, rmse, r2
+
+
+# the state of search in the worker processes
+_WORKER_STATE = {}
+
+
+def _init_worker(state):
+    """
+    The internal function to store the state of search in a worker process.
+    """
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update(state)
+    _WORKER_STATE['isolated'] = True
+
+
+def _run_member(task):
+    """
+    The internal function to train a model of the search in a worker process.
+    The keras model itself isn't sent back, only its weights.
+    """
+    output = _train_member(task, _WORKER_STATE)
+    del output['model']
+    return output
+
+
+def _tf_seed(tf):
+    """
+    The internal function to read the global seed of tensorflow.
+    """
+    if hasattr(tf, 'executing_eagerly') and tf.executing_eagerly():
+        from tensorflow.python.eager import context
+        return context.global_seed()
+    if hasattr(tf, 'compat') and hasattr(tf.compat, 'v1'):
+        return tf.compat.v1.get_default_graph().seed
+    return tf.get_default_graph().seed
+
+
+def _set_tf_seed(tf, seed):
+    """
+    The internal function to set the global seed of tensorflow.
+    """
+    if hasattr(tf.random, 'set_seed'):
+        tf.random.set_seed(seed)
+    else:
+        tf.set_random_seed(seed)
+
+
+@contextlib.contextmanager
+def _seeded(seed):
+    """
+    The internal context manager to seed the random number generators of python, numpy and tensorflow.
+    The global states of python and numpy and the global seed of tensorflow are restored on exit.
+    """
+    random_state = random.getstate()
+    np_state = np.random.get_state()
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        import tensorflow as tf
+    except ImportError:
+        tf = None
+    if tf is not None:
+        tf_seed = _tf_seed(tf)
+        _set_tf_seed(tf, seed)
+    try:
+        yield
+    finally:
+        random.setstate(random_state)
+        np.random.set_state(np_state)
+        if tf is not None:
+            _set_tf_seed(tf, tf_seed)
+
+
+def _train_member(task, state):
+    """
+    The internal function to train one of the evaluation or ensemble models of the search, with the seed of the task.
+
+    Returns
+    -------
+    dict
+        The trained model and its weights, and the metrics (and the learning rate) of an evaluation model.
+    """
+    seed = task[2]
+    if state.get('isolated', False):
+        # each task builds its model in a fresh Keras session of the worker
+        from keras import backend as K
+        K.clear_session()
+    if seed is None:
+        return _fit_member(task, state)
+    with _seeded(int(seed)):
+        return _fit_member(task, state)
+
+
+def _fit_member(task, state):
+    """
+    The internal function to build, train and evaluate the model of a task.
+    """
+    kind, it, _, train_index, weights = task
+    model = state['model_creator']()
+    if weights is not None:
+        model.set_weights(weights)
+
+    if kind == 'ensemble':
+        model.fit(state['X_tr'][train_index], state['Y_tr'][train_index], **state['kwargs'])
+        return {'model': model, 'weights': model.get_weights()}
+
+    model, _, mae, rmse, r2 = _train_predict_evaluate(model,
+                                                      [state['X_tr'], state['Y_tr'], state['X_te']],
+                                                      state['Y_scaler'],
+                                                      state['Y_te'],
+                                                      **state['kwargs'])
+    output = {'model': model, 'weights': model.get_weights(), 'mae': mae, 'rmse': rmse, 'r2': r2}
+
+    # collect lr for bemcm approach
+    if state['bemcm']:
+        from keras import backend as K
+        output['lr'] = float(K.eval(model.optimizer.lr))
+    return output
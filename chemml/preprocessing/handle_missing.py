@@ -14,26 +14,48 @@ class MissingValues(object):
     Parameters
     ----------
     strategy: string, optional (default="ignore_row")
-        
+
         list of strategies:
         - interpolate: interpolate based on sorted target values
         - zero: set to the zero
+        - mean: set to the mean of the column
+        - median: set to the median of the column
         - ignore_row: remove the entire row in data and target
         - ignore_column: remove the entire column in data and target
 
     string_as_null: boolean, optional (default=True)
         If True non numeric elements are considered to be null in computations.
-    
+
     missing_values: list, optional (default=None)
         where you define specific formats of missing values. It is a list of string, float or integer values.
 
     inf_as_null: boolean, optional (default=True)
         If True inf and -inf elements are considered to be null in computations.
 
+    Attributes
+    ----------
+    columns_: pandas Index
+        The columns that are kept after removing the non-numerical and all-null columns.
+
+    fill_values_: pandas Series
+        The fill value of each column, only if strategy = 'zero', 'mean' or 'median'.
+
+    mask: pandas Series
+        The binary mask of kept rows/columns, only if strategy = 'ignore_row' or 'ignore_column'.
+
     Returns
     -------
     data frame
     mask: Only if strategy = ignore_row. Mask is a binary pandas series which stores the information regarding removed
+
+    Examples
+    --------
+    >>> import pandas as pd
+    >>> from chemml.preprocessing import MissingValues
+    >>> mv = MissingValues(strategy='mean')
+    >>> mv = mv.fit(pd.read_csv('descriptors.csv', chunksize=100000))
+    >>> for chunk in mv.transform(pd.read_csv('descriptors.csv', chunksize=100000)):
+    ...     pass
     """
 
     def __init__(self,
@@ -46,7 +68,26 @@ class MissingValues(object):
         self.inf_as_null = inf_as_null
         self.missing_values = missing_values
 
-    def fit_transform(self, df):
+    def fit(self, df):
+        """
+        use fit to compute the kept columns and the fill values (or the mask) of the specified strategy.
+
+        Parameters
+        ----------
+        df : pandas data frame or iterable of pandas data frames
+            The iterable of data frames (e.g., pd.read_csv(path, chunksize=...)) is processed one chunk at a time,
+            for data frames that don't fit in the memory. The 'median' strategy can't be fitted in chunks.
+
+        Returns
+        -------
+        self
+        """
+        if isinstance(df, pd.DataFrame):
+            df = [df]
+        self._fit((self._clean(chunk.copy()) for chunk in df))
+        return self
+
+    def fit_transform(self, df, copy=True):
         """
         use fit_transform for:
             - replace missing values with nan.
@@ -57,6 +98,11 @@ class MissingValues(object):
         ----------
         df : pandas data frame
 
+        copy: boolean, optional (default=True)
+            If True, the input data frame is copied first, which doubles the memory of a large data frame.
+            If False, the missing values of the input data frame are replaced and filled in place instead of on a copy.
+            A data frame with dropped (non-numerical or all-null) columns is returned as a new data frame.
+
         Attributes
         ----------
         binary pandas series, only if strategy = 'ignore_row' or 'ignore_column'
@@ -65,64 +111,198 @@ class MissingValues(object):
             The goal is keeping track of removed rows/columns to change the target data frame or other input data frames based
             on that. The mask can later be used in the transform method to change other data frames in the same way.
         """
-        if self.inf_as_null == True:
-            df.replace([np.inf, -np.inf, 'inf', '-inf'], np.nan, True)
-        if self.string_as_null == True:
-            df = df.convert_objects(convert_numeric=True)
+        self._check_strategy()
+        if copy:
+            df = df.copy()
+        df = self._clean(df)
+        self._fit([df])
+        if self.strategy in ('ignore_row', 'ignore_column'):
+            return self._apply_mask(df)
+        return self._fill(self._select(df))
+
+    def transform(self, df, copy=True):
+        """
+        For strategy = 'ignore_row' or 'ignore_column', the mask of the fitted data frame is applied to the input
+        data frame (e.g., the target). The fitted data frame itself (or a chunk of it) is also cleaned and reduced to
+        the fitted columns, as in the fit_transform method. For other strategies, the missing values of the input data frame are
+        replaced with the fitted fill values (or interpolated).
+
+        Parameters
+        ----------
+        df : pandas dataframe, pandas series, numpy array or iterable of pandas data frames
+            A pandas series or a numpy array (e.g., the target) is transformed as a single input.
+            If an iterable of data frames (e.g., pd.read_csv(path, chunksize=...)), the transformed chunks are
+            generated one at a time. The 'interpolate' strategy can't be applied in chunks.
+
+        copy: boolean, optional (default=True)
+            If True, the input data frame is copied first, which doubles the memory of a large data frame. For an
+            iterable of data frames, only one chunk at a time is copied.
+            If False, the missing values of the input data frame (or of each chunk) are replaced and filled in place
+            instead of on a copy, e.g., for a data frame or the chunks of pd.read_csv that are not used afterwards.
+            A data frame with dropped (non-numerical or all-null) columns is returned as a new data frame.
+
+        Returns
+        -------
+        transformed data frame (or a generator of transformed data frames).
+        """
+        if isinstance(df, pd.Series):
+            if self.strategy == 'ignore_row':
+                return df[self._row_mask(df)]
+            if self.strategy == 'ignore_column':
+                # removing columns doesn't remove any row of a target
+                return df.copy() if copy else df
+            return self.transform(df.to_frame(), copy=copy).iloc[:, 0]
+        if isinstance(df, np.ndarray):
+            if self.strategy == 'ignore_row':
+                return df[self.mask.values]
+            if self.strategy == 'ignore_column':
+                return df if df.ndim == 1 else df[:, self.mask.values]
+            return self.transform(pd.DataFrame(df), copy=copy).to_numpy().reshape(df.shape)
+
+        if not isinstance(df, pd.DataFrame):
+            if not hasattr(df, '__iter__') or isinstance(df, (str, bytes)):
+                msg = "The input must be a pandas data frame, pandas series, numpy array or an iterable of data frames."
+                raise TypeError(msg)
+            if self.strategy == 'interpolate':
+                msg = "The 'interpolate' strategy can't be applied to a data frame in chunks."
+                raise ValueError(msg)
+            return (self.transform(chunk, copy=copy) for chunk in df)
+
+        if self.strategy in ('ignore_row', 'ignore_column'):
+            if self._is_fitted(df):
+                # the fitted data frame (or a chunk of it)
+                if copy:
+                    df = df.copy()
+                return self._apply_mask(self._clean(df))
+            if self.strategy == 'ignore_row':
+                return df[self._row_mask(df)]
+            return df.loc[:, self.mask]
+
+        if copy:
+            df = df.copy()
+        df = self._clean(df)
+        missing = self.columns_.difference(df.columns)
+        if len(missing) > 0:
+            msg = "The data frame doesn't include the fitted columns: %s" % str(list(missing))
+            raise ValueError(msg)
+        return self._fill(self._select(df))
+
+    def _check_strategy(self):
+        """
+        The internal function to check the strategy parameter.
+        """
+        if self.strategy not in ('zero', 'mean', 'median', 'ignore_row', 'ignore_column', 'interpolate'):
+            msg = "Wrong strategy has been passed"
+            raise TypeError(msg)
+
+    def _clean(self, df):
+        """
+        The internal function to replace the missing values with nan and drop the non-numerical columns.
+        The input data frame is modified.
+        """
         if isinstance(self.missing_values, (list, tuple)):
-            for pattern in self.missing_values:
-                df.replace(pattern, np.nan, True)
+            df.replace(list(self.missing_values), np.nan, inplace=True)
+        if self.string_as_null == True:
+            object_cols = df.columns[df.dtypes == object]
+            if len(object_cols) > 0:
+                df[object_cols] = df[object_cols].apply(pd.to_numeric, errors='coerce')
+        if self.inf_as_null == True:
+            df.replace([np.inf, -np.inf, 'inf', '-inf'], np.nan, inplace=True)
+        return check_object_col(df, 'df')
 
-        df = check_object_col(df, 'df')
-        # drop null columns
-        df.dropna(axis=1, how='all', inplace=True)
+    def _fit(self, chunks):
+        """
+        The internal function to compute the statistics of the strategy in one pass over the cleaned chunks.
+        """
+        self._check_strategy()
+        counts = None
+        sums = None
+        row_nulls = []
+        row_index = []
+        median = None
+        n_rows = 0
+        for chunk in chunks:
+            n_rows += len(chunk)
+            if counts is None:
+                counts = chunk.count()
+            else:
+                # keep the order of columns
+                order = counts.index.append(chunk.columns.difference(counts.index, sort=False))
+                counts = counts.add(chunk.count(), fill_value=0).reindex(order)
+            if self.strategy == 'mean':
+                s = chunk.sum()
+                sums = s if sums is None else sums.add(s, fill_value=0)
+            elif self.strategy == 'median':
+                if median is not None:
+                    msg = "The 'median' strategy can't be fitted to a data frame in chunks."
+                    raise ValueError(msg)
+                median = chunk.median()
+            elif self.strategy == 'ignore_row':
+                row_nulls.append(chunk.isnull().sum(axis=1).values)
+                row_index.append(chunk.index)
+        if counts is None:
+            msg = "The data frame is empty."
+            raise ValueError(msg)
 
+        # drop null columns
+        self.columns_ = counts.index[counts > 0]
         if self.strategy == 'zero':
-            for col in df.columns:
-                df[col].fillna(value=0, inplace=True)
-            return df
+            self.fill_values_ = pd.Series(0.0, index=self.columns_)
+        elif self.strategy == 'mean':
+            self.fill_values_ = sums[self.columns_] / counts[self.columns_]
+        elif self.strategy == 'median':
+            self.fill_values_ = median[self.columns_]
         elif self.strategy == 'ignore_row':
-            dfi = df.index
-            df.dropna(axis=0, how='any', inplace=True)
-            mask = [i in df.index for i in dfi]
-            self.mask = pd.Series(mask, index=dfi)
-            # self.mask = pd.notnull(df).all(1)
-            # df = df[self.mask]
-            return df
+            # every row is null in the dropped null columns
+            n_null_columns = int((counts == 0).sum())
+            self.mask = pd.Series(np.concatenate(row_nulls) == n_null_columns,
+                                  index=row_index[0].append(row_index[1:]))
         elif self.strategy == 'ignore_column':
-            dfc = df.columns
-            df.dropna(axis=1, how='any', inplace=True)
-            mask = [i in df.columns for i in dfc]
-            self.mask = pd.Series(mask, index=dfc)
-            # self.mask = pd.notnull(df).all(0)
-            # df = df.T[self.mask].T
-            return df
-        elif self.strategy == 'interpolate':
-            df = df.interpolate()
-            df.fillna(
-                method='ffill', axis=1, inplace=True
-            )  # because of nan in the first and last element of column
-            return df
-        else:
-            msg = "Wrong strategy has been passed"
-            raise TypeError(msg)
+            self.mask = pd.Series((counts[self.columns_] == n_rows).values, index=self.columns_)
 
-    def transform(self, df):
+    def _select(self, df):
         """
-        Only if the class is fitted with 'ignore_row' or 'ignore_column' strategies.
+        The internal function to drop the columns that are not fitted.
+        """
+        extra = df.columns.difference(self.columns_, sort=False)
+        if len(extra) > 0:
+            df = df.drop(columns=extra)
+        return df
 
-        Parameters
-        ----------
-        df : pandas dataframe
+    def _is_fitted(self, df):
+        """
+        The internal function to check if the data frame is the fitted one (or a chunk of it), rather than a target.
+        """
+        if not self.columns_.isin(df.columns).all():
+            return False
+        return self.strategy == 'ignore_column' or df.index.isin(self.mask.index).all()
 
-        Returns
-        -------
-        transformed data frame based on the mask vector from fit_transform method.
+    def _row_mask(self, df):
+        """
+        The internal function to find the kept rows of the data frame (or a chunk of it).
+        """
+        if len(self.mask) == len(df) and self.mask.index.equals(df.index):
+            return self.mask.values
+        return self.mask.loc[df.index].values
+
+    def _apply_mask(self, df):
+        """
+        The internal function to remove the rows/columns of the fitted data frame.
         """
         if self.strategy == 'ignore_row':
-            return df[self.mask]
-        elif self.strategy == 'ignore_column':
-            return df.loc[:, self.mask]
-        else:
-            msg = "The transform method doesn't change the dataframe if strategy='zero' or 'interpolate'. You should fit_transform the new dataframe with those methods."
-            warnings.warn(msg)
+            return df.loc[self._row_mask(df), self.columns_]
+        return df.loc[:, self.mask.index[self.mask.values]]
+
+    def _fill(self, df):
+        """
+        The internal function to fill the nan values of all columns with the fitted fill values in one vectorized pass.
+        The data frame is filled in place.
+        """
+        if self.strategy == 'interpolate':
+            df = df.interpolate()
+            df.fillna(
+                method='ffill', axis=1, inplace=True
+            )  # because of nan in the first and last element of column
+            return df
+        df.fillna(value=self.fill_values_, inplace=True)
+        return df
@@ -1,5 +1,6 @@
 from builtins import range
 import numpy as np
+import pandas as pd
 
 
 class ConstantColumns(object):
@@ -15,6 +16,15 @@ class ConstantColumns(object):
     -------
     df: pandas dataframe
 
+    Examples
+    --------
+    >>> import pandas as pd
+    >>> from chemml.preprocessing import ConstantColumns
+    >>> cc = ConstantColumns()
+    >>> for chunk in pd.read_csv('descriptors.csv', chunksize=100000):
+    ...     cc = cc.partial_fit(chunk)
+    >>> for chunk in pd.read_csv('descriptors.csv', chunksize=100000):
+    ...     chunk = cc.transform(chunk)
     """
 
     def fit_transform(self, df):
@@ -30,11 +40,52 @@ class ConstantColumns(object):
         -------
         transformed dataframe
         """
-        dfc = df.columns
-        df = df.loc[:, (df != df.iloc[0]).any()]
-        self.removed_columns_ = np.array(
-            [i for i in dfc if i not in df.columns])
-        return df
+        self.fit(df)
+        return self.transform(df)
+
+    def fit(self, df):
+        """
+        find the constant columns of the input dataframe
+
+        Parameters
+        ----------
+        df: pandas dataframe
+            input dataframe
+
+        Returns
+        -------
+        self
+        """
+        for attr in ('_first', '_varies'):
+            if hasattr(self, attr):
+                delattr(self, attr)
+        return self.partial_fit(df)
+
+    def partial_fit(self, df):
+        """
+        update the constant columns with a chunk of rows, for dataframes that don't fit in the memory.
+        All the chunks must have the same columns.
+
+        Parameters
+        ----------
+        df: pandas dataframe
+            a chunk of the input dataframe
+
+        Returns
+        -------
+        self
+        """
+        if len(df) == 0:
+            return self
+        if not hasattr(self, '_first'):
+            self._first = df.iloc[0]
+            self._varies = pd.Series(False, index=df.columns)
+        elif not df.columns.equals(self._first.index):
+            msg = "All the chunks of the dataframe must have the same columns."
+            raise ValueError(msg)
+        self._varies |= (df != self._first).any()
+        self.removed_columns_ = np.array(self._varies.index[~self._varies.values])
+        return self
 
     def transform(self, df):
         """
@@ -49,7 +100,7 @@ class ConstantColumns(object):
         -------
         transformed dataframe
         """
-        df = df.drop(self.removed_columns_, 1)
+        df = df.drop(columns=self.removed_columns_)
         return df
 
 
@@ -67,18 +118,34 @@ class Outliers(object):
         available options: 'mean' and 'median'
         Values of each column will be compared to the 'mean' or 'median' of that column.
 
+    sketch_size: int, optional (default=10000)
+        The number of rows that are uniformly sampled by partial_fit to approximate the median of each column.
+
+    random_state: int, optional (default=None)
+        The seed of the random sampling of rows in partial_fit.
+
     Attributes
     ----------
-    removed_rows_: numpy array of indices that have been removed
+    removed_rows_: numpy array of indices that have been removed, only set by the fit_transform method
+
+    center_: pandas Series
+        the mean or median of each column
+
+    std_: pandas Series
+        the standard deviation of each column
 
     Notes
     -----
     We highly recommend you to remove constant columns first and then remove outliers.
+    The partial_fit method accumulates the mean and standard deviation of columns with the Welford's algorithm,
+    so the mean strategy is exact. The median of columns is approximated by a uniform sample of rows.
     """
 
-    def __init__(self, m=2.0, strategy='median'):
+    def __init__(self, m=2.0, strategy='median', sketch_size=10000, random_state=None):
         self.m = m
         self.strategy = strategy
+        self.sketch_size = sketch_size
+        self.random_state = random_state
 
     def fit_transform(self, df):
         """
@@ -93,27 +160,133 @@ class Outliers(object):
         -------
         transformed dataframe
         """
-        if self.strategy == 'mean':
-            mask = ((df - df.mean()).abs() <= self.m * df.std(ddof=0)).T.all()
-        elif self.strategy == 'median':
-            mask = (((df - df.median()).abs()) <=
-                    self.m * df.std(ddof=0)).T.all()
+        # the streaming statistics start over from this dataframe, so a later partial_fit continues from it
+        self.fit(df)
+        # the exact statistics of the whole dataframe
+        self.center_ = df.mean() if self.strategy == 'mean' else df.median()
+        self.std_ = df.std(ddof=0)
+        mask = self._mask(df)
         df = df.loc[mask, :]
         self.removed_rows_ = np.array(mask[mask == False].index)
         return df
 
-    def transform(self, df):
+    def fit(self, df):
         """
-        find and remove rows/indices that are in the removed_rows_ attribute of the previous fit_transform method
+        compute the statistics of the input dataframe
 
         Parameters
         ----------
         df: pandas dataframe
             input dataframe
 
+        Returns
+        -------
+        self
+        """
+        self._reset()
+        return self.partial_fit(df)
+
+    def partial_fit(self, df):
+        """
+        update the statistics with a chunk of rows, for dataframes that don't fit in the memory.
+        All the chunks must have the same columns.
+
+        Parameters
+        ----------
+        df: pandas dataframe
+            a chunk of the input dataframe
+
+        Returns
+        -------
+        self
+        """
+        self._check_strategy()
+        # the removed rows of a previous fit_transform don't belong to the new statistics
+        if hasattr(self, 'removed_rows_'):
+            del self.removed_rows_
+        if not hasattr(self, '_count'):
+            self.columns_ = df.columns
+            self._count = np.zeros(len(df.columns))
+            self._mean = np.zeros(len(df.columns))
+            self._m2 = np.zeros(len(df.columns))
+            self._sample = np.empty((0, len(df.columns)))
+            self._keys = np.empty(0)
+            self._rng = np.random.RandomState(self.random_state)
+        elif not df.columns.equals(self.columns_):
+            msg = "All the chunks of the dataframe must have the same columns."
+            raise ValueError(msg)
+        values = df.to_numpy(dtype=float)
+
+        # Welford's algorithm, merged chunk by chunk
+        count = np.sum(~np.isnan(values), axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, np.nansum(values, axis=0) / count, 0.0)
+            m2 = np.nansum((values - mean) ** 2, axis=0)
+            total = self._count + count
+            delta = mean - self._mean
+            ratio = np.where(total > 0, count / total, 0.0)
+            self._mean = self._mean + delta * ratio
+            self._m2 = self._m2 + m2 + delta ** 2 * self._count * ratio
+        self._count = total
+        self.std_ = pd.Series(np.sqrt(np.where(total > 0, self._m2 / np.maximum(total, 1), np.nan)),
+                              index=self.columns_)
+
+        if self.strategy == 'mean':
+            self.center_ = pd.Series(np.where(total > 0, self._mean, np.nan), index=self.columns_)
+        else:
+            # keep the rows with the smallest random keys: a uniform sample of all the rows
+            self._sample = np.concatenate([self._sample, values])
+            self._keys = np.concatenate([self._keys, self._rng.random_sample(len(values))])
+            if len(self._keys) > self.sketch_size:
+                keep = np.argpartition(self._keys, self.sketch_size - 1)[:self.sketch_size]
+                self._sample = self._sample[keep]
+                self._keys = self._keys[keep]
+            with np.errstate(invalid='ignore'):
+                self.center_ = pd.Series(np.nanmedian(self._sample, axis=0), index=self.columns_)
+        return self
+
+    def transform(self, df):
+        """
+        remove the outliers of the input dataframe (or a chunk of it) with the fitted statistics.
+        If the input isn't a dataframe with the fitted columns (e.g., the target), the rows/indices that are in the
+        removed_rows_ attribute of the previous fit_transform method are removed instead.
+
+        Parameters
+        ----------
+        df: pandas dataframe or pandas series
+            input dataframe
+
         Returns
         -------
         transformed dataframe
         """
-        df = df.drop(self.removed_rows_, 0)
+        if isinstance(df, pd.DataFrame) and hasattr(self, 'columns_') and self.columns_.isin(df.columns).all():
+            return df.loc[self._mask(df[self.columns_]), :]
+        if not hasattr(self, 'removed_rows_'):
+            msg = "The removed rows are only available after the fit_transform method. The input must have the " \
+                  "fitted columns to be transformed with the statistics of the fit/partial_fit methods."
+            raise ValueError(msg)
+        df = df.drop(index=self.removed_rows_)
         return df
+
+    def _reset(self):
+        """
+        The internal function to discard the statistics of the previous chunks, so the next partial_fit starts over.
+        """
+        for attr in ('_count', '_mean', '_m2', '_sample', '_keys', '_rng'):
+            if hasattr(self, attr):
+                delattr(self, attr)
+
+    def _check_strategy(self):
+        """
+        The internal function to check the strategy parameter.
+        """
+        if self.strategy not in ('mean', 'median'):
+            msg = "The strategy must be either 'mean' or 'median'."
+            raise ValueError(msg)
+
+    def _mask(self, df):
+        """
+        The internal function to find the rows within m standard deviations from the fitted center.
+        """
+        return ((df - self.center_).abs() <= self.m * self.std_).T.all()
@@ -23,8 +23,12 @@ from .validation import value
 from .validation import check_object_col
 from .validation import update_default_kwargs
 
+from .cache import FeatureCache
+from .cache import params_hash
+
 __all__ = [
     'list_del_indices',
     'std_datetime_str',
     'isfloat',
+    'FeatureCache',
 ]
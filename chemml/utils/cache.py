@@ -0,0 +1,214 @@
+"""
+A persistent cache of molecular features, to avoid recomputing the features of the same molecules across runs.
+"""
+
+from __future__ import print_function
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+import numpy as np
+
+
+class FeatureCache(object):
+    """
+    A two-tier cache of feature vectors: an in-memory LRU tier in front of an optional on-disk SQLite tier.
+    The feature vectors are stored as raw bytes, keyed by a molecule key (e.g., canonical SMILES) and the hash of
+    the featurizer parameters, so that the same cache file can be shared by several featurizers.
+
+    Parameters
+    ----------
+    path: str, optional (default = None)
+        The path to the SQLite file of the on-disk tier. If None, only the in-memory tier is used.
+
+    max_items: int, optional (default = 100000)
+        The maximum number of feature vectors that are kept in the memory. The least recently used vectors are
+        evicted first (they remain available in the on-disk tier).
+
+    Attributes
+    ----------
+    hits: int
+        The number of feature vectors that are found in the cache.
+
+    misses: int
+        The number of feature vectors that are not found in the cache.
+
+    memory_hits: int
+        The number of hits from the in-memory tier.
+
+    disk_hits: int
+        The number of hits from the on-disk tier.
+
+    Examples
+    --------
+    >>> from chemml.utils import FeatureCache
+    >>> from chemml.chem import Molecule, RDKitFingerprint
+    >>> cache = FeatureCache('features.sqlite')
+    >>> rdfp = RDKitFingerprint(fingerprint_type='morgan', vector='bit', cache=cache)
+    >>> X = rdfp.represent([Molecule('CCO', 'smiles'), Molecule('CCN', 'smiles')])
+    >>> X = rdfp.represent([Molecule('CCO', 'smiles')])    # read from the cache
+    >>> cache.hits, cache.misses
+    (1, 2)
+    """
+
+    def __init__(self, path=None, max_items=100000):
+        if path is not None and not isinstance(path, str):
+            msg = "The parameter 'path' must be a path to a SQLite file or None."
+            raise ValueError(msg)
+        if not isinstance(max_items, int) or max_items < 0:
+            msg = "The parameter 'max_items' must be a non-negative integer."
+            raise ValueError(msg)
+        self.path = path
+        self.max_items = max_items
+        self._memory = OrderedDict()
+        self._connection = None
+        if path is not None:
+            self._connection = sqlite3.connect(path)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS features (key TEXT PRIMARY KEY, value BLOB)")
+            self._connection.commit()
+        self.reset_stats()
+
+    def __repr__(self):
+        return '<FeatureCache(path: {self.path!r}, hits: {self.hits!r}, misses: {self.misses!r})>'.format(self=self)
+
+    def reset_stats(self):
+        """
+        sets all the hit/miss counters to zero.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+    def get(self, namespace, keys, dtype, n_features):
+        """
+        looks up the feature vectors of a list of molecule keys.
+
+        Parameters
+        ----------
+        namespace: str
+            The hash of the featurizer parameters, e.g., from the `params_hash` function.
+
+        keys: list
+            The list of molecule keys (str).
+
+        dtype: numpy dtype
+            The data type of the stored feature vectors.
+
+        n_features: int
+            The length of the stored feature vectors.
+
+        Returns
+        -------
+        ndarray
+            The array of shape (len(keys), n_features). The rows of missing keys are zero.
+
+        ndarray
+            The boolean mask of keys that are found in the cache.
+
+        """
+        rows = np.zeros((len(keys), n_features), dtype=dtype)
+        found = np.zeros(len(keys), dtype=bool)
+        full_keys = [namespace + ':' + key for key in keys]
+
+        on_disk = {}
+        for i, key in enumerate(full_keys):
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                rows[i] = np.frombuffer(self._memory[key], dtype=dtype)
+                found[i] = True
+                self.memory_hits += 1
+            elif self._connection is not None:
+                on_disk.setdefault(key, []).append(i)
+
+        if on_disk:
+            disk_keys = list(on_disk)
+            # SQLite limits the number of variables per statement
+            for start in range(0, len(disk_keys), 500):
+                batch = disk_keys[start:start + 500]
+                query = "SELECT key, value FROM features WHERE key IN (%s)" % ','.join('?' * len(batch))
+                for key, value in self._connection.execute(query, batch):
+                    for i in on_disk[key]:
+                        rows[i] = np.frombuffer(value, dtype=dtype)
+                        found[i] = True
+                        self.disk_hits += 1
+                    self._remember(key, bytes(value))
+
+        self.hits += int(found.sum())
+        self.misses += int((~found).sum())
+        return rows, found
+
+    def put(self, namespace, keys, rows):
+        """
+        stores the feature vectors of a list of molecule keys in both tiers of the cache.
+
+        Parameters
+        ----------
+        namespace: str
+            The hash of the featurizer parameters, e.g., from the `params_hash` function.
+
+        keys: list
+            The list of molecule keys (str).
+
+        rows: ndarray
+            The 2D array of feature vectors with the same number of rows as the number of keys.
+
+        """
+        rows = np.ascontiguousarray(rows)
+        items = [(namespace + ':' + key, rows[i].tobytes()) for i, key in enumerate(keys)]
+        for key, value in items:
+            self._remember(key, value)
+        if self._connection is not None:
+            self._connection.executemany("INSERT OR REPLACE INTO features (key, value) VALUES (?, ?)",
+                                         [(key, sqlite3.Binary(value)) for key, value in items])
+            self._connection.commit()
+
+    def _remember(self, key, value):
+        """
+        The internal function to add a feature vector to the in-memory LRU tier.
+        """
+        if self.max_items == 0:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """
+        removes all the feature vectors from both tiers of the cache.
+        """
+        self._memory.clear()
+        if self._connection is not None:
+            self._connection.execute("DELETE FROM features")
+            self._connection.commit()
+
+    def close(self):
+        """
+        closes the connection to the SQLite file.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def params_hash(name, params):
+    """
+    computes a short hash of the name and parameters of a featurizer, to be used as the namespace of a FeatureCache.
+
+    Parameters
+    ----------
+    name: str
+        The name of the featurizer.
+
+    params: dict
+        The parameters that change the feature values. The values must have a stable `repr`.
+
+    Returns
+    -------
+    str
+        The hexadecimal hash.
+
+    """
+    text = repr((name, sorted(params.items(), key=lambda item: item[0])))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
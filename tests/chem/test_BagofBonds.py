@@ -19,6 +19,16 @@ def mols():
     m._xyz = xyz
     return m
 
+@pytest.fixture()
+def ohhc(mols):
+    # Oxygen, Hydrogen, Hydrogen, Carbon
+    num = np.array([8, 1, 1, 6]).reshape((4, 1))
+    sym = np.array(['O', 'H', 'H', 'C']).reshape((4, 1))
+    c = np.append(mols.xyz.geometry, [[0.0, 0.0, 0.0]], axis=0)
+    m = Molecule('O', 'smiles')
+    m._xyz = XYZ(c, num, sym)
+    return m
+
 def test_h2o(mols):
     bob = BagofBonds(const=1.0)
     h2o = bob.represent(mols)
@@ -31,3 +41,60 @@ def test_h2o(mols):
 
 
 
+
+def test_represent_iter(mols):
+    bob = BagofBonds(const=1.0)
+    full = bob.represent([mols] * 5)
+    chunks = list(bob.represent_iter([mols] * 5, chunk_size=2))
+    assert [c.shape[0] for c in chunks] == [2, 2, 1]
+    assert np.allclose(np.concatenate([c.values for c in chunks]), full.values)
+
+def test_represent_to(mols, tmpdir):
+    bob = BagofBonds(const=1.0)
+    full = bob.represent([mols] * 5)
+    path = str(tmpdir.join('bob.npy'))
+    bob.represent_to(path, [mols] * 5, chunk_size=2)
+    assert np.allclose(np.load(path, mmap_mode='r'), full.values)
+
+def test_represent_fitted(mols, ohhc, tmpdir):
+    bob = BagofBonds(const=1.0)
+    bob.fit(mols)
+    header = list(bob.header_)
+    # OHHC: the unseen carbon bags don't change the fitted layout
+    expected = bob.transform([ohhc] * 3)
+    path = str(tmpdir.join('bob.npy'))
+    bob.represent_to(path, [ohhc] * 3, chunk_size=2)
+    assert bob.header_ == header
+    assert np.allclose(np.load(path), expected.values)
+    chunks = list(bob.represent_iter([ohhc] * 3, chunk_size=2))
+    assert bob.header_ == header
+    assert np.allclose(np.concatenate([c.values for c in chunks]), expected.values)
+
+def test_fit_transform(mols, ohhc):
+    bob = BagofBonds(const=1.0)
+    bob.fit(mols)
+    assert bob.all_keys_ == {(1.0, 1.0): 3, (8.0, 1.0): 2, (8.0, 8.0): 1}
+    # the bags are found in the order that the atom pairs are visited
+    assert list(bob.all_keys_) == [(8.0, 8.0), (8.0, 1.0), (1.0, 1.0)]
+    # OH: shorter bags are padded with zeros
+    oh = Molecule('O', 'smiles')
+    oh._xyz = XYZ(mols.xyz.geometry[:2], mols.xyz.atomic_numbers[:2], mols.xyz.atomic_symbols[:2])
+    # OHHC: the unseen carbon bags are ignored
+    X = bob.transform([mols, oh, ohhc])
+    assert X.shape == (3, 6)
+    bags = {1.0: [0.5, 0, 0], (8.0, 1.0): [8.3593106, 0], 8.0: [73.51669472]}
+    expected = np.concatenate([bags[k] for k in dict.fromkeys(bob.header_)])
+    assert list(X.values[1]) == pytest.approx(expected)
+    assert X.values[2] == pytest.approx(X.values[0])
+    assert len(bob.header_) == 6
+    # the represent method uses the same layout
+    assert bob.represent(mols).values == pytest.approx(X.values[:1])
+
+def test_transform_exception(mols):
+    bob = BagofBonds()
+    with pytest.raises(ValueError):
+        bob.transform(mols)
+    # molecule without xyz
+    bob.fit(mols)
+    with pytest.raises(ValueError):
+        bob.transform(Molecule('O', 'smiles'))
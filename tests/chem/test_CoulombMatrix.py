@@ -81,3 +81,50 @@ def test_RC(mols):
         0.5, 8.35237809, 73.51669472, 0.66066557, 8.3593106, 0.5, 73.51669472, 8.35237809, 0.5,
         8.3593106, 0.66066557, 0.5, 0.5, 8.3593106, 73.51669472, 0.66066557, 8.35237809, 0.5
     ]])
+
+def test_batch(mols):
+    # a smaller molecule padded to the size of the larger one
+    m2 = Molecule('O', 'smiles')
+    m2._xyz = XYZ(mols.xyz.geometry[:2], mols.xyz.atomic_numbers[:2], mols.xyz.atomic_symbols[:2])
+    for CMtype in ['UM', 'UT', 'E', 'SC']:
+        cm = CoulombMatrix(CMtype)
+        batch = cm.represent([mols, m2, mols])
+        single = CoulombMatrix(CMtype, max_n_atoms=3).represent(m2)
+        assert batch.shape[0] == 3
+        assert np.allclose(batch.values[0], batch.values[2])
+        assert np.allclose(batch.values[1], single.values[0])
+
+def test_max_n_atoms_exception(mols):
+    cm = CoulombMatrix('UM', max_n_atoms=2)
+    with pytest.raises(ValueError):
+        cm.represent(mols)
+
+def test_represent_iter(mols):
+    cm = CoulombMatrix('UT')
+    full = cm.represent([mols] * 5)
+    chunks = list(cm.represent_iter([mols] * 5, chunk_size=2))
+    assert [c.shape[0] for c in chunks] == [2, 2, 1]
+    assert list(chunks[-1].index) == [4]
+    assert np.allclose(np.concatenate([c.values for c in chunks]), full.values)
+    with pytest.raises(ValueError):
+        next(cm.represent_iter(mols, chunk_size=0))
+
+def test_represent_to(mols, tmpdir):
+    cm = CoulombMatrix('SC')
+    full = cm.represent([mols] * 5)
+    path = str(tmpdir.join('cm.npy'))
+    cm.represent_to(path, [mols] * 5, chunk_size=2)
+    assert np.allclose(np.load(path, mmap_mode='r'), full.values)
+    with pytest.raises(ValueError):
+        cm.represent_to(str(tmpdir.join('cm.csv')), mols)
+
+def test_cache(mols):
+    from chemml.utils import FeatureCache
+    cache = FeatureCache()
+    cm = CoulombMatrix('UT', cache=cache)
+    first = cm.represent([mols, mols])
+    assert (cache.hits, cache.misses) == (0, 2)
+    second = cm.represent(mols)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert second.values[0] == pytest.approx(first.values[0])
+    assert second.values[0] == pytest.approx(CoulombMatrix('UT').represent(mols).values[0])
@@ -105,3 +105,140 @@ def test_run(setup_teardown):
         drg = Dragon(version=6, blocks=list(range(1, 30)))
         drg.script_wizard(script='new', output_directory=setup_teardown)
         drg.run()
+
+
+@pytest.fixture()
+def dragon_stub(setup_teardown):
+    # a stand-in for the Dragon shell: writes two descriptors per molecule of the script's molFile(s)
+    import sys
+    import stat
+    path = os.path.join(setup_teardown, 'dragon_stub')
+    with open(path, 'w') as f:
+        f.write('#!%s\n' % sys.executable)
+        f.write('import re, sys\n'
+                'script = open(sys.argv[2]).read()\n'
+                'files = re.findall(r\'<molFile value="([^"]*)"\', script)\n'
+                'out = re.findall(r\'<SaveFilePath value="([^"]*)"\', script)[0]\n'
+                'names = []\n'
+                'for fn in files:\n'
+                '    if fn.endswith(".smi") and len(files) == 1:\n'
+                '        names += [l.split()[0] for l in open(fn) if l.strip()]\n'
+                '    else:\n'
+                '        names.append(fn)\n'
+                'with open(out, "w") as f:\n'
+                '    f.write("No.\\tNAME\\tMW\\tnAT\\n")\n'
+                '    for i, name in enumerate(names):\n'
+                '        f.write("%i\\t%s\\t%i\\tna\\n" % (i + 1, name, len(name)))\n')
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def test_run_shards(data_path, setup_teardown, dragon_stub):
+    import pandas as pd
+    smi = os.path.join(data_path, 'smiles.smi')
+    with open(smi) as f:
+        smiles = [line.split()[0] for line in f if line.strip()]
+    output_directory = os.path.join(setup_teardown, 'out', '')
+    drg = Dragon(molFile=smi, executable=dragon_stub)
+    drg.script_wizard(script='new', output_directory=output_directory)
+    drg.run(n_shards=3, n_jobs=2)
+    assert len(drg.shard_results_) == 3
+    df = pd.read_csv(drg.data_path, sep='\t')
+    assert list(df['NAME']) == smiles
+    assert list(df['No.']) == list(range(1, len(smiles) + 1))
+    # a single run gives the same output
+    drg = Dragon(molFile=smi, executable=dragon_stub)
+    drg.script_wizard(script='new', output_directory=output_directory)
+    drg.run()
+    assert pd.read_csv(drg.data_path, sep='\t').equals(df)
+
+
+def test_run_shards_exception(data_path, setup_teardown, dragon_stub):
+    drg = Dragon(molFile=os.path.join(data_path, 'smiles.smi'), executable=dragon_stub, SaveType='block')
+    drg.script_wizard(script='new', output_directory=os.path.join(setup_teardown, ''))
+    with pytest.raises(ValueError):
+        drg.run(n_shards=2)
+    with pytest.raises(ValueError):
+        drg.run(n_shards=0)
+    drg = Dragon(molFile=os.path.join(data_path, 'smiles.smi'), executable=os.path.join(setup_teardown, 'none'))
+    drg.script_wizard(script='new', output_directory=os.path.join(setup_teardown, ''))
+    with pytest.raises(ImportError):
+        drg.run(n_shards=2, n_jobs=2)
+
+
+def test_load(setup_teardown):
+    import numpy as np
+    path = os.path.join(setup_teardown, 'Dragon_descriptors.txt')
+    with open(path, 'w') as f:
+        f.write('No.\tNAME\tMW\tnAT\tX0\n1\tCCO\t46.07\tna\t1\n2\tCC\t30.07\t8\tNaN\n3\tC\t16.04\t5\t-2.5\n')
+    drg = Dragon()
+    df = drg.load(path, chunk_size=2)
+    assert list(df.columns) == ['MW', 'nAT', 'X0']
+    assert (df.dtypes == np.float32).all()
+    assert np.isnan(df.loc[0, 'nAT']) and np.isnan(df.loc[1, 'X0'])
+    assert df['MW'].tolist() == pytest.approx([46.07, 30.07, 16.04])
+    df = drg.load(path, drop=('No.',), dtype=np.float64)
+    assert list(df['NAME']) == ['CCO', 'CC', 'C']
+    with pytest.raises(ValueError):
+        drg.load(path, store=os.path.join(setup_teardown, 'store.csv'))
+
+
+def test_load_store(setup_teardown):
+    pytest.importorskip('pyarrow')
+    path = os.path.join(setup_teardown, 'Dragon_descriptors.txt')
+    with open(path, 'w') as f:
+        f.write('No.\tNAME\tMW\n1\tCCO\t46.07\n')
+    store = os.path.join(setup_teardown, 'Dragon_descriptors.feather')
+    drg = Dragon()
+    df = drg.load(path, store=store)
+    assert os.path.exists(store)
+    assert drg.load(path, store=store).equals(df)
+    assert list(df.columns) == ['MW']
+    parquet = os.path.join(setup_teardown, 'Dragon_descriptors.parquet')
+    assert drg.load(path, chunk_size=1, store=parquet).equals(df)
+
+
+def test_load_store_cached(setup_teardown, monkeypatch):
+    pa = pytest.importorskip('pyarrow')
+    import numpy as np
+    path = os.path.join(setup_teardown, 'Dragon_descriptors.txt')
+    with open(path, 'w') as f:
+        f.write('No.\tNAME\tMW\n1\tCCO\t46.07\n')
+    store = os.path.join(setup_teardown, 'Dragon_descriptors.feather')
+    df = Dragon().load(path, store=store)
+    mapped = []
+    memory_map = pa.memory_map
+
+    def recorder(*args, **kwargs):
+        mapped.append(args[0])
+        return memory_map(*args, **kwargs)
+
+    def parser(*args, **kwargs):
+        raise AssertionError("The store must be reused.")
+
+    # the store is memory-mapped and reused without parsing the Dragon output
+    monkeypatch.setattr(pa, 'memory_map', recorder)
+    monkeypatch.setattr(Dragon, '_read_chunks', parser)
+    assert Dragon().load(path, store=store).equals(df)
+    assert store in mapped
+    monkeypatch.undo()
+
+    # a store of other loading parameters is rewritten
+    df = Dragon().load(path, dtype=np.float64, store=store)
+    assert df['MW'].dtype == np.float64
+    df = Dragon().load(path, drop=('No.',), store=store)
+    assert list(df.columns) == ['NAME', 'MW']
+
+
+def test_load_store_error(setup_teardown):
+    pytest.importorskip('pyarrow')
+    path = os.path.join(setup_teardown, 'Dragon_descriptors.txt')
+    with open(path, 'w') as f:
+        f.write('No.\tNAME\tMW\n1\tCCO\t46.07\n2\tCC\tbad\n')
+    for store in ('Dragon_descriptors.feather', 'Dragon_descriptors.parquet'):
+        store = os.path.join(setup_teardown, store)
+        with pytest.raises(ValueError):
+            Dragon().load(path, chunk_size=1, store=store)
+        # no partial store is left behind
+        assert not os.path.exists(store)
+        assert not any(name.endswith('.tmp') for name in os.listdir(setup_teardown))
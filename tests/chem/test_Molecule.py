@@ -4,6 +4,7 @@ from rdkit import Chem
 import pybel
 import warnings
 import pkg_resources
+import numpy as np
 
 from chemml.chem import Molecule
 
@@ -216,4 +217,147 @@ def test_mol2xyz_UFF(caffeine_smiles):
     assert m.xyz.atomic_symbols.shape[0] == m.rdkit_molecule.GetNumAtoms()
     assert m.UFF_args['maxIters'] == 110
     # check default args
-    m.to_xyz('UFF', **m._default_UFF_args)
\ No newline at end of file
+    m.to_xyz('UFF', **m._default_UFF_args)
+
+def test_from_smiles_file(tmpdir, caffeine_smiles, caffeine_canonical):
+    from chemml.chem import MoleculeBatch
+    smi = tmpdir.join('molecules.smi')
+    smi.write('%s caffeine\nNotSMILES\n\nCCO ethanol\n   \nC methane\n' % caffeine_smiles)
+    for n_jobs in [1, 2]:
+        batch = Molecule.from_smiles_file(str(smi), n_jobs=n_jobs, chunk_size=2)
+        assert isinstance(batch, MoleculeBatch)
+        assert len(batch) == 3
+        # the indices are line numbers, the blank lines are failures
+        assert list(batch.indices) == [0, 3, 5]
+        assert list(batch.failures) == [1, 2, 4]
+        assert batch[2].creator == ('SMILES', 'C')
+        assert batch[0].creator == ('SMILES', caffeine_smiles)
+        assert batch[0].smiles is None
+        batch[0].to_smiles()
+        assert batch[0].smiles == caffeine_canonical
+    csv = tmpdir.join('molecules.csv')
+    csv.write('name,smiles\ncaffeine,%s\nempty,\nethanol,CCO\n' % caffeine_smiles)
+    batch = MoleculeBatch.from_smiles_file(str(csv), canonical=True)
+    assert [m.smiles for m in batch] == [caffeine_canonical, 'CCO']
+    assert list(batch.failures) == [1]
+
+
+def test_from_smiles_file_exception(tmpdir):
+    from chemml.chem import MoleculeBatch
+    csv = tmpdir.join('molecules.csv')
+    csv.write('name,SMILES\nethanol,CCO\n')
+    with pytest.raises(ValueError):
+        MoleculeBatch.from_smiles_file(str(csv))
+    with pytest.raises(ValueError):
+        MoleculeBatch.from_smiles_file(str(csv), smiles_column='SMILES', n_jobs=0)
+    with pytest.raises(ValueError):
+        MoleculeBatch.from_smiles_file('not_a_file.smi')
+    with pytest.raises(ValueError):
+        MoleculeBatch.from_smiles('CCO')
+
+
+def test_batch_to_xyz():
+    from chemml.chem import MoleculeBatch
+    batch = MoleculeBatch.from_smiles(['CCCCO', '[Fe]', 'c1ccccc1'])
+    for mol in batch:
+        mol.hydrogens('add')
+    report = batch.to_xyz('MMFF', n_conformers=5, random_seed=7)
+    assert list(report['success']) == [True, False, True]
+    assert 'MMFF' in report.loc[1, 'message']
+    assert batch[0].xyz.geometry.shape == (15, 3)
+    assert batch[0].rdkit_molecule.GetNumConformers() == 1
+    assert batch[1].xyz is None
+    # the lowest energy conformer is kept
+    from rdkit.Chem import AllChem
+    mol = Chem.Mol(batch[0].rdkit_molecule)
+    AllChem.EmbedMultipleConfs(mol, numConfs=5, randomSeed=7)
+    energies = [e for _, e in AllChem.MMFFOptimizeMoleculeConfs(mol)]
+    assert report.loc[0, 'energy'] == pytest.approx(min(energies))
+    # worker processes and timeouts
+    report = batch.to_xyz('UFF', n_jobs=2, timeout=60)
+    assert report['success'].all()
+    assert batch[1].UFF_args['maxIters'] == 200
+
+
+def test_batch_to_xyz_exception():
+    from chemml.chem import MoleculeBatch
+    batch = MoleculeBatch.from_smiles(['CCO'])
+    with pytest.raises(ValueError):
+        batch.to_xyz(None)
+    with pytest.raises(ValueError):
+        batch.to_xyz('MMFF', confId=1)
+    with pytest.raises(ValueError):
+        batch.to_xyz('MMFF', timeout=0)
+    with pytest.raises(ValueError):
+        batch.to_xyz('MMFF', n_conformers=0)
+
+
+def test_compact():
+    from chemml.chem import MoleculeBatch
+    batch = MoleculeBatch.from_smiles(['CCO', 'c1ccccc1', 'CC'])
+    for mol in batch[:2]:
+        mol.hydrogens('add')
+    batch.to_xyz('MMFF', random_seed=1)
+    batch[2]._xyz = None
+    geometry = batch[0].xyz.geometry.copy()
+    batch.compact()
+    assert not hasattr(batch[0], '__dict__')
+    assert batch.geometry.dtype == np.float32 and batch.atomic_numbers.dtype == np.uint8
+    assert list(batch.atom_offsets) == [0, 9, 21, 21]
+    assert np.shares_memory(batch[1].xyz.geometry, batch.geometry)
+    assert batch[0].xyz.geometry == pytest.approx(geometry, abs=1e-5)
+    assert batch[1].xyz.atomic_symbols.ravel().tolist() == ['C'] * 6 + ['H'] * 6
+    assert batch[2].xyz is None
+    # the toolkit objects are rebuilt on demand
+    assert batch[0]._rdkit_molecule is None
+    assert batch[0].rdkit_molecule.GetNumAtoms() == 9
+    assert batch[0].rdkit_molecule.GetConformer().GetPositions() == pytest.approx(geometry, abs=1e-3)
+    assert Chem.MolToSmiles(batch[2].rdkit_molecule) == 'CC'
+
+
+def test_pickle(caffeine_smiles, caffeine_canonical):
+    import pickle
+    m = Molecule(caffeine_smiles, 'smiles')
+    m.hydrogens('add')
+    m.to_xyz('MMFF', maxIters=50)
+    m.to_inchi()
+    m2 = pickle.loads(pickle.dumps(m))
+    assert m2._rdkit_molecule is None
+    assert m2.creator == m.creator and m2.inchi == m.inchi and m2.smiles == caffeine_canonical
+    assert m2.MMFF_args == m.MMFF_args
+    assert (m2.xyz.geometry == m.xyz.geometry).all()
+    # the atom order and the conformation are restored
+    rdkit_mol = m2.rdkit_molecule
+    assert [a.GetSymbol() for a in rdkit_mol.GetAtoms()] == [a.GetSymbol() for a in m.rdkit_molecule.GetAtoms()]
+    assert rdkit_mol.GetConformer().GetPositions() == pytest.approx(m.xyz.geometry)
+    assert Chem.MolToInchi(rdkit_mol) == Chem.MolToInchi(m.rdkit_molecule)
+    # query molecules
+    m = Molecule('[#6]-[#8]', 'smarts')
+    m2 = pickle.loads(pickle.dumps(m))
+    assert Chem.MolToSmarts(m2.rdkit_molecule) == m.smarts
+
+
+def test_shared_memory():
+    import pickle
+    from chemml.chem import MoleculeBatch
+    batch = MoleculeBatch.from_smiles(['CCO', 'c1ccccc1'])
+    for mol in batch:
+        mol.hydrogens('add')
+    batch.to_xyz('UFF', random_seed=1)
+    spec = batch.to_shared_memory()
+    try:
+        shm, geometry, atomic_numbers, atom_offsets = MoleculeBatch.attach_shared_memory(spec)
+        assert list(atom_offsets) == [0, 9, 21]
+        assert (geometry[9:21] == batch[1].xyz.geometry).all()
+        assert atomic_numbers[9:21].ravel().tolist() == [6] * 6 + [1] * 6
+        # changes are visible to the batch
+        geometry[0, 0] = 100.0
+        assert batch[0].xyz.geometry[0, 0] == 100.0
+        shm.close()
+        copy = pickle.loads(pickle.dumps(batch))
+        assert copy._shared_memory is None
+        assert copy[0].xyz.geometry[0, 0] == 100.0
+    finally:
+        batch.close_shared_memory()
+    assert batch[0].xyz.geometry[0, 0] == 100.0
+    assert batch._shared_memory is None
@@ -2,9 +2,11 @@ import pytest
 import os
 import shutil
 import tempfile
+import numpy as np
 
 
 from chemml.chem import RDKitFingerprint
+from chemml.chem import FingerprintIndex
 from chemml.chem import Molecule
 
 
@@ -159,3 +161,124 @@ def test_store_sparse(mol_list, setup_teardown):
     temp_file = os.path.join(setup_teardown, 'temp.nzp')
     rdfp.store_sparse(temp_file, df)
 
+
+
+def test_n_jobs(mol_list):
+    for fp_type, vector in [('morgan', 'bit'), ('maccs', 'bit'), ('morgan', 'int')]:
+        serial = RDKitFingerprint(fingerprint_type=fp_type, vector=vector).represent(mol_list * 3)
+        rdfp = RDKitFingerprint(fingerprint_type=fp_type, vector=vector, n_jobs=2)
+        parallel = rdfp.represent(mol_list * 3)
+        assert parallel.shape == serial.shape
+        assert (parallel.values == serial.values).all()
+        assert rdfp.fps_ is None
+
+
+def test_n_jobs_exception(mol_list):
+    with pytest.raises(ValueError):
+        rdfp = RDKitFingerprint(n_jobs=0)
+        rdfp.represent(mol_list)
+
+
+def test_packed(mol_list):
+    for fp_type, n_bits in [('morgan', 1024), ('maccs', 167)]:
+        rdfp = RDKitFingerprint(fingerprint_type=fp_type, vector='bit')
+        df = rdfp.represent(mol_list)
+        packed = rdfp.represent(mol_list, output='packed')
+        assert packed.shape == (2, int(np.ceil(n_bits / 8.0)))
+        assert packed.dtype == np.uint8
+        assert (np.unpackbits(packed, axis=1)[:, :n_bits] == df.values).all()
+    serial = RDKitFingerprint(fingerprint_type='morgan', vector='bit').represent(mol_list * 2, output='packed')
+    rdfp = RDKitFingerprint(fingerprint_type='morgan', vector='bit', n_jobs=2)
+    assert (rdfp.represent(mol_list * 2, output='packed') == serial).all()
+
+
+def test_packed_exception(mol_list):
+    with pytest.raises(ValueError):
+        rdfp = RDKitFingerprint(fingerprint_type='morgan', vector='int')
+        rdfp.represent(mol_list, output='packed')
+    with pytest.raises(ValueError):
+        rdfp = RDKitFingerprint(fingerprint_type='morgan', vector='bit')
+        rdfp.represent(mol_list, output='fake')
+
+
+def test_sparse(mol_list, mol_single, setup_teardown):
+    rdfp = RDKitFingerprint(fingerprint_type='Morgan', vector='int')
+    df = rdfp.represent(mol_list)
+    X = rdfp.represent(mol_list, output='sparse')
+    assert X.shape == (2, 84)
+    assert list(rdfp.vocabulary_) == sorted(df.columns)
+    assert (X.toarray() == df[sorted(df.columns)].values).all()
+    # the vocabulary is reused for the next batch
+    X = rdfp.represent(mol_single, output='sparse')
+    assert X.shape == (1, 84)
+    assert X.sum() == df.values[0].sum()
+    # store and load the vocabulary
+    temp_file = os.path.join(setup_teardown, 'vocabulary.npy')
+    rdfp.store_vocabulary(temp_file)
+    rdfp2 = RDKitFingerprint(fingerprint_type='Morgan', vector='int', n_jobs=2)
+    rdfp2.load_vocabulary(temp_file)
+    assert (rdfp2.represent(mol_list, output='sparse') != rdfp.represent(mol_list, output='sparse')).nnz == 0
+
+
+def test_sparse_exception(mol_list, setup_teardown):
+    with pytest.raises(ValueError):
+        rdfp = RDKitFingerprint(fingerprint_type='morgan', vector='bit')
+        rdfp.represent(mol_list, output='sparse')
+    with pytest.raises(ValueError):
+        rdfp = RDKitFingerprint(fingerprint_type='morgan', vector='int')
+        rdfp.store_vocabulary(os.path.join(setup_teardown, 'vocabulary.npy'))
+
+
+def test_fingerprint_index(mol_list, setup_teardown):
+    library = mol_list + [Molecule('CCO', 'smiles'), Molecule('CCN', 'smiles'), Molecule('CCCO', 'smiles')]
+    rdfp = RDKitFingerprint(fingerprint_type='morgan', vector='bit')
+    bits = rdfp.represent(library).values
+    index = FingerprintIndex(rdfp.represent(library, output='packed'), block_size=2)
+    indices, scores = index.search(rdfp.represent(library[2:4], output='packed'), k=3)
+    assert indices.shape == (2, 3)
+    assert list(indices[:, 0]) == [2, 3]
+    assert scores[:, 0] == pytest.approx([1.0, 1.0])
+    # brute force tanimoto
+    common = (bits[2] & bits).sum(1)
+    tanimoto = common / ((bits[2] | bits).sum(1)).astype(float)
+    assert scores[0] == pytest.approx(np.sort(tanimoto)[::-1][:3])
+    # dice and unpacked bits
+    index = FingerprintIndex(rdfp.represent(library), packed=False)
+    indices, scores = index.search(bits[2], k=10, metric='dice', threshold=0.01)
+    assert (indices[0] == -1).sum() == 10 - (common > 0).sum()
+    # memory map
+    path = os.path.join(setup_teardown, 'index')
+    index.save(path)
+    loaded = FingerprintIndex(packed=False)
+    loaded.load(path)
+    assert (loaded.search(bits, k=2)[0] == index.search(bits, k=2)[0]).all()
+
+
+def test_fingerprint_index_exception(mol_list):
+    index = FingerprintIndex()
+    with pytest.raises(ValueError):
+        index.search(np.zeros((1, 128), dtype=np.uint8))
+    index = FingerprintIndex(np.zeros((2, 128), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        index.search(np.zeros((1, 64), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        index.search(np.zeros((1, 128), dtype=np.uint8), metric='fake')
+    with pytest.raises(ValueError):
+        FingerprintIndex('fake')
+
+
+def test_cache(mol_list):
+    from chemml.utils import FeatureCache
+    cache = FeatureCache()
+    rdfp = RDKitFingerprint(fingerprint_type='morgan', vector='bit', cache=cache)
+    df = rdfp.represent(mol_list)
+    assert (cache.hits, cache.misses) == (0, 2)
+    df2 = rdfp.represent(mol_list[::-1] + [Molecule('CCO', 'smiles')])
+    assert (cache.hits, cache.misses) == (2, 3)
+    assert (df2.values[:2] == df.values[::-1]).all()
+    assert (df2.values[2] == RDKitFingerprint(fingerprint_type='morgan').represent(Molecule('CCO', 'smiles')).values).all()
+    packed = rdfp.represent(mol_list, output='packed')
+    assert (np.unpackbits(packed, axis=1) == df.values).all()
+    # different parameters
+    RDKitFingerprint(fingerprint_type='morgan', vector='bit', n_bits=512, cache=cache).represent(mol_list)
+    assert cache.misses == 5
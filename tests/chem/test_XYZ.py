@@ -17,6 +17,7 @@ def test_instantiate():
     n = np.array([[6], [1], [8]])
     s = np.array([['C'], ['H'], ['O']])
     m = XYZ(g, n, s)
+    assert m.atomic_symbols.tolist() == s.tolist()
 
 def test_exception():
     g = np.array([[ 3.09002369e+00,  1.41663512e+00, -6.09700287e-02],
@@ -44,3 +45,16 @@ def test_exception():
     n = np.array([[6], [1]])
     with pytest.raises(ValueError):
         m = XYZ(g, n, s)
+    # atomic numbers out of range
+    for n in (np.array([[6], [-1], [8]]), np.array([[6], [1], [300]])):
+        with pytest.raises(ValueError):
+            m = XYZ(g, n, s)
+    # atomic symbols don't match
+    with pytest.raises(ValueError):
+        m = XYZ(g, np.array([[6], [1], [8]]), np.array([['C'], ['O'], ['H']]))
+
+def test_atomic_symbols():
+    g = np.zeros((3, 3))
+    m = XYZ(g, np.array([[6], [1], [8]]))
+    assert m.atomic_numbers.dtype == np.uint8
+    assert m.atomic_symbols.tolist() == [['C'], ['H'], ['O']]
@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.fixture(scope='session')
+def cache_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp('chemml_cache')
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(cache_dir, monkeypatch):
+    # the cached datasets of the tests are not written to the home directory
+    monkeypatch.setenv('CHEMML_CACHE_DIR', str(cache_dir))
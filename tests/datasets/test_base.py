@@ -36,3 +36,65 @@ def test_load_comp_energy():
 def test_load_crystal_structures():
     entries = load_crystal_structures()
     assert len(entries) == 18
+
+
+def test_cache(tmp_path, monkeypatch):
+    import os
+    from chemml.datasets import clear_cache
+    from chemml.datasets.base import _cached, _cache_dir
+    monkeypatch.setenv('CHEMML_CACHE_DIR', str(tmp_path))
+    smi, homo = load_cep_homo()
+    assert os.path.exists(os.path.join(_cache_dir(), 'cep_homo.pkl'))
+    smi2, homo2 = load_cep_homo()
+    assert smi.equals(smi2) and homo.equals(homo2)
+
+    # invalidated by the content of the source files
+    source = tmp_path / 'source.txt'
+    source.write_text('1')
+    calls = []
+    def load():
+        calls.append(1)
+        return source.read_text()
+    assert _cached('test', [str(source)], load) == '1'
+    assert _cached('test', [str(source)], load) == '1'
+    assert len(calls) == 1
+    mtime = os.stat(str(source)).st_mtime_ns
+    source.write_text('2')
+    os.utime(str(source), ns=(mtime + 10**9, mtime + 10**9))
+    assert _cached('test', [str(source)], load) == '2'
+    assert len(calls) == 2
+
+    # the files are only hashed if their sizes or modification times change
+    from chemml.datasets import base
+    hashes = []
+    files_hash = base._files_hash
+    monkeypatch.setattr(base, '_files_hash', lambda paths: hashes.append(1) or files_hash(paths))
+    assert _cached('test', [str(source)], load) == '2'
+    assert len(hashes) == 0
+    os.utime(str(source), ns=(mtime + 2 * 10**9, mtime + 2 * 10**9))
+    assert _cached('test', [str(source)], load) == '2'
+    assert _cached('test', [str(source)], load) == '2'
+    assert len(hashes) == 1
+    assert len(calls) == 2
+
+    # all the files that are parsed by the loader are the sources of the cache
+    sources = []
+    monkeypatch.setattr(base, '_cached', lambda name, paths, loader: sources.extend(paths))
+    load_crystal_structures()
+    assert any(path.endswith('CovalentRadius.table') for path in sources)
+
+    clear_cache()
+    assert not os.path.exists(_cache_dir())
+
+    # the caches of other versions are removed with the first cache of the current version
+    stale = tmp_path / 'datasets' / 'v1_0.0.1'
+    stale.mkdir(parents=True)
+    (tmp_path / 'datasets' / 'other').mkdir()
+    assert _cached('test', [str(source)], load) == '2'
+    assert not stale.exists()
+    assert (tmp_path / 'datasets' / 'other').exists()
+    assert len(calls) == 3
+
+    monkeypatch.setenv('CHEMML_CACHE_DIR', '')
+    assert _cached('test', [str(source)], load) == '2'
+    assert len(calls) == 4
@@ -14,6 +14,39 @@ class TestConvertFile(unittest.TestCase):
         # self.assertEqual(len(s) , 2)
         # self.assertEqual(s[1]['file'][-3:], 'cml')
 
+    def test_rdkit_engine(self):
+        import os
+        import shutil
+        import tempfile
+        import pkg_resources
+        path = pkg_resources.resource_filename('chemml', os.path.join('datasets', 'data', 'organic_xyz'))
+        tmp = tempfile.mkdtemp()
+        try:
+            for name in ['1_opt.xyz', '2_opt.xyz']:
+                shutil.copy(os.path.join(path, name), tmp)
+            with open(os.path.join(tmp, '3_opt.xyz'), 'w') as f:
+                f.write('not an xyz file')
+            files = {i + 1: {'file': os.path.join(tmp, '%i_opt.xyz' % (i + 1))} for i in range(3)}
+            # next to the inputs, with worker processes
+            model = ConvertFile(files, 'xyz', 'sdf', engine='rdkit', n_jobs=2)
+            s = model.convert()
+            self.assertEqual(sorted(s), [1, 2])
+            self.assertTrue(os.path.isfile(os.path.join(tmp, '1_opt.sdf')))
+            self.assertEqual(list(model.report_['success']), [True, True, False])
+            self.assertTrue(model.report_.loc[3, 'message'] != '')
+            # a single multi-molecule file
+            output = os.path.join(tmp, 'all.sdf')
+            s = ConvertFile(files, 'xyz', 'sdf', engine='rdkit', output=output).convert()
+            self.assertEqual(s[2]['file'], output)
+            with open(output) as f:
+                self.assertEqual(f.read().count('$$$$'), 2)
+            with self.assertRaises(ValueError):
+                ConvertFile(files, 'xyz', 'cml', engine='rdkit', output=output).convert()
+            with self.assertRaises(ValueError):
+                ConvertFile(files, 'xyz', 'sdf', engine='babel').convert()
+        finally:
+            shutil.rmtree(tmp)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -43,3 +43,97 @@ def test_notxyz_exception(data_path):
     with pytest.raises(ValueError):
         reader = XYZreader('[2-3].opt')
         reader.read()
+
+
+def test_fast(data_path):
+    manual = XYZreader(path_pattern=['[2-3]_opt.xyz', '[1-2][1-2]_opt.xyz'], path_root=data_path,
+                       reader='manual', skip_lines=[2, 0]).read()
+    reader = XYZreader(path_pattern=['[2-3]_opt.xyz', '[1-2][1-2]_opt.xyz'], path_root=data_path,
+                       reader='fast', n_threads=4)
+    molecules = reader.read()
+    assert len(molecules) == 6
+    for i in molecules:
+        assert molecules[i]['file'] == manual[i]['file']
+        assert (molecules[i]['mol'] == manual[i]['mol']).all()
+
+
+def test_read_batch(data_path, tmpdir):
+    reader = XYZreader(path_pattern='[2-3]_opt.xyz', path_root=data_path, n_threads=2)
+    batch = reader.read_batch()
+    manual = XYZreader(path_pattern='[2-3]_opt.xyz', path_root=data_path, reader='manual').read()
+    assert len(batch) == 2
+    assert reader.files_ == [manual[1]['file'], manual[2]['file']]
+    assert batch.atom_offsets[-1] == batch.geometry.shape[0] == len(manual[1]['mol']) + len(manual[2]['mol'])
+    assert batch[0].xyz.geometry == pytest.approx(manual[1]['mol'][:, 1:], abs=1e-5)
+    assert (batch[1].xyz.atomic_numbers.ravel() == manual[2]['mol'][:, 0]).all()
+    assert batch[1].creator == ('XYZ', manual[2]['file'])
+    # multi-frame files
+    trajectory = tmpdir.join('trajectory.xyz')
+    trajectory.write('2\nframe 1\nH 0.0 0.0 0.0\nH 0.0 0.0 0.74\n'
+                     '3\nframe 2\n8 0.0 0.0 0.0 -0.8\nH 0.96 0.0 0.0 0.4\nH -0.24 0.93 0.0 0.4\n')
+    batch = XYZreader(path_pattern='trajectory.xyz', path_root=str(tmpdir)).read_batch()
+    assert len(batch) == 2
+    assert list(batch.indices) == [0, 0]
+    assert list(batch.atom_offsets) == [0, 2, 5]
+    assert batch.atomic_numbers.ravel().tolist() == [1, 1, 8, 1, 1]
+    assert batch[1].xyz.geometry[2].tolist() == pytest.approx([-0.24, 0.93, 0.0])
+
+
+def test_read_batch_threads(data_path, monkeypatch):
+    from chemml.initialization import initialization
+    pools = []
+
+    class RecordingExecutor(initialization.ThreadPoolExecutor):
+        def __init__(self, max_workers=None):
+            pools.append(max_workers)
+            super(RecordingExecutor, self).__init__(max_workers=max_workers)
+
+    monkeypatch.setattr(initialization, 'ThreadPoolExecutor', RecordingExecutor)
+    serial = XYZreader(path_pattern='[1-2][1-2]_opt.xyz', path_root=data_path).read_batch()
+    assert pools == []
+    # the default 'auto' reader doesn't serialize read_batch
+    batch = XYZreader(path_pattern='[1-2][1-2]_opt.xyz', path_root=data_path, n_threads=3).read_batch()
+    assert pools == [3]
+    assert list(batch.atom_offsets) == list(serial.atom_offsets)
+    assert (batch.geometry == serial.geometry).all()
+    assert (batch.atomic_numbers == serial.atomic_numbers).all()
+
+
+def test_fast_exception(tmpdir):
+    bad = tmpdir.join('bad.xyz')
+    bad.write('3\ncomment\nH 0.0 0.0 0.0\n')
+    with pytest.raises(ValueError):
+        XYZreader(path_pattern='bad.xyz', path_root=str(tmpdir)).read_batch()
+    with pytest.raises(ValueError):
+        XYZreader(path_pattern='bad.xyz', path_root=str(tmpdir), reader='other').read()
+    with pytest.raises(ValueError):
+        XYZreader(path_pattern='bad.xyz', path_root=str(tmpdir), n_threads=0).read_batch()
+
+
+def test_scan(tmpdir):
+    from chemml.initialization.initialization import _MANIFESTS
+    for path in ['1.xyz', 'a/2.xyz', 'a/b/12.xyz', 'c/3.xyz', 'c/4.txt']:
+        tmpdir.join(path).write('', ensure=True)
+    root = str(tmpdir)
+    reader = XYZreader(['*/*/*.xyz', '[1-3].xyz', '*/[1-2].xyz'], root, path_only=True)
+    molecules = reader.read()
+    # files are ordered by pattern
+    assert [molecules[i]['file'] for i in sorted(molecules)] == [
+        os.path.join(root, 'a', 'b', '12.xyz'), os.path.join(root, '1.xyz'), os.path.join(root, 'a', '2.xyz')]
+    # a single pass in the top-down walk order
+    assert list(reader.iter_files()) == [
+        os.path.join(root, '1.xyz'), os.path.join(root, 'a', '2.xyz'), os.path.join(root, 'a', 'b', '12.xyz')]
+    # the manifest is reused until a directory changes
+    assert len([key for key in _MANIFESTS if key[0] == root]) == 1
+    tmpdir.join('a/b/11.xyz').write('')
+    assert len(list(reader.iter_files())) == 4
+    assert len(list(XYZreader('*/*/*.xyz', root, cache_manifest=False).iter_files())) == 2
+    # the paths follow the spelling of each path_root
+    files = list(XYZreader('[1-3].xyz', root + os.sep, path_only=True).iter_files())
+    assert files == [os.path.join(root + os.sep, '1.xyz')]
+    with tmpdir.as_cwd():
+        assert list(XYZreader('[1-3].xyz', '.', path_only=True).iter_files()) == [os.path.join('.', '1.xyz')]
+    # the cache is bounded
+    for k in range(40):
+        list(XYZreader('%i.xyz' % k, root).iter_files())
+    assert len(_MANIFESTS) <= 32
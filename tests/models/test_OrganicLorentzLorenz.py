@@ -0,0 +1,41 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from keras.layers import Input, Dense
+from keras.models import Model
+
+from chemml.models.keras.trained import organic_lorentz_lorenz
+from chemml.models.keras.trained.organic_lorentz_lorenz import OrganicLorentzLorenz
+from chemml.utils import FeatureCache
+
+
+@pytest.fixture()
+def olz(tmpdir, monkeypatch):
+    # the scalers of the trained model, with a small keras model of the same inputs and outputs
+    pd.DataFrame({'ss_mean': np.zeros(1024), 'ss_scale': np.ones(1024)}).to_csv(
+        str(tmpdir.join('x_standard_scaler.csv')), index=False)
+    pd.DataFrame({'ss_mean': [1.0, 2.0, 3.0], 'ss_scale': [1.0, 1.0, 1.0]}).to_csv(
+        str(tmpdir.join('y_standard_scaler.csv')), index=False)
+    monkeypatch.setattr(organic_lorentz_lorenz.pkg_resources, 'resource_filename', lambda *args: str(tmpdir))
+    olz = OrganicLorentzLorenz(cache=FeatureCache())
+    inp = Input(shape=(1024,))
+    olz.model = Model(inputs=inp, outputs=[Dense(1)(inp), Dense(1)(inp), Dense(1)(inp)])
+    olz._set_namespace()
+    return olz
+
+
+def test_cache(olz):
+    cache = olz.cache
+    expected = olz.predict('CCO')
+    assert (cache.hits, cache.misses) == (0, 1)
+    descriptor = olz.descriptor
+    olz.predict('CC')
+    # the canonical SMILES of the same molecule is a hit, and the descriptor is updated
+    assert olz.predict('OCC') == pytest.approx(expected)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert (olz.descriptor == descriptor).all()
+    olz.cache = None
+    assert olz.predict('OCC') == pytest.approx(expected)
+    with pytest.raises(ValueError):
+        olz.predict('fake')
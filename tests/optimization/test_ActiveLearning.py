@@ -1,5 +1,6 @@
 import pytest
 import os
+import random
 import warnings
 import pkg_resources
 import pandas as pd
@@ -265,3 +266,225 @@ def test_model_single_input():
     # visualize
     # plots = al.visualize(density)
     # assert len(plots) == 3
+
+
+def model_creator_small():
+    inp = Input(shape=(10,))
+    l1 = Dense(6, name='l1', activation='relu')(inp)
+    l3 = Dense(3, name='l3', activation='relu')(l1)
+    out = Dense(1, name='outp', activation='linear')(l3)
+    model = Model(inputs=inp, outputs=out)
+    model.compile(optimizer=Adam(learning_rate=0.01), loss='mean_squared_error')
+    return model
+
+
+@pytest.fixture()
+def pool():
+    rng = np.random.RandomState(0)
+    U = rng.normal(size=(120, 10))
+    Y = U[:, :1] * 2 + U[:, 1:2]
+    return U, Y
+
+
+@pytest.fixture()
+def deposited(pool):
+    # a factory of initialized active learning objects with the deposited train and test sets
+    U, Y = pool
+
+    def make(U=U, **kwargs):
+        al = ActiveLearning(model_creator=model_creator_small, U=U, target_layer='l3',
+                            train_size=30, test_size=20, batch_size=[2, 1], **kwargs)
+        qtr, qte = al.initialize(random_state=7)
+        al.deposit(qtr, Y[qtr])
+        al.deposit(qte, Y[qte])
+        return al
+
+    return make
+
+
+def test_search_n_jobs(deposited, monkeypatch):
+    import tensorflow as tf
+    from chemml.optimization import active
+    get_context = active.multiprocessing.get_context
+    states = []
+
+    class RecordingContext(object):
+        # records the state that is sent to the workers
+        def __init__(self, method):
+            self.context = get_context(method)
+
+        def Pool(self, processes, initializer, initargs):
+            states.append(initargs[0])
+            return self.context.Pool(processes, initializer=initializer, initargs=initargs)
+
+    monkeypatch.setattr(active.multiprocessing, 'get_context', RecordingContext)
+    results = []
+    for n_jobs in (1, 2):
+        al = deposited()
+        np.random.seed(11)
+        random.seed(11)
+        tf.random.set_seed(5)
+        q = al.search(n_evaluation=2, n_ensemble=2, n_jobs=n_jobs, epochs=3, verbose=0)
+        # the global random states are not reset by the seeds of the models
+        assert np.random.rand() == np.random.RandomState(11).rand()
+        assert random.random() == random.Random(11).random()
+        assert active._tf_seed(tf) == 5
+        results.append((q, al.Y_pred))
+    # the workers don't receive the candidates
+    state = states[0]
+    assert 'al' not in state and 'Utr' not in state
+    assert not any(value is al.U for value in state.values())
+    assert (results[0][0] == results[1][0]).all()
+    assert np.allclose(results[0][1], results[1][1])
+    with pytest.raises(ValueError):
+        al.search(n_jobs=0)
+
+
+def _dense_bemcm(deviations, lin_layer, alpha, size):
+    # the dense (m,d) implementation of BEMCM without normalization
+    corr = [np.zeros(lin_layer.shape) for _ in range(deviations.shape[1])]
+    queries = []
+    while len(queries) < size:
+        norms = np.zeros(len(lin_layer))
+        for it in range(deviations.shape[1]):
+            if queries:
+                j = queries[-1]
+                corr[it] += np.dot(lin_layer, deviations[j, it] * lin_layer[j]).reshape(-1, 1) * lin_layer
+            norms += np.linalg.norm(deviations[:, it].reshape(-1, 1) * lin_layer - alpha * corr[it], axis=1)
+        norms[queries] = -np.inf
+        queries.append(int(np.argmax(norms)))
+    return queries
+
+
+def test_bemcm():
+    rng = np.random.RandomState(3)
+    U = rng.normal(size=(300, 10))
+    al = ActiveLearning(model_creator=model_creator_small, U=U, target_layer='l3', batch_size=[6])
+    al.U_indices = np.arange(300)
+    deviations = rng.normal(size=(300, 4))
+    lin_layer = rng.normal(size=(300, 5)).astype(np.float32)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        queries = al._bemcm(deviations, lin_layer, 0.05, False, [])
+        assert queries == _dense_bemcm(deviations, lin_layer.astype(float), 0.05, 6)
+        # former queries are skipped
+        queries = al._bemcm(deviations, lin_layer, 0.05, False, [queries[0]])
+        assert len(queries) == 5
+        queries = al._bemcm(deviations, lin_layer, 0.05, True, [])
+        assert len(set(queries)) == 6
+
+
+def test_qbc_dsa():
+    rng = np.random.RandomState(5)
+    U = rng.normal(size=(500, 10))
+    al = ActiveLearning(model_creator=model_creator_small, U=U, target_layer='l3', batch_size=[0, 5, 20])
+    al.U_indices = np.arange(100, 500)
+    deviations = rng.normal(size=(400, 4))
+    # qbc: the largest standard deviations, except the former queries
+    ranking = list(np.argsort(-deviations.std(axis=1)))
+    assert al._qbc(deviations, None) == ranking[:5]
+    assert al._qbc(deviations, [ranking[1], ranking[1], 7]) == [i for i in ranking if i not in (ranking[1], 7)][:23]
+    # dsa: the unlabeled candidates with predictions in the underrepresented bins of training data
+    al._Y_test = rng.normal(size=(100, 1))
+    al._Y_train = rng.normal(1.0, size=(200, 1))
+    al._Y_pred = rng.normal(size=(500, 1))
+    queries = al._dsa_y_dist()
+    assert len(queries) == 20 and len(set(queries)) == 20
+    underrepresented = al._dist_shift[al._dist_shift['prob'] > 0].index
+    preds = al._Y_pred[al.U_indices].reshape(-1,)
+    assert all(any(preds[i] in interval for interval in underrepresented) for i in queries)
+    # the leftovers exhaust the underrepresented bins without repeating a candidate
+    al.batch_size = [0, 5, 300]
+    queries = al._dsa_y_dist()
+    assert 20 < len(queries) <= 300 and len(set(queries)) == len(queries)
+    assert all(any(preds[i] in interval for interval in underrepresented) for i in queries)
+
+
+def test_memmap_pool(pool, deposited, tmp_path):
+    import pickle
+    U, _ = pool
+    path = str(tmp_path / 'U.npy')
+    np.save(path, U)
+    results = []
+    for candidates, block_size in ((U, 100000), (np.load(path, mmap_mode='r'), 17)):
+        al = deposited(U=candidates, block_size=block_size)
+        assert (al.X_train == U[al.train_indices]).all()
+        q = al.search(n_evaluation=1, n_ensemble=2, epochs=2, verbose=0)
+        results.append((q, al.Y_pred))
+    assert isinstance(al.U, np.memmap)
+    assert (results[0][0] == results[1][0]).all()
+    assert np.allclose(results[0][1], results[1][1], atol=1e-5)
+    # the memory-mapped pool is pickled by reference
+    assert len(pickle.dumps(al)) < U.nbytes
+    assert (pickle.loads(pickle.dumps(al)).U == U).all()
+
+    # an h5py pool is pickled by reference and read without leaving the file open
+    h5py = pytest.importorskip('h5py')
+    path = str(tmp_path / 'U.h5')
+    with h5py.File(path, 'w') as f:
+        f.create_dataset('U', data=U)
+    with h5py.File(path, 'r') as f:
+        al = deposited(U=f['U'], block_size=17)
+        q = al.search(n_evaluation=1, n_ensemble=2, epochs=2, verbose=0)
+        assert (q == results[0][0]).all()
+        assert np.allclose(al.Y_pred, results[0][1], atol=1e-5)
+        n_open = len(h5py.h5f.get_obj_ids())
+        restored = pickle.loads(pickle.dumps(al))
+        assert (np.asarray(restored.U) == U).all() and (restored.X_train == U[al.train_indices]).all()
+        assert len(h5py.h5f.get_obj_ids()) == n_open
+    with pytest.raises(ValueError):
+        ActiveLearning(model_creator=model_creator_small, U=U, target_layer='l3', block_size=0)
+
+
+def test_save_load(pool, deposited, tmp_path):
+    U, Y = pool
+    al = deposited()
+    q = al.search(n_evaluation=1, n_ensemble=2, epochs=2, verbose=0)
+    path = str(tmp_path / 'search.npz')
+    al.save(path)
+
+    resumed = ActiveLearning(model_creator=model_creator_small, U=U, target_layer='l3',
+                             train_size=30, test_size=20, batch_size=[2, 1])
+    resumed.load(path)
+    assert resumed.query_number == 1
+    assert (resumed.queries[0][1] == q).all() and resumed.queries[0][0] == al.queries[0][0]
+    assert (resumed.train_indices == al.train_indices).all()
+    assert (resumed.U_indices == al.U_indices).all()
+    assert (resumed.Y_pred == al.Y_pred).all()
+    assert resumed.results.equals(al.results)
+    assert resumed.bemcm_queries == [int(i) for i in al.bemcm_queries]
+    assert sorted(resumed._weights) == [('ensemble', 0), ('ensemble', 1), ('evaluation', 0)]
+
+    # warm start from the stored weights (without any further training)
+    resumed.deposit(q, Y[q])
+    weights = resumed._weights
+    resumed.search(n_evaluation=1, n_ensemble=2, warm_start=True, epochs=0, verbose=0)
+    for model in weights:
+        for w_old, w_new in zip(weights[model], resumed._weights[model]):
+            assert np.allclose(w_old, w_new)
+
+    with pytest.raises(ValueError):
+        ActiveLearning(model_creator=model_creator_small, U=U[:100], target_layer='l3',
+                       train_size=30, test_size=20).load(path)
+
+
+def test_visualize(pool, deposited, monkeypatch):
+    pytest.importorskip('seaborn')
+    import matplotlib
+    matplotlib.use('Agg')
+    from chemml.optimization import active
+    U, Y = pool
+    fitted = []
+    fit = active.PCA.fit
+
+    def recording_fit(self, X, *args, **kwargs):
+        fitted.append(X.shape)
+        return fit(self, X, *args, **kwargs)
+
+    monkeypatch.setattr(active.PCA, 'fit', recording_fit)
+    al = deposited(block_size=17, sample_size=50)
+    al.search(n_evaluation=1, n_ensemble=2, epochs=2, verbose=0)
+    plots = al.visualize(Y)
+    assert len(plots) == 3
+    # the principal components are fitted to a sample of U and not to all of the candidates
+    assert fitted == [(50, 10)]
@@ -23,6 +23,16 @@ class TestConstantColumns(unittest.TestCase):
         ff = cc.transform(df)
         self.assertEqual(3, (ff == f).sum()[0])
 
+    def test_partial_fit(self):
+        cc = ConstantColumns()
+        cc.partial_fit(df.iloc[:1])
+        self.assertEqual(4, len(cc.removed_columns_))
+        cc.partial_fit(df.iloc[1:])
+        self.assertEqual([1, 2, 3], list(cc.removed_columns_))
+        self.assertEqual([0], list(cc.transform(df.iloc[2:]).columns))
+        with self.assertRaises(ValueError):
+            cc.partial_fit(df[[0, 1]])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -23,3 +23,88 @@ class TestConstantColumns(unittest.TestCase):
         self.assertEqual(0.0, f[2][1])
         self.assertEqual(0.0, f[1][0])
 
+
+    def test_fit_transform_strategies(self):
+        mv = MissingValues(strategy='mean')
+        f = mv.fit_transform(df)
+        self.assertEqual((5, 9), f.shape)
+        self.assertEqual(0, f.isnull().sum().sum())
+        self.assertAlmostEqual((1 + 2 + 5) / 3.0, f[0][2])
+        # the input is not modified
+        self.assertEqual('a', df[0][2])
+        mv = MissingValues(strategy='ignore_row')
+        f = mv.fit_transform(df)
+        self.assertEqual([4], list(f.index))
+        self.assertEqual(1, len(mv.transform(target)))
+        mv = MissingValues(strategy='ignore_column')
+        f = mv.fit_transform(df)
+        self.assertEqual((5, 0), f.shape)
+
+    def test_series_target(self):
+        series = pd.Series([1, 2, 3, np.nan, 4])
+        mv = MissingValues(strategy='ignore_row')
+        mv.fit_transform(df)
+        t = mv.transform(series)
+        self.assertIsInstance(t, pd.Series)
+        self.assertEqual([4], list(t.index))
+        self.assertEqual([4], list(mv.transform(series.values)))
+        mv = MissingValues(strategy='ignore_column')
+        mv.fit_transform(df)
+        self.assertTrue(mv.transform(series).equals(series))
+        mv = MissingValues(strategy='zero').fit(target)
+        t = mv.transform(target[0])
+        self.assertIsInstance(t, pd.Series)
+        self.assertEqual(0.0, t[3])
+
+    def test_transform_in_place(self):
+        new = pd.DataFrame({'a': [np.nan, 1.0], 'b': [2.0, np.nan]})
+        mv = MissingValues(strategy='mean').fit(pd.DataFrame({'a': [1.0, 3.0], 'b': [4.0, 6.0]}))
+        f = mv.transform(new, copy=False)
+        self.assertIs(new, f)
+        self.assertEqual([2.0, 1.0], list(new['a']))
+        self.assertEqual([2.0, 5.0], list(new['b']))
+        # the chunks are filled in place as well
+        chunks = [pd.DataFrame({'a': [np.nan], 'b': [2.0]}), pd.DataFrame({'a': [1.0], 'b': [np.nan]})]
+        for chunk, f in zip(chunks, mv.transform(iter(chunks), copy=False)):
+            self.assertIs(chunk, f)
+        self.assertEqual([2.0, 5.0], [chunks[0]['a'][0], chunks[1]['b'][0]])
+
+    def test_transform(self):
+        mv = MissingValues(strategy='median').fit(df)
+        new = pd.DataFrame({i: [np.nan, 1.0] for i in df.columns})
+        f = mv.transform(new)
+        self.assertEqual(list(mv.columns_), list(f.columns))
+        self.assertEqual(mv.fill_values_[1], f[1][0])
+        self.assertEqual(1.0, f[1][1])
+        with self.assertRaises(ValueError):
+            mv.transform(new.drop(columns=[1]))
+
+    def test_chunks(self):
+        chunks = [df.iloc[:2], df.iloc[2:]]
+        mv = MissingValues(strategy='mean').fit(iter(chunks))
+        full = MissingValues(strategy='mean').fit(df)
+        np.testing.assert_almost_equal(full.fill_values_.values, mv.fill_values_.values)
+        f = pd.concat(mv.transform(iter(chunks)))
+        self.assertTrue(f.equals(full.transform(df)))
+        mv = MissingValues(strategy='ignore_row').fit(iter(chunks))
+        self.assertEqual([False, False, False, False, True], list(mv.mask))
+        self.assertEqual([4], list(pd.concat(mv.transform(iter(chunks))).index))
+
+    def test_read_csv_chunks(self):
+        import io
+        text = 'a,b,c,d\n1,,2,0.5\n,,x,1.5\n3,,4,2.5\n5,,,3.5\n'
+        for strategy, columns in (('ignore_row', ['a', 'c', 'd']), ('ignore_column', ['d'])):
+            full = MissingValues(strategy=strategy).fit_transform(pd.read_csv(io.StringIO(text)))
+            mv = MissingValues(strategy=strategy).fit(pd.read_csv(io.StringIO(text), chunksize=2))
+            f = pd.concat(mv.transform(pd.read_csv(io.StringIO(text), chunksize=2)))
+            self.assertTrue(f.equals(full))
+            self.assertEqual(columns, list(f.columns))
+            self.assertTrue((f.dtypes == float).all())
+
+    def test_exception(self):
+        with self.assertRaises(ValueError):
+            MissingValues(strategy='median').fit(iter([df.iloc[:2], df.iloc[2:]]))
+        with self.assertRaises(ValueError):
+            MissingValues(strategy='interpolate').fit(df).transform(iter([df]))
+        with self.assertRaises(TypeError):
+            MissingValues(strategy='max').fit(df)
@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 import pandas as pd
 
 from chemml.preprocessing import Outliers
@@ -25,6 +26,58 @@ class TestOutliers(unittest.TestCase):
         self.assertEqual(1, f.index[0])
         self.assertEqual(1, (ff == f).sum()[0])
 
+    def test_partial_fit(self):
+        rng = np.random.RandomState(0)
+        big = pd.DataFrame(rng.normal(size=(1000, 3)))
+        big.iloc[5, 1] = 50.0
+        big.iloc[7, 2] = np.nan
+        ro = Outliers(m=3., strategy='mean')
+        for start in range(0, 1000, 300):
+            ro.partial_fit(big.iloc[start:start + 300])
+        np.testing.assert_almost_equal(big.mean().values, ro.center_.values)
+        np.testing.assert_almost_equal(big.std(ddof=0).values, ro.std_.values)
+        f = pd.concat([ro.transform(big.iloc[start:start + 300]) for start in range(0, 1000, 300)])
+        self.assertTrue(f.equals(Outliers(m=3., strategy='mean').fit_transform(big)))
+        ro = Outliers(m=3., strategy='median', sketch_size=500, random_state=1)
+        for start in range(0, 1000, 300):
+            ro.partial_fit(big.iloc[start:start + 300])
+        np.testing.assert_allclose(big.median().values, ro.center_.values, atol=0.15)
+        self.assertNotIn(5, ro.transform(big).index)
+
+    def test_target(self):
+        ro = Outliers(m=1., strategy='median')
+        f = ro.fit_transform(df)
+        target = pd.Series([10, 20, 30])
+        self.assertTrue(ro.transform(target).equals(target.loc[f.index]))
+        self.assertTrue(ro.transform(target.to_frame('y')).equals(target.to_frame('y').loc[f.index]))
+        # the removed rows of fit_transform are dropped by the next fits
+        for fit in (ro.fit, ro.partial_fit):
+            fit(df)
+            with self.assertRaises(ValueError):
+                ro.transform(target)
+            self.assertEqual(ro.transform(df).shape, f.shape)
+
+    def test_fit_transform_reset(self):
+        rng = np.random.RandomState(0)
+        big = pd.DataFrame(rng.normal(size=(900, 3)))
+        ro = Outliers(m=3., strategy='mean')
+        ro.partial_fit(big.iloc[:300] + 100)
+        ro.fit_transform(big.iloc[300:600])
+        self.assertTrue(hasattr(ro, 'removed_rows_'))
+        # the next partial_fit continues from the fit_transform data, not from the earlier chunks
+        ro.partial_fit(big.iloc[600:])
+        np.testing.assert_almost_equal(big.iloc[300:].mean().values, ro.center_.values)
+        np.testing.assert_almost_equal(big.iloc[300:].std(ddof=0).values, ro.std_.values)
+        self.assertFalse(hasattr(ro, 'removed_rows_'))
+
+    def test_exception(self):
+        ro = Outliers(strategy='mode')
+        with self.assertRaises(ValueError):
+            ro.fit(df)
+        ro = Outliers().fit(df)
+        with self.assertRaises(ValueError):
+            ro.partial_fit(df[[0, 1]])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,45 @@
+import pytest
+import os
+import numpy as np
+
+from chemml.utils import FeatureCache
+from chemml.utils import params_hash
+
+
+def test_memory_tier():
+    cache = FeatureCache(max_items=2)
+    ns = params_hash('test', {'a': 1})
+    cache.put(ns, ['x', 'y', 'z'], np.arange(6, dtype=np.float32).reshape(3, 2))
+    rows, found = cache.get(ns, ['x', 'z', 'w'], np.float32, 2)
+    # 'x' is evicted by the LRU tier
+    assert list(found) == [False, True, False]
+    assert list(rows[1]) == [4.0, 5.0]
+    assert (cache.hits, cache.misses, cache.memory_hits) == (1, 2, 1)
+    cache.reset_stats()
+    assert cache.hits == 0
+
+
+def test_disk_tier(tmpdir):
+    path = str(tmpdir.join('cache.sqlite'))
+    cache = FeatureCache(path, max_items=1)
+    ns = params_hash('test', {'a': 1})
+    cache.put(ns, ['x', 'y'], np.array([[1, 2], [3, 4]], dtype=np.uint8))
+    cache.close()
+    # a new session reads from the disk
+    cache = FeatureCache(path)
+    rows, found = cache.get(ns, ['y', 'x', 'y'], np.uint8, 2)
+    assert found.all()
+    assert rows.tolist() == [[3, 4], [1, 2], [3, 4]]
+    assert cache.disk_hits == 3
+    # different parameters don't share the values
+    rows, found = cache.get(params_hash('test', {'a': 2}), ['x'], np.uint8, 2)
+    assert not found.any()
+    cache.clear()
+    assert not cache.get(ns, ['x'], np.uint8, 2)[1].any()
+
+
+def test_exception():
+    with pytest.raises(ValueError):
+        FeatureCache(path=1)
+    with pytest.raises(ValueError):
+        FeatureCache(max_items=-1)